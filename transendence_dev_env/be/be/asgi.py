@@ -10,7 +10,7 @@ https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 # asgi.py
 import os
 import django
-from channels.routing import ProtocolTypeRouter, URLRouter
+from channels.routing import ProtocolTypeRouter, URLRouter, ChannelNameRouter
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "be.settings")
@@ -19,10 +19,15 @@ django.setup()
 # Import after Django setup
 from accounts.middleware import JWTAuthMiddlewareStack
 from be.routing import websocket_urlpatterns  # Import the combined routing file
+from games.workers import GameSimulationConsumer, GAME_SIMULATION_CHANNEL
 
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
     "websocket": JWTAuthMiddlewareStack(
         URLRouter(websocket_urlpatterns)
     ),
+    # Background channels served by `manage.py run_game_workers`
+    "channel": ChannelNameRouter({
+        GAME_SIMULATION_CHANNEL: GameSimulationConsumer.as_asgi(),
+    }),
 })
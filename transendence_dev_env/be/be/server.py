@@ -0,0 +1,157 @@
+# server.py
+"""
+Daphne with permessage-deflate on the WebSocket routes it pays off on.
+
+Run it like daphne itself: `python -m be.server -b 0.0.0.0 -p 8000 be.asgi:application`.
+
+Daphne never accepts the compression extension browsers offer. This server
+accepts it on the routes listed in WEBSOCKET_COMPRESSION, by path prefix,
+and compresses the messages sent on them that are at least as long as the
+route's threshold; shorter ones (the 60 Hz game_state frames, inputs acks)
+go out as they are, as deflating them costs more CPU than it saves bytes.
+Other routes don't negotiate the extension at all.
+
+The compressor of a connection keeps its context between messages, so a
+lobby state or tournament_state that is mostly the previous one costs a
+few bytes. Its window and memory level are kept small (WINDOW_BITS,
+MEM_LEVEL) as every compressed connection holds one.
+
+The game consumers' sends also wait while the connection's socket has more
+than WRITE_BUFFER bytes it couldn't write yet, instead of Twisted buffering
+whatever a slow client doesn't take. The transport pauses and resumes a
+SendGate, registered as its producer, and handle_reply() holds the
+websocket.send messages marked QUEUED_SEND while it is paused. Those come
+from the writer of an OutboundQueue (see games/outbound.py), which drops
+the state frames a held send makes stale. Other consumers send from their
+receive loop, so their sends and closes are never held.
+
+With WEBSOCKET_TRAFFIC_SAMPLE set to a file, every message sent on every
+route is also appended to it, as what `manage.py benchmark_ws_compression`
+measures the thresholds against.
+"""
+import asyncio
+import base64
+import functools
+import itertools
+import json
+import os
+
+from autobahn.websocket.compress import PerMessageDeflateOffer, PerMessageDeflateOfferAccept
+from daphne.cli import CommandLineInterface
+from daphne.server import Server
+from daphne.ws_protocol import WebSocketProtocol
+from django.conf import settings
+from games.outbound import QUEUED_SEND
+from twisted.internet.interfaces import IPushProducer
+from zope.interface import implementer
+
+WINDOW_BITS = 12  # 4 KB compression window instead of zlib's 32 KB
+MEM_LEVEL = 5
+WRITE_BUFFER = 16 * 1024  # bytes a connection may have waiting in Twisted before its sends wait, 64 KB by default
+
+
+def compression_threshold(path):
+    """Smallest message compressed on path, by its longest prefix in WEBSOCKET_COMPRESSION; None to not compress."""
+    prefixes = [prefix for prefix in settings.WEBSOCKET_COMPRESSION if path.startswith(prefix)]
+    if not prefixes:
+        return None
+    return settings.WEBSOCKET_COMPRESSION[max(prefixes, key=len)]
+
+
+def accept_deflate(offers):
+    for offer in offers:
+        if isinstance(offer, PerMessageDeflateOffer):
+            return PerMessageDeflateOfferAccept(
+                offer,
+                request_max_window_bits=WINDOW_BITS if offer.accept_max_window_bits else 0,
+                window_bits=min(WINDOW_BITS, offer.request_max_window_bits or WINDOW_BITS),
+                mem_level=MEM_LEVEL,
+            )
+    return None
+
+
+def send_message(send, threshold, payload, isBinary=False, **kwargs):
+    """protocol.sendMessage that leaves messages under threshold uncompressed."""
+    kwargs.setdefault("doNotCompress", len(payload) < threshold)
+    return send(payload, isBinary, **kwargs)
+
+
+class TrafficSample:
+    """Appends the messages sent by the server to a JSON lines file, one per message."""
+
+    def __init__(self, path):
+        self.file = open(path, "a", buffering=1)  # line buffered, nothing is lost when the server is stopped
+        self.connections = itertools.count()
+
+    def wrap(self, send, path):
+        connection = next(self.connections)
+
+        def record(payload, isBinary=False, **kwargs):
+            self.file.write(json.dumps({
+                "connection": f"{os.getpid()}-{connection}",
+                "path": path,
+                "binary": isBinary,
+                "payload": base64.b64encode(payload).decode() if isBinary else payload.decode(),
+            }) + "\n")
+            return send(payload, isBinary, **kwargs)
+        return record
+
+
+@implementer(IPushProducer)
+class SendGate:
+    """Producer of a WebSocket's transport, open while the transport takes more writes."""
+
+    def __init__(self):
+        self.open = asyncio.Event()
+        self.open.set()
+
+    def pauseProducing(self):
+        self.open.clear()
+
+    def resumeProducing(self):
+        self.open.set()
+
+    def stopProducing(self):
+        # Connection lost, let waiting sends through to be discarded
+        self.open.set()
+
+
+class CompressingServer(Server):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sample = TrafficSample(settings.WEBSOCKET_TRAFFIC_SAMPLE) if settings.WEBSOCKET_TRAFFIC_SAMPLE else None
+
+    def protocol_connected(self, protocol):
+        super().protocol_connected(protocol)
+        if not isinstance(protocol, WebSocketProtocol):
+            return
+        gate = self.connections[protocol]["send_gate"] = SendGate()
+        transport = protocol.transport
+        # The HTTP channel the connection was upgraded from is still registered
+        transport.unregisterProducer()
+        transport.registerProducer(gate, True)
+        if hasattr(transport, "bufferSize"):
+            transport.bufferSize = WRITE_BUFFER
+        # Called from onConnect, before autobahn answers the extension offers
+        path = protocol.http_request_path
+        if self.sample is not None:
+            protocol.sendMessage = self.sample.wrap(protocol.sendMessage, path)
+        threshold = compression_threshold(path)
+        if threshold is not None:
+            protocol.perMessageCompressionAccept = accept_deflate
+            protocol.sendMessage = functools.partial(send_message, protocol.sendMessage, threshold)
+
+    async def handle_reply(self, protocol, message):
+        gate = self.connections.get(protocol, {}).get("send_gate")
+        if gate is not None and message["type"] == "websocket.send" and message.get(QUEUED_SEND):
+            await gate.open.wait()
+        await super().handle_reply(protocol, message)
+
+
+class CompressingCommandLineInterface(CommandLineInterface):
+    server_class = CompressingServer
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "be.settings")
+    CompressingCommandLineInterface.entrypoint()
@@ -144,15 +144,74 @@ TEMPLATES = [
 
 ASGI_APPLICATION = 'be.asgi.application'
 WSGI_APPLICATION = "be.wsgi.application"
+# Redis instances the channel layer spreads channels over, comma separated redis:// URLs, and the ones it keeps
+# groups on by name prefix, as 'lobby_=redis://a:6379,redis://b:6379;tournament_=...;notifications_=...'.
+# Groups without a shard of their own go with the channels.
+CHANNEL_LAYER_HOSTS = [url for url in os.getenv('CHANNEL_LAYER_HOSTS', '').split(',') if url] or [
+    (os.getenv('REDIS_HOST', 'redis'), int(os.getenv('REDIS_PORT', 6379)))
+]
+CHANNEL_LAYER_SHARDS = {
+    prefix: [url for url in urls.split(',') if url]
+    for prefix, _, urls in (shard.partition('=') for shard in os.getenv('CHANNEL_LAYER_SHARDS', '').split(';') if shard)
+}
+
+# Messages between consumers of the same process skip Redis (see games/layers.py)
 CHANNEL_LAYERS = {
     'default': {
-        'BACKEND': 'channels_redis.core.RedisChannelLayer',
+        'BACKEND': 'games.layers.HybridChannelLayer',
         'CONFIG': {
-            'hosts': [(os.getenv('REDIS_HOST', 'redis'), int(os.getenv('REDIS_PORT', 6379)))],
+            'hosts': CHANNEL_LAYER_HOSTS,
+            'shards': CHANNEL_LAYER_SHARDS,
         },
     },
 }
 
+# permessage-deflate per WebSocket path prefix, served by `python -m be.server` (see be/server.py): the shortest
+# message, in bytes, compressed on the routes starting with it. Routes not listed don't compress. The thresholds
+# keep the game_state frames, sent 60 times a second and a few hundred bytes long, uncompressed.
+WEBSOCKET_COMPRESSION = {
+    '/ws/tournament/': 512,
+    '/ws/tournament-lobby/': 512,
+    '/ws/notifications/': 256,
+    '/ws/lobby': 1024,  # /ws/lobby/, /ws/lobby_chaos/ and /ws/lobby_arena/
+}
+
+# File the messages sent on every WebSocket are appended to, for `manage.py benchmark_ws_compression`;
+# empty to record none
+WEBSOCKET_TRAFFIC_SAMPLE = os.getenv('WEBSOCKET_TRAFFIC_SAMPLE', '')
+
+# Run online matches on `manage.py run_game_workers` processes instead of the host's consumer
+GAME_SIMULATION_OFFLOAD = os.getenv('GAME_SIMULATION_OFFLOAD', 'False').lower() in ('1', 'true')
+
+# Simulation steps and game_state broadcasts per second, per game mode.
+# Broadcasts back off on their own when the channel layer gets slow.
+GAME_RATES = {
+    'classic': {'simulation': 60, 'broadcast': 60},
+    'chaos': {'simulation': 120, 'broadcast': 60},
+    'arena': {'simulation': 120, 'broadcast': 60},
+}
+
+# Longest lag, in seconds, that paddle contacts are compensated for
+GAME_MAX_REWIND = float(os.getenv('GAME_MAX_REWIND', '0.1'))
+
+# Rate (frames per second) and delay (seconds) of the state stream sent to spectators
+GAME_SPECTATOR_RATE = int(os.getenv('GAME_SPECTATOR_RATE', '20'))
+GAME_SPECTATOR_DELAY = float(os.getenv('GAME_SPECTATOR_DELAY', '1.0'))
+
+# Redis URL of the write-ahead journal for the rounds of running games (see games/journal.py), empty to keep none
+GAME_ROUND_JOURNAL = os.getenv('GAME_ROUND_JOURNAL', '')
+
+# Redis URL of the queue game results are written behind from by `manage.py run_result_writer`
+# (see games/results.py), empty to have the consumers write them themselves
+GAME_RESULT_QUEUE = os.getenv('GAME_RESULT_QUEUE', '')
+
+# Names of the ASGI workers behind the proxy, comma separated, that lobby rooms and tournament matches are
+# assigned to (see games/affinity.py); empty when there is just one
+GAME_ASGI_WORKERS = [name for name in os.getenv('GAME_ASGI_WORKERS', '').split(',') if name]
+
+# Redis URL the room-to-worker assignments are kept at, empty to go by GAME_ASGI_WORKERS alone
+GAME_AFFINITY_REGISTRY = os.getenv('GAME_AFFINITY_REGISTRY', '')
+
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
@@ -0,0 +1,72 @@
+# affinity.py
+"""
+Which ASGI worker the players of a room connect to.
+
+Messages between consumers of the same process skip Redis (see layers.py),
+so a game is cheapest when both players' sockets end up on one Daphne
+worker. With GAME_ASGI_WORKERS listing the workers behind the proxy, every
+lobby room and tournament match is given one of them when it is created.
+The lobby REST responses and the tournament's join_match messages carry it
+as `worker`, clients pass it on in the WebSocket URL as ?worker=<name> and
+the proxy routes the socket on that (see fe/nginx.conf).
+
+A room's worker is picked by rendezvous hashing of its key over the
+workers, so every process agrees on it without asking anyone. With
+GAME_AFFINITY_REGISTRY set to a Redis URL the pick is also kept there for
+AFFINITY_TTL, so running rooms stay where their players are while workers
+are added or removed; a room whose worker left is given a new one.
+"""
+import hashlib
+
+import redis
+from django.conf import settings
+
+import logging
+logger = logging.getLogger('game_debug')
+
+AFFINITY_TTL = 6 * 60 * 60  # seconds a room keeps its worker
+
+_client = None
+
+
+def affinity_key(room_id, match_id=None):
+    if match_id is None:
+        return f"game-affinity:{room_id}"
+    return f"game-affinity:{room_id}:{match_id}"
+
+
+def registry_client():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.GAME_AFFINITY_REGISTRY)
+    return _client
+
+
+def pick_worker(key, workers):
+    """The worker with the highest hash of (worker, key)."""
+    return max(workers, key=lambda worker: hashlib.blake2b(f"{worker}/{key}".encode(), digest_size=8).digest())
+
+
+def assign_worker(room_id, match_id=None):
+    """
+    The worker the room's (or the tournament match's) players should connect
+    to, assigning one if it has none. None without GAME_ASGI_WORKERS.
+    """
+    workers = settings.GAME_ASGI_WORKERS
+    if not workers:
+        return None
+    key = affinity_key(room_id, match_id)
+    worker = pick_worker(key, workers)
+    if not settings.GAME_AFFINITY_REGISTRY:
+        return worker
+    try:
+        client = registry_client()
+        if client.set(key, worker, nx=True, ex=AFFINITY_TTL):
+            return worker
+        assigned = client.get(key)
+        if assigned is not None and assigned.decode() in workers:
+            return assigned.decode()
+        client.set(key, worker, ex=AFFINITY_TTL)
+    except redis.RedisError as e:
+        logger.warning(f"Could not look up the worker of {key}: {e}")
+    return worker
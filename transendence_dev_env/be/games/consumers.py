@@ -1,34 +1,430 @@
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 from channels.db import database_sync_to_async
+from asgiref.sync import sync_to_async
 from .models import Lobby, ChaosLobby, ArenaLobby, Game, TournamentLobby, OnlineTournament, OnlineMatch, TournamentType
 from .services.tournament_lobby_service import TournamentLobbyService
 from .services.tournament_service import TournamentService
 from .services.round_service import RoundService
+from .engine import create_world, FixedTimestepLoop, BroadcastPacer, StateEncoder, StateDecoder, TimerWheel, InputRing, SpectatorFeed
+from .workers import GAME_SIMULATION_CHANNEL
+from .affinity import assign_worker
+from .journal import journal_round, clear_journal
+from .outbound import QUEUED_SEND, OutboundQueue
+from .results import game_result, submit_result, xp_award
+from .replay import REPLAY_DIR, ReplayPlayer, ReplayRecorder, replay_header
+from .wire import BINARY_SUBPROTOCOL, FORMATS, FORMAT_JSON, FORMAT_DELTA, FORMAT_BINARY, MAX_SEQ, encode_payload, encode_payloads
+from django.conf import settings
 from django.contrib.auth.models import User 
 from django.db import transaction
 from django.core.exceptions import ObjectDoesNotExist, PermissionDenied
 from django.contrib.auth.models import AnonymousUser
 from django.db.models import Q
 import asyncio
-import random
 import math
 import json
+import time
 from asyncio import Lock
+from functools import cached_property
+from urllib.parse import parse_qs
 from django.utils import timezone
 from threading import Timer
 from accounts.utils import get_display_name # for tournament, touranment lobby, tournament match consumer
 
 import logging
 logger = logging.getLogger('game_debug')
-class LobbyConsumer(AsyncJsonWebsocketConsumer):
+
+def spectator_group_name(room_id, match_id=None):
+    """Group the spectators of a lobby room, or of a tournament match, listen on."""
+    if match_id is None:
+        return f"spectate_{room_id}"
+    return f"spectate_{room_id}_{match_id}"
+
+
+class OutboundQueueMixin:
+    """
+    Sends through an OutboundQueue (see outbound.py) from the moment the
+    connection is accepted, so a slow client holds up neither the handlers
+    nor the consumer's channel layer messages.
+    """
+    outbound = None
+    outbound_task = None
+    overflow_close_code = 1013  # try again later
+
+    async def accept(self, subprotocol=None, headers=None):
+        await super().accept(subprotocol, headers)
+        send = self.base_send
+        # Marked as sent by a writer, which the server may hold while the socket drains
+        self.outbound = OutboundQueue(lambda message: send({**message, QUEUED_SEND: True}))
+        self.outbound_task = asyncio.create_task(self.outbound.run())
+        # send(), send_json() and close() all end up here
+        self.base_send = self.queue_send
+
+    async def queue_send(self, message):
+        if message["type"] == "websocket.close":
+            self.outbound.close(message)
+        else:
+            self.queue_message(message)
+
+    def queue_message(self, message, state=False):
+        if not self.outbound.put(message, state):
+            self.outbound.overflow({"type": "websocket.close", "code": self.overflow_close_code})
+            # The writer may be waiting on a send the client will never take, start over with the close
+            self.outbound_task.cancel()
+            self.outbound_task = asyncio.create_task(self.outbound.run())
+
+    async def websocket_disconnect(self, message):
+        if self.outbound_task is not None:
+            self.outbound_task.cancel()
+            self.base_send = self.outbound.send
+            self.outbound = self.outbound_task = None
+        await super().websocket_disconnect(message)
+
+
+class WireFormatMixin(OutboundQueueMixin):
+    """Picks the wire format (see wire.py) a connection gets its game_state frames in."""
+
+    @cached_property
+    def query_params(self):
+        return parse_qs(self.scope.get("query_string", b"").decode())
+
+    @cached_property
+    def wire_format(self):
+        if self.query_params.get("wire") == ["binary"] or BINARY_SUBPROTOCOL in self.scope.get("subprotocols", []):
+            return FORMAT_BINARY
+        if self.query_params.get("sync") == ["delta"]:
+            return FORMAT_DELTA
+        return FORMAT_JSON
+
+    async def accept(self, subprotocol=None, headers=None):
+        if subprotocol is None and BINARY_SUBPROTOCOL in self.scope.get("subprotocols", []):
+            subprotocol = BINARY_SUBPROTOCOL
+        await super().accept(subprotocol, headers)
+
+    async def send_payload(self, payload):
+        """Send a state frame, replaced by the next one if that comes before the client took it."""
+        if self.outbound is not None:
+            self.queue_message({"type": "websocket.send", "bytes" if isinstance(payload, bytes) else "text": payload}, state=True)
+        elif isinstance(payload, bytes):
+            await self.send(bytes_data=payload)
+        else:
+            await self.send(text_data=payload)
+
+
+class GameSimulationMixin(WireFormatMixin):
+    """
+    Simulates a consumer's match in-process (the game_loop task) or, with
+    GAME_SIMULATION_OFFLOAD, on a run_game_workers process (see workers.py),
+    and relays its inputs, game_state frames, replay and spectator feed.
+    """
+    simulation_mode = "classic"
+    simulation_start_timeout = 3  # seconds
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.simulation_channel = None
+        self.simulation_ready = asyncio.Event()
+        self.state_encoder = StateEncoder()
+        self.state_decoder = StateDecoder()
+        self.state_formats = set()
+        self.state_format_requested_from = None
+        self.broadcast_pacer = BroadcastPacer(self.broadcast_rate)
+        self.inputs = InputRing()
+        self.player_sides = {}
+        self.default_player_side = None
+        self.last_inputs = {}  # sending connection -> sequence number of the newest update applied
+        self.input_sequence = 0  # updates this connection sent, numbers them for the owner
+        self.last_state_tick = None  # tick of the latest game_state this connection forwarded
+        self.pending_input = None
+        self.input_flush_task = None
+        self.replay_file = None
+        self.spectator_feed = None
+
+    @property
+    def simulation_rate(self):
+        return settings.GAME_RATES[self.simulation_mode]["simulation"]
+
+    @property
+    def broadcast_rate(self):
+        return settings.GAME_RATES[self.simulation_mode]["broadcast"]
+
+    def simulation_settings(self):
+        return {}
+
+    def simulation_sides(self):
+        """Return ({user_id: side}, side for any other user id)."""
+        raise NotImplementedError
+
+    @property
+    def spectator_group(self):
+        return spectator_group_name(self.room_id, getattr(self, "match_id", None))
+
+    def replay_file_name(self):
+        """Name under MEDIA_ROOT of the replay to record for the match being started, None to record none."""
+        game = getattr(self, "game", None)
+        return f"{REPLAY_DIR}/game_{game.pk}.replay" if game is not None else None
+
+    async def start_simulation(self):
+        self.state_encoder = StateEncoder()
+        self.broadcast_pacer = BroadcastPacer(self.broadcast_rate)
+        self.player_sides, self.default_player_side = self.simulation_sides()
+        self.last_inputs = {}
+        self.inputs = InputRing()
+        self.world.max_rewind = settings.GAME_MAX_REWIND
+        self.spectator_feed = SpectatorFeed(self.simulation_rate, settings.GAME_SPECTATOR_RATE, settings.GAME_SPECTATOR_DELAY)
+        self.replay_file = self.replay_file_name()
+        if self.replay_file:
+            await self.save_replay_file(self.replay_file)
+        if not settings.GAME_SIMULATION_OFFLOAD:
+            self.start_replay()
+            self.game_loop_task = asyncio.create_task(self.game_loop())
+            return
+        self.simulation_ready.clear()
+        await self.channel_layer.send(
+            GAME_SIMULATION_CHANNEL,
+            {
+                "type": "simulation_start",
+                "match": self.room_group_name,
+                "group": self.room_group_name,
+                "reply_channel": self.channel_name,
+                "mode": self.simulation_mode,
+                "settings": self.simulation_settings(),
+                "simulation_rate": self.simulation_rate,
+                "broadcast_rate": self.broadcast_rate,
+                "round_score_limit": getattr(self, "round_score_limit", None),
+                "max_rounds": getattr(self, "max_rounds", None),
+                "sides": self.player_sides,
+                "default_side": self.default_player_side,
+                "max_rewind": settings.GAME_MAX_REWIND,
+                "seed": self.world.seed,
+                "replay": self.replay_file,
+                "spectator_group": self.spectator_group,
+                "spectator_rate": settings.GAME_SPECTATOR_RATE,
+                "spectator_delay": settings.GAME_SPECTATOR_DELAY,
+            }
+        )
+        self.game_loop_task = asyncio.create_task(self.await_simulation_worker())
+
+    async def await_simulation_worker(self):
+        try:
+            await asyncio.wait_for(self.simulation_ready.wait(), self.simulation_start_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"No game simulation worker answered for {self.room_group_name}, running it in-process")
+            self.start_replay()
+            await self.game_loop()
+
+    def start_replay(self):
+        if self.replay_file:
+            header = replay_header(self.simulation_mode, self.world, self.simulation_rate)
+            self.world.recorder = ReplayRecorder(self.replay_file, header)
+
+    async def stop_replay(self):
+        if self.world.recorder is not None:
+            written = self.world.recorder.close(self.world.tick)
+            self.world.recorder = None
+            await asyncio.wrap_future(written)
+
+    @database_sync_to_async
+    def save_replay_file(self, name):
+        self.game.replay = name
+        self.game.save(update_fields=['replay'])
+
+    async def stop_simulation(self):
+        await self.stop_replay()
+        await self.stop_spectators()
+        if self.simulation_channel:
+            await self.channel_layer.send(
+                self.simulation_channel,
+                {"type": "simulation_stop", "match": self.room_group_name}
+            )
+            self.simulation_channel = None
+
+    async def stop_game_loop(self):
+        """
+        Stop the simulation, then cancel the game loop task, unless that is the
+        task calling: a tick ending the game mustn't cancel itself before the
+        replay and spectators are flushed.
+        """
+        await self.stop_simulation()
+        task = getattr(self, "game_loop_task", None)
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+
+    async def simulation_started(self, event):
+        """A worker picked up our match, point every player's inputs at it."""
+        self.simulation_channel = event["channel_name"]
+        self.simulation_ready.set()
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {
+                "type": "simulation_assigned",
+                "channel_name": event["channel_name"],
+            }
+        )
+
+    async def simulation_assigned(self, event):
+        self.game_manager_channel = event["channel_name"]
+        logger.debug(f"Set game_manager_channel to simulation worker: {self.game_manager_channel}")
+
+    async def simulation_scored(self, event):
+        """Point scored on the worker; mirror the scores and close the round if it is over."""
+        async with self.game_lock:
+            self.world.scores.update(event["scores"])
+            if event["round_over"]:
+                await self.complete_round()
+
+    async def send_paddle_speed(self, user_id, speed, seq=None, view_tick=None):
+        """Queue a paddle speed for the match owner; only the latest one of each tick is sent."""
+        if seq is not None and (isinstance(seq, bool) or not isinstance(seq, int) or not 0 <= seq <= MAX_SEQ):
+            logger.warning(f"Dropping an input of user {user_id} with seq {seq!r}")
+            return
+        if view_tick is not None:
+            if isinstance(view_tick, bool) or not isinstance(view_tick, (int, float)) or not math.isfinite(view_tick):
+                logger.warning(f"Dropping an input of user {user_id} with view_tick {view_tick!r}")
+                return
+            view_tick = self.rewind_tick(int(view_tick))
+        self.pending_input = (user_id, speed, seq, view_tick)
+        if self.input_flush_task is None or self.input_flush_task.done():
+            self.input_flush_task = asyncio.create_task(self.flush_paddle_speed())
+
+    def rewind_tick(self, view_tick):
+        """view_tick within GAME_MAX_REWIND of the latest game_state sent to the client, None before the first."""
+        latest = self.last_state_tick
+        if latest is None:
+            return None
+        return max(latest - round(settings.GAME_MAX_REWIND * self.simulation_rate), min(view_tick, latest))
+
+    async def flush_paddle_speed(self):
+        while self.pending_input is not None:
+            # Wait for the next tick boundary, inputs arriving meanwhile replace the pending one
+            boundary = int(time.monotonic() * self.simulation_rate) + 1
+            await asyncio.sleep(max(0.0, boundary / self.simulation_rate - time.monotonic()))
+            user_id, speed, seq, view_tick = self.pending_input
+            self.pending_input = None
+            if not self.game_manager_channel:
+                logger.warning("Game manager channel not set. Cannot send paddle speed update.")
+                continue
+            self.input_sequence += 1
+            await self.channel_layer.send(
+                self.game_manager_channel,
+                {
+                    "type": "update_paddle_speed",
+                    "match": self.room_group_name,
+                    "user_id": user_id,
+                    "speed": speed,
+                    "seq": seq,
+                    "view_tick": view_tick,
+                    "connection": self.channel_name,
+                    "sequence": self.input_sequence,
+                }
+            )
+
+    async def update_paddle_speed(self, event):
+        user_id = str(event["user_id"])
+        side = self.player_sides.get(user_id, self.default_player_side)
+        if side is None:
+            logger.warning(f"User ID {user_id} not found in the game.")
+            return
+        sequence = event.get("sequence")
+        if sequence is not None:
+            if sequence <= self.last_inputs.get(event.get("connection"), 0):
+                return  # superseded by an update we already applied
+            self.last_inputs[event.get("connection")] = sequence
+        self.inputs.push(side, event["speed"], event.get("seq"), event.get("view_tick"))
+
+    async def broadcast_state(self):
+        frame = self.state_encoder.encode(self.world.snapshot(), self.world.tick, self.inputs.acks)
+        payloads = encode_payloads(self.simulation_mode, frame, self.state_encoder.last, self.state_formats)
+        started = time.monotonic()
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {
+                "type": "game_state",
+                **frame,
+                "payloads": payloads,
+            }
+        )
+        self.broadcast_pacer.record(time.monotonic() - started, self.group_queue_depth())
+
+    async def feed_spectators(self):
+        """Send the spectators their frame for the tick just simulated here, if one is due."""
+        if self.spectator_feed is None or self.simulation_channel:
+            return
+        frame = self.spectator_feed.sample(self.world)
+        if frame is not None:
+            await self.send_spectator_state(self.spectator_feed, frame)
+
+    async def send_spectator_state(self, feed, frame):
+        payloads = encode_payloads(self.simulation_mode, frame, feed.encoder.last, FORMATS)
+        await self.channel_layer.group_send(self.spectator_group, {"type": "spectator_state", **frame, "payloads": payloads})
+
+    async def stop_spectators(self):
+        """Send the held back frame of a match simulated here and tell the spectators it is over."""
+        feed, self.spectator_feed = self.spectator_feed, None
+        if feed is None or self.simulation_channel:
+            return  # a worker's feed is flushed by the worker
+        frame = feed.flush()
+        if frame is not None:
+            await self.send_spectator_state(feed, frame)
+        await self.channel_layer.group_send(self.spectator_group, {"type": "spectate_ended"})
+
+    def group_queue_depth(self):
+        """
+        Deepest receive queue among the room's members, for layers that keep
+        their queues in this process (the in-memory and hybrid layers). Other layers
+        report 0 and the pacer goes by send latency alone.
+        """
+        layer = self.channel_layer
+        queues = getattr(layer, "channels", None)
+        members = getattr(layer, "groups", {}).get(self.room_group_name)
+        if queues is None or not members:
+            return 0
+        return max((queues[name].qsize() for name in members if name in queues), default=0)
+
+    async def request_keyframe(self):
+        if self.game_manager_channel:
+            await self.channel_layer.send(
+                self.game_manager_channel,
+                {"type": "state_keyframe_request", "match": self.room_group_name}
+            )
+
+    async def state_keyframe_request(self, event):
+        self.state_encoder.request_keyframe()
+
+    async def request_state_format(self):
+        """Ask the match owner to pre-encode frames in our wire format, once per owner."""
+        if self.game_manager_channel and self.state_format_requested_from != self.game_manager_channel:
+            self.state_format_requested_from = self.game_manager_channel
+            await self.channel_layer.send(
+                self.game_manager_channel,
+                {"type": "state_format_request", "match": self.room_group_name, "format": self.wire_format}
+            )
+
+    async def state_format_request(self, event):
+        if event["format"] in FORMATS:
+            self.state_formats.add(event["format"])
+
+    async def game_state(self, event):
+        self.last_state_tick = event.get("tick")
+        already_waiting = self.state_decoder.awaiting_keyframe
+        in_sync = self.state_decoder.apply(event)
+        if not in_sync and not already_waiting:
+            await self.request_keyframe()
+
+        payload = event.get("payloads", {}).get(self.wire_format)
+        if payload is None:
+            await self.request_state_format()
+            if not in_sync and self.wire_format != FORMAT_DELTA:
+                return
+            frame = {key: event.get(key) for key in ("seq", "keyframe", "tick", "acks", "state")}
+            payload = encode_payload(self.wire_format, self.simulation_mode, frame, self.state_decoder.state)
+        await self.send_payload(payload)
+
+class LobbyConsumer(GameSimulationMixin, AsyncJsonWebsocketConsumer):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.game_in_progress = False
-        self.left_paddle_y = 250
-        self.right_paddle_y = 250
-        self.left_paddle_speed = 0
-        self.right_paddle_speed = 0
+        self.world = create_world("classic")
         self.game_lock = Lock()
         self.game_manager_channel = None  # Initialize game manager channel
         self.current_round = 1
@@ -41,15 +437,7 @@ class LobbyConsumer(AsyncJsonWebsocketConsumer):
         await self.update_host_and_guest()
         # Initialize game state variables
         self.game_in_progress = True
-        self.left_paddle_y = 250
-        self.right_paddle_y = 250
-        self.ball_x = 500
-        self.ball_y = 250
-        self.ball_direction_x = 1
-        self.ball_direction_y = 0.5
-        self.ball_speed = 5
-        self.left_score = 0
-        self.right_score = 0
+        self.world = create_world("classic")
         self.current_round = 1
         self.round_start_time = timezone.now()
 
@@ -78,13 +466,16 @@ class LobbyConsumer(AsyncJsonWebsocketConsumer):
     )
 
         # Start the game loop
-        self.game_loop_task = asyncio.create_task(self.game_loop())
+        await self.start_simulation()
 
     async def update_host_and_guest(self):
         self.lobby = await self.get_lobby(self.room_id)
         self.host = await self.get_lobby_host()
         self.guest = await self.get_lobby_guest()
 
+    def simulation_sides(self):
+        return {str(self.host.id): "left"}, "right"
+
     @database_sync_to_async
     def create_new_game_instance(self):
         logger.debug(f"Creating new game instance for players: {self.host} and {self.guest}")
@@ -100,6 +491,7 @@ class LobbyConsumer(AsyncJsonWebsocketConsumer):
             'is_completed': False,
             'moves_log': [],
             'rounds': [],
+            'seed': self.world.seed,
         }
 
         # Handle player2 based on whether it's a real user or a placeholder
@@ -196,10 +588,10 @@ class LobbyConsumer(AsyncJsonWebsocketConsumer):
             self.channel_name
         )
 
-        # Stop the game if it’s running by canceling the game loop task
+        # Stop the game if it’s running
         if hasattr(self, 'game_loop_task') and not self.game_loop_task.done():
-            self.game_loop_task.cancel()
             self.game_in_progress = False  # Update the game status
+        await self.stop_game_loop()
 
         # Determine if the disconnecting user is the host or the guest
         if await self.is_user_host():
@@ -239,7 +631,9 @@ class LobbyConsumer(AsyncJsonWebsocketConsumer):
 
     async def terminate_game_and_notify(self, message, user_role):
         """Ends the game, notifies the players, and deletes the lobby."""
-        await self.finalize_game(None, Game.CANCELED_BY_GUEST if user_role == "guest" else Game.CANCELED_BY_HOST)
+        status = Game.CANCELED_BY_GUEST if user_role == "guest" else Game.CANCELED_BY_HOST
+        await submit_result(game_result(self.game, self.rounds, None, status))
+        await clear_journal(self.game.pk)
 
         # Notify remaining players about game cancellation
         await self.channel_layer.group_send(
@@ -251,9 +645,8 @@ class LobbyConsumer(AsyncJsonWebsocketConsumer):
             }
         )
 
-        # Cancel the game loop if running
-        if hasattr(self, 'game_loop_task'):
-            self.game_loop_task.cancel()
+        # Stop the game loop if running
+        await self.stop_game_loop()
 
         # Delete the lobby
         await self.delete_lobby()
@@ -279,6 +672,8 @@ class LobbyConsumer(AsyncJsonWebsocketConsumer):
 
         elif action in ["keydown", "keyup"]:
             await self.handle_key_event(action, content)
+        elif action == "request_keyframe":
+            await self.request_keyframe()
                 
     async def handle_key_event(self, action, content):
         key = content.get("key")
@@ -299,99 +694,38 @@ class LobbyConsumer(AsyncJsonWebsocketConsumer):
             return  # Unrecognized action
 
         # Send paddle speed update to the game manager
-        if self.game_manager_channel:
-            await self.channel_layer.send(
-                self.game_manager_channel,
-                {
-                    "type": "update_paddle_speed",
-                    "user_id": user_id,
-                    "speed": speed,
-                }
-            )
-        else:
-            logger.warning("Game manager channel not set. Cannot send paddle speed update.")
+        await self.send_paddle_speed(user_id, speed, content.get("seq"), content.get("view_tick"))
 
-    async def update_paddle_speed(self, event):
-        user_id = event["user_id"]
-        speed = event["speed"]
-        async with self.game_lock:
-            if await self.is_user_host_id(user_id):
-                self.left_paddle_speed = speed
-            else:
-                self.right_paddle_speed = speed
-                
     async def game_loop(self):
-        while self.game_in_progress:
-            await self.game_tick()
-            await asyncio.sleep(1 / 60)
-
-    def update_paddle_position(self, paddle, speed):
-        if paddle == "left":
-            self.left_paddle_y = max(0, min(self.left_paddle_y + speed, 500 - 60))
-        elif paddle == "right":
-            self.right_paddle_y = max(0, min(self.right_paddle_y + speed, 500 - 60))
-            
-    async def game_tick(self):
-        async with self.game_lock:
+        await FixedTimestepLoop(tick_rate=self.simulation_rate).run(self.game_tick, lambda: self.game_in_progress)
 
-            # Update paddle positions
-            self.update_paddle_position("left", self.left_paddle_speed)
-            self.update_paddle_position("right", self.right_paddle_speed)
-
-            # Update ball position
-            self.ball_x += self.ball_direction_x * self.ball_speed
-            self.ball_y += self.ball_direction_y * self.ball_speed
-
-            # Handle collisions with top/bottom walls
-            if self.ball_y <= 0 or self.ball_y >= 500:
-                self.ball_direction_y *= -1
-
-            # Paddle collision handling
-            if self.ball_x <= 10 and self.left_paddle_y < self.ball_y < self.left_paddle_y + 60:
-                self.ball_direction_x *= -1
-            elif self.ball_x >= 990 and self.right_paddle_y < self.ball_y < self.right_paddle_y + 60:
-                self.ball_direction_x *= -1
-
-            # Scoring logic
-            scoring_player = None
-            if self.ball_x <= 0:
-                self.right_score += 1
-                scoring_player = 'right'
-                await self.reset_ball()
-            elif self.ball_x >= 1000:
-                self.left_score += 1
-                scoring_player = 'left'
-                await self.reset_ball()
+    async def game_tick(self, dt):
+        async with self.game_lock:
+            # Apply the inputs that arrived since the last tick
+            self.inputs.drain(self.world)
+            # Move paddles and ball, resolve collisions and scoring
+            self.world.step(dt)
 
             # **Add this block to check for round completion**
-            if self.left_score >= self.round_score_limit or self.right_score >= self.round_score_limit:
+            if self.world.round_over(self.round_score_limit):
                 await self.complete_round()
                 return  # Exit the game tick to prevent further processing until the next loop
 
-            # Send game state to clients
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    "type": "game_state",
-                    "leftScore": self.left_score,
-                    "rightScore": self.right_score,
-                    "ball_x": self.ball_x,
-                    "ball_y": self.ball_y,
-                    "left_paddle_y": self.left_paddle_y,
-                    "right_paddle_y": self.right_paddle_y,
-                    "left_speed": self.left_paddle_speed,
-                    "right_speed": self.right_paddle_speed,
-                }
-            )
+        # Send game state to clients, outside the lock so inputs don't wait on the channel layer
+        if self.broadcast_pacer.due(dt):
+            await self.broadcast_state()
+        await self.feed_spectators()
         
         
                 
     async def complete_round(self):
         print("Round completed")
+        left_score = self.world.scores["left"]
+        right_score = self.world.scores["right"]
         # Determine round winner
-        if self.left_score > self.right_score:
+        if left_score > right_score:
             round_winner = self.game.player1.username
-        elif self.right_score > self.left_score:
+        elif right_score > left_score:
             round_winner = self.game.player2.username
         else:
             round_winner = "Tie"
@@ -401,8 +735,8 @@ class LobbyConsumer(AsyncJsonWebsocketConsumer):
             'round_number': self.current_round,
             'start_time': self.round_start_time.isoformat(),
             'end_time': timezone.now().isoformat(),
-            'score_player1': self.left_score,
-            'score_player2': self.right_score,
+            'score_player1': left_score,
+            'score_player2': right_score,
             'winner': round_winner
         }
 
@@ -426,8 +760,7 @@ class LobbyConsumer(AsyncJsonWebsocketConsumer):
             return  # Exit the game tick to prevent further processing until the next loop
 
         # Reset scores for next round
-        self.left_score = 0
-        self.right_score = 0
+        self.world.next_round()
         self.round_start_time = timezone.now()  # Reset round start time
 
         
@@ -446,55 +779,15 @@ class LobbyConsumer(AsyncJsonWebsocketConsumer):
         })
             
     async def add_round_to_game(self, round_data):
+        # Written to the Game with the result (see games.results), journaled meanwhile
         self.rounds.append(round_data)
-        await database_sync_to_async(self._save_rounds_to_game)()
-
-    def _save_rounds_to_game(self):
-        self.game.rounds = self.rounds
-        self.game.save()   
+        await journal_round(self.game.pk, round_data)
 
     @database_sync_to_async
     def set_game_status(self, status):
         """Sets the status of the current game."""
         self.game.status = status
-        self.game.save()
-        
-    async def calculate_xp_gain(self, game, player, is_winner=False):
-        # Set a default duration to handle None values
-        game_duration = game.duration if game.duration is not None else 0
-
-        # Base XP values
-        base_xp = 50  # Base XP for winning a game
-        level_bonus = 1.5 * await self.get_player_level(player)  # Use async method to get player level
-
-        # Calculate duration-based XP, with diminishing returns
-        if game_duration < 300:  # Short game
-            duration_xp = game_duration * 0.5  # 0.5 XP per second for shorter games
-        elif game_duration < 1200:  # Medium game
-            duration_xp = game_duration * 0.3  # 0.3 XP per second for medium length games
-        else:  # Long game
-            duration_xp = min(400 + (game_duration - 1200) * 0.1, 600)  # Cap XP for long games
-
-        # Score difference multiplier for higher XP based on performance
-        score_difference = abs(game.score_player1 - game.score_player2)
-        performance_multiplier = 1 + min(score_difference / 100, 0.5)  # Up to +50% XP based on score gap
-
-        # Game mode multiplier: more challenging modes award more XP
-        if game.game_mode == Game.PVE:
-            mode_multiplier = 0.7 if not is_winner else 1.0  # PvE easier, give less XP if lost
-        elif game.game_mode == Game.LOCAL_PVP:
-            mode_multiplier = 1.0 if not is_winner else 1.1  # Balanced mode, slight bonus for win
-        else:
-            mode_multiplier = 1.1 if not is_winner else 1.3  # Online PvP, higher reward for higher challenge
-
-        # Apply base, duration, level, performance, and mode multipliers
-        xp_gain = (base_xp + duration_xp + level_bonus) * performance_multiplier * mode_multiplier
-
-        # Additional XP for winning, varies by game mode
-        if is_winner:
-            xp_gain += 50 if game.game_mode == Game.PVE else 75  # Higher bonus for PvP games
-
-        return int(xp_gain)
+        self.game.save(update_fields=['status'])
         
     async def end_game(self):
         logger.info(f"Game data: {self.game}")
@@ -523,11 +816,13 @@ class LobbyConsumer(AsyncJsonWebsocketConsumer):
 
         logger.info(f"Game winner: {winner}")
 
-        # Calculate XP gain
-        winner_xp = await self.calculate_xp_gain(self.game, winner, is_winner=True) if winner else 0
-        loser_xp = max(10, await self.calculate_xp_gain(self.game, loser, is_winner=False) // 4) if loser else 0
-
-        await self.finalize_game(winner, Game.FINISHED, winner_xp, loser_xp)
+        # XP is worked out when the result is written (see games.results)
+        awards = []
+        if isinstance(winner, User):
+            awards.append(xp_award(winner, is_winner=True))
+        if isinstance(loser, User):
+            awards.append(xp_award(loser, share=4, minimum=10))
+        result = game_result(self.game, self.rounds, winner, Game.FINISHED, awards)
 
         # Notify players that the game has ended
         await self.channel_layer.group_send(
@@ -538,62 +833,26 @@ class LobbyConsumer(AsyncJsonWebsocketConsumer):
             }
         )
 
+        # Persist the result behind the end screen
+        await submit_result(result)
+        await clear_journal(self.game.pk)
+
         # Give some time for messages to be sent
         await asyncio.sleep(0.1)
 
-        # Cancel the game loop task
-        if hasattr(self, 'game_loop_task'):
-            self.game_loop_task.cancel()
+        # Called from a tick too, whose loop ends by itself now that game_in_progress is False
+        await self.stop_game_loop()
          
 
-    @database_sync_to_async
-    def get_player_level(self, player):
-        return player.profile.level   
-    
     @database_sync_to_async
     def get_player_usernames(self):
         player1_username = self.game.player1.username
         player2_username = self.game.player2.username
         return player1_username, player2_username
             
-    @database_sync_to_async
-    def finalize_game(self, winner, status, winner_xp, loser_xp):
-        self.game.end_time = timezone.now()
-        self.game.duration = (self.game.end_time - self.game.start_time).total_seconds()
-        self.game.winner = winner
-        self.game.is_completed = True
-        self.game.status = status
-        
-        # Save the game instance
-        self.game.save()
-
-        # Apply XP to profiles if winner and loser are actual User instances
-        if isinstance(winner, User):
-            winner.profile.add_xp(winner_xp)
-        if isinstance(self.game.player2, User) and self.game.player2 != winner:
-            self.game.player2.profile.add_xp(loser_xp)
-
-    async def reset_ball(self):
-        # Reset ball position to the center
-        self.ball_x = 500
-        self.ball_y = 250
-        
-        # Randomly set the ball direction to left or right
-        self.ball_direction_x = -1 if random.random() < 0.5 else 1
-        
-        # Set the ball direction Y to a small random value to avoid straight horizontal movement
-        self.ball_direction_y = (random.random() * 2 - 1) * 0.5  # Random value between -0.5 and 0.5
-
-        # Reset ball speed
-        self.ball_speed = 5
-
-
     async def game_started(self, event):
         await self.send_json({"type": "game_started"})
 
-    async def game_state(self, event):
-        await self.send_json(event)
-
     async def ready_status(self, event):
         await self.send_json({
             "type": "ready_status",
@@ -695,11 +954,6 @@ class LobbyConsumer(AsyncJsonWebsocketConsumer):
         lobby = Lobby.objects.get(room_id=self.room_id)
         return self.user == lobby.host
     
-    @database_sync_to_async
-    def is_user_host_id(self, user_id):
-        lobby = Lobby.objects.get(room_id=self.room_id)
-        return user_id == lobby.host_id  # Use host_id to avoid fetching the host object
-
     @database_sync_to_async
     def delete_lobby(self):
         """Delete the lobby if the host disconnects."""
@@ -713,20 +967,13 @@ class LobbyConsumer(AsyncJsonWebsocketConsumer):
         lobby.is_guest_ready = False
         lobby.save()
 
-class ChaosLobbyConsumer(AsyncJsonWebsocketConsumer):
+class ChaosLobbyConsumer(GameSimulationMixin, AsyncJsonWebsocketConsumer):
+    simulation_mode = "chaos"
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.game_in_progress = False
-        self.left_paddle_y = 250
-        self.right_paddle_y = 250
-        self.left_paddle_speed = 0
-        self.right_paddle_speed = 0
-        self.paddle_size_modifier = 1
-        self.ball_size_modifier = 1
-        self.ball_speed_modifier = 1
-        self.active_power_ups = []
-        self.expire_power_ups = []
-        self.POWER_UPS = ["enlargePaddle", "shrinkPaddle", "slowBall", "fastBall", "teleportBall", "shrinkBall", "growBall"]
+        self.world = create_world("chaos")
         self.game_lock = Lock()
         self.game_manager_channel = None  # Initialize game manager channel
         self.current_round = 1
@@ -739,15 +986,6 @@ class ChaosLobbyConsumer(AsyncJsonWebsocketConsumer):
         await self.update_host_and_guest()
         # Initialize game state variables
         self.game_in_progress = True
-        self.left_paddle_y = 250
-        self.right_paddle_y = 250
-        self.ball_x = 500
-        self.ball_y = 250
-        self.ball_direction_x = 1
-        self.ball_direction_y = 0.5
-        self.ball_speed = 5
-        self.left_score = 0
-        self.right_score = 0
         self.current_round = 1
         self.round_start_time = timezone.now()
 
@@ -755,6 +993,7 @@ class ChaosLobbyConsumer(AsyncJsonWebsocketConsumer):
         self.max_rounds = self.lobby.max_rounds
         self.round_score_limit = self.lobby.round_score_limit
         self.powerup_spawn_rate = self.lobby.powerup_spawn_rate
+        self.world = create_world("chaos", powerup_spawn_rate=self.powerup_spawn_rate)
 
         # Initialize rounds data
         self.rounds = []
@@ -777,7 +1016,7 @@ class ChaosLobbyConsumer(AsyncJsonWebsocketConsumer):
     )
 
         # Start the game loop
-        self.game_loop_task = asyncio.create_task(self.game_loop())
+        await self.start_simulation()
 
 
     async def update_host_and_guest(self):
@@ -785,6 +1024,12 @@ class ChaosLobbyConsumer(AsyncJsonWebsocketConsumer):
         self.host = await self.get_lobby_host()
         self.guest = await self.get_lobby_guest()
 
+    def simulation_sides(self):
+        return {str(self.host.id): "left"}, "right"
+
+    def simulation_settings(self):
+        return {"powerup_spawn_rate": self.powerup_spawn_rate}
+
     @database_sync_to_async
     def create_new_game_instance(self):
         logger.debug(f"Creating new game instance for players: {self.host} and {self.guest}")
@@ -798,6 +1043,7 @@ class ChaosLobbyConsumer(AsyncJsonWebsocketConsumer):
             'is_completed': False,
             'moves_log': [],
             'rounds': [],
+            'seed': self.world.seed,
         }
 
         # Handle player2 (guest)
@@ -894,10 +1140,10 @@ class ChaosLobbyConsumer(AsyncJsonWebsocketConsumer):
             self.channel_name
         )
 
-        # Stop the game if it’s running by canceling the game loop task
+        # Stop the game if it’s running
         if hasattr(self, 'game_loop_task') and not self.game_loop_task.done():
-            self.game_loop_task.cancel()
             self.game_in_progress = False  # Update the game status
+        await self.stop_game_loop()
 
         # Determine if the disconnecting user is the host or the guest
         if await self.is_user_host():
@@ -937,7 +1183,9 @@ class ChaosLobbyConsumer(AsyncJsonWebsocketConsumer):
 
     async def terminate_game_and_notify(self, message, user_role):
         """Ends the game, notifies the players, and deletes the lobby."""
-        await self.finalize_game(None, Game.CANCELED_BY_GUEST if user_role == "guest" else Game.CANCELED_BY_HOST)
+        status = Game.CANCELED_BY_GUEST if user_role == "guest" else Game.CANCELED_BY_HOST
+        await submit_result(game_result(self.game, self.rounds, None, status))
+        await clear_journal(self.game.pk)
 
         # Notify remaining players about game cancellation
         await self.channel_layer.group_send(
@@ -949,9 +1197,8 @@ class ChaosLobbyConsumer(AsyncJsonWebsocketConsumer):
             }
         )
 
-        # Cancel the game loop if running
-        if hasattr(self, 'game_loop_task'):
-            self.game_loop_task.cancel()
+        # Stop the game loop if running
+        await self.stop_game_loop()
 
         # Delete the lobby
         await self.delete_lobby()
@@ -977,6 +1224,8 @@ class ChaosLobbyConsumer(AsyncJsonWebsocketConsumer):
 
         elif action in ["keydown", "keyup"]:
             await self.handle_key_event(action, content)
+        elif action == "request_keyframe":
+            await self.request_keyframe()
 
     async def handle_key_event(self, action, content):
         key = content.get("key")
@@ -997,193 +1246,36 @@ class ChaosLobbyConsumer(AsyncJsonWebsocketConsumer):
             return  # Unrecognized action
 
         # Send paddle speed update to the game manager
-        if self.game_manager_channel:
-            await self.channel_layer.send(
-                self.game_manager_channel,
-                {
-                    "type": "update_paddle_speed",
-                    "user_id": user_id,
-                    "speed": speed,
-                }
-            )
-        else:
-            logger.warning("Game manager channel not set. Cannot send paddle speed update.")
-
-    async def update_paddle_speed(self, event):
-        user_id = event["user_id"]
-        speed = event["speed"]
-        async with self.game_lock:
-            if await self.is_user_host_id(user_id):
-                self.left_paddle_speed = speed
-            else:
-                self.right_paddle_speed = speed
+        await self.send_paddle_speed(user_id, speed, content.get("seq"), content.get("view_tick"))
 
     async def game_loop(self):
-        self.tick_count = 0
-        spawn_interval = int(60 * self.powerup_spawn_rate)
-        while self.game_in_progress:
-            await self.game_tick()
-            self.tick_count += 1
-            if (self.tick_count % (spawn_interval) == 0):
-                self.generate_power_up()
-            if (self.tick_count % 60 == 0):
-                self.check_power_up_expiration()
-            await asyncio.sleep(1 / 60)
-
-    def update_paddle_position(self, paddle, speed):
-        if paddle == "left":
-            self.left_paddle_y = max(0, min(self.left_paddle_y + speed, 500 - (60 * self.paddle_size_modifier)))
-        elif paddle == "right":
-            self.right_paddle_y = max(0, min(self.right_paddle_y + speed, 500 - (60 * self.paddle_size_modifier)))
-
-    def enlarge_paddle(self):
-        self.paddle_size_modifier *= 1.5
-        self.expire_power_ups.append({"type": "enlargePaddle", "time_left": 5})
-
-    def shrink_paddle(self):
-        self.paddle_size_modifier *= 0.5
-        self.expire_power_ups.append({"type": "shrinkPaddle", "time_left": 5})
-
-    def shrink_ball(self):
-        self.ball_size_modifier *= 0.5
-        self.expire_power_ups.append({"type": "shrinkBall", "time_left": 5})
-
-    def grow_ball(self):
-        self.ball_size_modifier *= 1.5
-        self.expire_power_ups.append({"type": "growBall", "time_left": 5})
-
-    def slow_ball(self):
-        self.ball_speed_modifier *= 0.5
-        self.expire_power_ups.append({"type": "slowBall", "time_left": 5})
-
-    def fast_ball(self):
-        self.ball_speed_modifier *= 1.5
-        self.expire_power_ups.append({"type": "fastBall", "time_left": 5})
-
-    def teleport_ball(self):
-        self.ball_x = random.randint(int(30 * self.ball_size_modifier), int(1000 - 30 * self.ball_size_modifier))
-        self.ball_y = random.randint(int(30 * self.ball_size_modifier), int(500 - 30 * self.ball_size_modifier))
-
-    def generate_power_up(self):
-        power_up = random.choice(self.POWER_UPS)
-        power_up_x = random.randint(25, 975)
-        power_up_y = random.randint(25, 475)
-        self.active_power_ups.append({"x": power_up_x, "y": power_up_y, "type": power_up})
-
-    def activate_power_up(self, power_up):
-        if (power_up == "enlargePaddle"):
-            self.enlarge_paddle()
-        elif (power_up == "shrinkPaddle"):
-            self.shrink_paddle()
-        elif (power_up == "slowBall"):
-            self.slow_ball()
-        elif (power_up == "fastBall"):
-            self.fast_ball()
-        elif (power_up == "teleportBall"):
-            self.teleport_ball()
-        elif (power_up == "shrinkBall"):
-            self.shrink_ball()
-        elif (power_up == "growBall"):
-            self.grow_ball()
-
-    def check_power_up_expiration(self):
-        for power_up in list(self.expire_power_ups):
-            power_up['time_left'] -= 1
-            if power_up['time_left'] <= 0:
-                if power_up['type'] == "enlargePaddle":
-                    self.paddle_size_modifier *= 0.5
-                elif power_up['type'] == "shrinkPaddle":
-                    self.paddle_size_modifier *= 1.5
-                elif power_up['type'] == "slowBall":
-                    self.ball_speed_modifier *= 1.5
-                elif power_up['type'] == "fastBall":
-                    self.ball_speed_modifier *= 0.5
-                elif power_up['type'] == "shrinkBall":
-                    self.ball_size_modifier *= 1.5
-                elif power_up['type'] == "growBall":
-                    self.ball_size_modifier *= 0.5
-                self.expire_power_ups.remove(power_up)
-
-    def enforce_modifier_bounds(self):
-        self.paddle_size_modifier = max(0.25, min(self.paddle_size_modifier, 3.375))
-        self.ball_size_modifier = max(0.25, min(self.ball_size_modifier, 3.375))
-        self.ball_speed_modifier = max(0.25, min(self.ball_speed_modifier, 3.375))
-
-    async def game_tick(self):
-        async with self.game_lock:
+        await FixedTimestepLoop(tick_rate=self.simulation_rate).run(self.game_tick, lambda: self.game_in_progress)
 
-            # Update paddle positions
-            self.update_paddle_position("left", self.left_paddle_speed)
-            self.update_paddle_position("right", self.right_paddle_speed)
-
-            # Update ball position
-            self.ball_x += self.ball_direction_x * (self.ball_speed * self.ball_speed_modifier)
-            self.ball_y += self.ball_direction_y * (self.ball_speed * self.ball_speed_modifier)
-
-            # Handle collisions with top/bottom walls
-            if self.ball_y - 15 * self.ball_size_modifier <= 0 or self.ball_y + 15 * self.ball_size_modifier >= 500:
-                self.ball_direction_y *= -1
-
-            # Paddle collision handling
-            if self.ball_x - (15 * self.ball_size_modifier) <= 10 and self.left_paddle_y < self.ball_y < self.left_paddle_y + (60 * self.paddle_size_modifier):
-                self.ball_direction_x *= -1
-            elif self.ball_x + (15 * self.ball_size_modifier) >= 990 and self.right_paddle_y < self.ball_y < self.right_paddle_y + (60 * self.paddle_size_modifier):
-                self.ball_direction_x *= -1
-
-            # Power-up logic
-            for power_up in list(self.active_power_ups):  # Use a copy to avoid modification during iteration
-                power_up_x = power_up['x']
-                power_up_y = power_up['y']
-                power_up_type = power_up['type']
-                distance_squared = (self.ball_x - power_up_x) ** 2 + (self.ball_y - power_up_y) ** 2
-                radius_sum_squared = (15 + 15 * self.ball_size_modifier) ** 2
-                if distance_squared < radius_sum_squared:
-                    self.activate_power_up(power_up_type)
-                    self.active_power_ups.remove(power_up)
-
-            self.enforce_modifier_bounds()
-
-            # Scoring logic
-            scoring_player = None
-            if self.ball_x - 15 * self.ball_size_modifier <= 0:
-                self.right_score += 1
-                scoring_player = 'right'
-                await self.reset_ball()
-            elif self.ball_x + 15 * self.ball_size_modifier >= 1000:
-                self.left_score += 1
-                scoring_player = 'left'
-                await self.reset_ball()
+    async def game_tick(self, dt):
+        async with self.game_lock:
+            # Apply the inputs that arrived since the last tick
+            self.inputs.drain(self.world)
+            # Move paddles and ball, resolve collisions, power-ups and scoring
+            self.world.step(dt)
 
             # **Add this block to check for round completion**
-            if self.left_score >= self.round_score_limit or self.right_score >= self.round_score_limit:
+            if self.world.round_over(self.round_score_limit):
                 await self.complete_round()
                 return  # Exit the game tick to prevent further processing until the next loop
 
-            # Send game state to clients
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    "type": "game_state",
-                    "leftScore": self.left_score,
-                    "rightScore": self.right_score,
-                    "ball_x": self.ball_x,
-                    "ball_y": self.ball_y,
-                    "left_paddle_y": self.left_paddle_y,
-                    "right_paddle_y": self.right_paddle_y,
-                    "paddle_size_modifier": self.paddle_size_modifier,
-                    "ball_size_modifier": self.ball_size_modifier,
-                    "left_speed": self.left_paddle_speed,
-                    "right_speed": self.right_paddle_speed,
-                    "active_power_ups": self.active_power_ups or [],
-                }
-            )
+        # Send game state to clients, outside the lock so inputs don't wait on the channel layer
+        if self.broadcast_pacer.due(dt):
+            await self.broadcast_state()
+        await self.feed_spectators()
 
     async def complete_round(self):
         print("Round completed")
+        left_score = self.world.scores["left"]
+        right_score = self.world.scores["right"]
         # Determine round winner
-        if self.left_score > self.right_score:
+        if left_score > right_score:
             round_winner = self.game.player1.username
-        elif self.right_score > self.left_score:
+        elif right_score > left_score:
             round_winner = self.game.player2.username
         else:
             round_winner = "Tie"
@@ -1193,8 +1285,8 @@ class ChaosLobbyConsumer(AsyncJsonWebsocketConsumer):
             'round_number': self.current_round,
             'start_time': self.round_start_time.isoformat(),
             'end_time': timezone.now().isoformat(),
-            'score_player1': self.left_score,
-            'score_player2': self.right_score,
+            'score_player1': left_score,
+            'score_player2': right_score,
             'winner': round_winner
         }
 
@@ -1217,12 +1309,8 @@ class ChaosLobbyConsumer(AsyncJsonWebsocketConsumer):
             await self.end_game()
             return  # Exit the game tick to prevent further processing until the next loop
 
-        # Clear power-ups for next round
-        self.active_power_ups = []
-
-        # Reset scores for next round
-        self.left_score = 0
-        self.right_score = 0
+        # Reset scores and clear power-ups for next round
+        self.world.next_round()
         self.round_start_time = timezone.now()  # Reset round start time
 
         
@@ -1241,55 +1329,15 @@ class ChaosLobbyConsumer(AsyncJsonWebsocketConsumer):
         })
             
     async def add_round_to_game(self, round_data):
+        # Written to the Game with the result (see games.results), journaled meanwhile
         self.rounds.append(round_data)
-        await database_sync_to_async(self._save_rounds_to_game)()
-
-    def _save_rounds_to_game(self):
-        self.game.rounds = self.rounds
-        self.game.save()   
+        await journal_round(self.game.pk, round_data)
 
     @database_sync_to_async
     def set_game_status(self, status):
         """Sets the status of the current game."""
         self.game.status = status
-        self.game.save()
-        
-    async def calculate_xp_gain(self, game, player, is_winner=False):
-        # Set a default duration to handle None values
-        game_duration = game.duration if game.duration is not None else 0
-
-        # Base XP values
-        base_xp = 50  # Base XP for winning a game
-        level_bonus = 1.5 * await self.get_player_level(player)  # Use async method to get player level
-
-        # Calculate duration-based XP, with diminishing returns
-        if game_duration < 300:  # Short game
-            duration_xp = game_duration * 0.5  # 0.5 XP per second for shorter games
-        elif game_duration < 1200:  # Medium game
-            duration_xp = game_duration * 0.3  # 0.3 XP per second for medium length games
-        else:  # Long game
-            duration_xp = min(400 + (game_duration - 1200) * 0.1, 600)  # Cap XP for long games
-
-        # Score difference multiplier for higher XP based on performance
-        score_difference = abs(game.score_player1 - game.score_player2)
-        performance_multiplier = 1 + min(score_difference / 100, 0.5)  # Up to +50% XP based on score gap
-
-        # Game mode multiplier: more challenging modes award more XP
-        if game.game_mode == Game.PVE:
-            mode_multiplier = 0.7 if not is_winner else 1.0  # PvE easier, give less XP if lost
-        elif game.game_mode == Game.LOCAL_PVP:
-            mode_multiplier = 1.0 if not is_winner else 1.1  # Balanced mode, slight bonus for win
-        else:
-            mode_multiplier = 1.1 if not is_winner else 1.3  # Online PvP, higher reward for higher challenge
-
-        # Apply base, duration, level, performance, and mode multipliers
-        xp_gain = (base_xp + duration_xp + level_bonus) * performance_multiplier * mode_multiplier
-
-        # Additional XP for winning, varies by game mode
-        if is_winner:
-            xp_gain += 50 if game.game_mode == Game.PVE else 75  # Higher bonus for PvP games
-
-        return int(xp_gain)
+        self.game.save(update_fields=['status'])
         
     async def end_game(self):
         logger.info(f"Game data: {self.game}")
@@ -1318,11 +1366,13 @@ class ChaosLobbyConsumer(AsyncJsonWebsocketConsumer):
 
         logger.info(f"Game winner: {winner}")
 
-        # Calculate XP gain
-        winner_xp = await self.calculate_xp_gain(self.game, winner, is_winner=True) if winner else 0
-        loser_xp = max(10, await self.calculate_xp_gain(self.game, loser, is_winner=False) // 4) if loser else 0
-
-        await self.finalize_game(winner, Game.FINISHED, winner_xp, loser_xp)
+        # XP is worked out when the result is written (see games.results)
+        awards = []
+        if isinstance(winner, User):
+            awards.append(xp_award(winner, is_winner=True))
+        if isinstance(loser, User):
+            awards.append(xp_award(loser, share=4, minimum=10))
+        result = game_result(self.game, self.rounds, winner, Game.FINISHED, awards)
 
         # Notify players that the game has ended
         await self.channel_layer.group_send(
@@ -1333,69 +1383,26 @@ class ChaosLobbyConsumer(AsyncJsonWebsocketConsumer):
             }
         )
 
+        # Persist the result behind the end screen
+        await submit_result(result)
+        await clear_journal(self.game.pk)
+
         # Give some time for messages to be sent
         await asyncio.sleep(0.1)
 
-        # Cancel the game loop task
-        if hasattr(self, 'game_loop_task'):
-            self.game_loop_task.cancel()
+        # Called from a tick too, whose loop ends by itself now that game_in_progress is False
+        await self.stop_game_loop()
          
 
-    @database_sync_to_async
-    def get_player_level(self, player):
-        return player.profile.level   
-    
     @database_sync_to_async
     def get_player_usernames(self):
         player1_username = self.game.player1.username
         player2_username = self.game.player2.username
         return player1_username, player2_username
             
-    @database_sync_to_async
-    def finalize_game(self, winner, status, winner_xp, loser_xp):
-        self.game.end_time = timezone.now()
-        self.game.duration = (self.game.end_time - self.game.start_time).total_seconds()
-        self.game.winner = winner
-        self.game.is_completed = True
-        self.game.status = status
-        
-        # Save the game instance
-        self.game.save()
-
-        # Apply XP to profiles if winner and loser are actual User instances
-        if isinstance(winner, User):
-            winner.profile.add_xp(winner_xp)
-        if isinstance(self.game.player2, User) and self.game.player2 != winner:
-            self.game.player2.profile.add_xp(loser_xp)
-
-    async def reset_ball(self):
-        # Reset ball position to the center
-        self.ball_x = 500
-        self.ball_y = 250
-
-        # Reset size and speed modifiers
-        self.ball_speed_modifier = 1
-        self.ball_size_modifier = 1
-        self.paddle_size_modifier = 1
-
-        # Clear active power-ups to prevent stacking between rounds
-        self.expire_power_ups.clear()
-
-        # Randomly set the ball direction to left or right
-        self.ball_direction_x = -1 if random.random() < 0.5 else 1
-        
-        # Set the ball direction Y to a small random value to avoid straight horizontal movement
-        self.ball_direction_y = (random.random() * 2 - 1) * 0.5  # Random value between -0.5 and 0.5
-
-        # Reset ball speed
-        self.ball_speed = 5
-
     async def game_started(self, event):
         await self.send_json({"type": "game_started"})
 
-    async def game_state(self, event):
-        await self.send_json(event)
-
     async def ready_status(self, event):
         await self.send_json({
             "type": "ready_status",
@@ -1497,11 +1504,6 @@ class ChaosLobbyConsumer(AsyncJsonWebsocketConsumer):
         lobby = ChaosLobby.objects.get(room_id=self.room_id)
         return self.user == lobby.host
     
-    @database_sync_to_async
-    def is_user_host_id(self, user_id):
-        lobby = ChaosLobby.objects.get(room_id=self.room_id)
-        return user_id == lobby.host_id  # Use host_id to avoid fetching the host object
-
     @database_sync_to_async
     def delete_lobby(self):
         """Delete the lobby if the host disconnects."""
@@ -1515,22 +1517,13 @@ class ChaosLobbyConsumer(AsyncJsonWebsocketConsumer):
         lobby.is_guest_ready = False
         lobby.save()
 
-class ArenaLobbyConsumer(AsyncJsonWebsocketConsumer):
+class ArenaLobbyConsumer(GameSimulationMixin, AsyncJsonWebsocketConsumer):
+    simulation_mode = "arena"
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.game_in_progress = False
-
-        self.left_paddle_y = 400
-        self.right_paddle_y = 400
-        self.top_paddle_x = 370
-        self.bottom_paddle_x = 370
-
-        self.left_paddle_speed = 0
-        self.right_paddle_speed = 0
-        self.top_paddle_speed = 0
-        self.bottom_paddle_speed = 0
-
+        self.world = create_world("arena")
         self.game_lock = Lock()
         self.game_manager_channel = None  # Initialize game manager channel
         self.current_round = 1
@@ -1543,24 +1536,7 @@ class ArenaLobbyConsumer(AsyncJsonWebsocketConsumer):
         await self.update_player_status()
         # Initialize game state variables
         self.game_in_progress = True
-
-        self.last_touch = None
-        self.left_paddle_y = 400
-        self.right_paddle_y = 400
-        self.top_paddle_x = 370
-        self.bottom_paddle_x = 370
-
-        self.ball_x = 400
-        self.ball_y = 400
-        self.ball_direction_x = 1
-        self.ball_direction_y = 0.5
-        self.ball_speed = 5
-
-        self.left_score = 0
-        self.right_score = 0
-        self.top_score = 0
-        self.bottom_score = 0
-
+        self.world = create_world("arena")
         self.current_round = 1
         self.round_start_time = timezone.now()
 
@@ -1589,7 +1565,7 @@ class ArenaLobbyConsumer(AsyncJsonWebsocketConsumer):
     )
 
         # Start the game loop
-        self.game_loop_task = asyncio.create_task(self.game_loop())
+        await self.start_simulation()
 
     async def update_player_status(self):
         self.lobby = await self.get_lobby(self.room_id)
@@ -1598,6 +1574,10 @@ class ArenaLobbyConsumer(AsyncJsonWebsocketConsumer):
         self.player_three = await self.get_lobby_player_three()
         self.player_four = await self.get_lobby_player_four()
 
+    def simulation_sides(self):
+        players = [self.host, self.player_two, self.player_three, self.player_four]
+        return {str(player.id): side for player, side in zip(players, self.world.sides) if player}, None
+
     @database_sync_to_async
     def create_new_game_instance(self):
         logger.debug(f"Creating new game instance for players: {self.host}, {self.player_two}, {self.player_three}, {self.player_four}")
@@ -1611,6 +1591,7 @@ class ArenaLobbyConsumer(AsyncJsonWebsocketConsumer):
             'is_completed': False,
             'moves_log': [],
             'rounds': [],
+            'seed': self.world.seed,
         }
 
         # Handle player2
@@ -1743,10 +1724,10 @@ class ArenaLobbyConsumer(AsyncJsonWebsocketConsumer):
             self.channel_name
         )
 
-        # Stop the game if it’s running by canceling the game loop task
+        # Stop the game if it’s running
         if hasattr(self, 'game_loop_task') and not self.game_loop_task.done():
-            self.game_loop_task.cancel()
             self.game_in_progress = False  # Update the game status
+        await self.stop_game_loop()
 
         # Determine if the disconnecting user is the host or the guest
         if await self.is_user_host():
@@ -1787,7 +1768,9 @@ class ArenaLobbyConsumer(AsyncJsonWebsocketConsumer):
 
     async def terminate_game_and_notify(self, message, user_role):
         """Ends the game, notifies the players, and deletes the lobby."""
-        await self.finalize_game(None, Game.CANCELED_BY_GUEST if user_role == "guest" else Game.CANCELED_BY_HOST)
+        status = Game.CANCELED_BY_GUEST if user_role == "guest" else Game.CANCELED_BY_HOST
+        await submit_result(game_result(self.game, self.rounds, None, status))
+        await clear_journal(self.game.pk)
 
         # Notify remaining players about game cancellation
         await self.channel_layer.group_send(
@@ -1799,9 +1782,8 @@ class ArenaLobbyConsumer(AsyncJsonWebsocketConsumer):
             }
         )
 
-        # Cancel the game loop if running
-        if hasattr(self, 'game_loop_task'):
-            self.game_loop_task.cancel()
+        # Stop the game loop if running
+        await self.stop_game_loop()
 
         # Delete the lobby
         await self.delete_lobby()
@@ -1827,6 +1809,8 @@ class ArenaLobbyConsumer(AsyncJsonWebsocketConsumer):
 
         elif action in ["keydown", "keyup"]:
             await self.handle_key_event(action, content)
+        elif action == "request_keyframe":
+            await self.request_keyframe()
                 
     async def handle_key_event(self, action, content):
         key = content.get("key")
@@ -1847,140 +1831,48 @@ class ArenaLobbyConsumer(AsyncJsonWebsocketConsumer):
             return  # Unrecognized action
 
         # Send paddle speed update to the game manager
-        if self.game_manager_channel:
-            await self.channel_layer.send(
-                self.game_manager_channel,
-                {
-                    "type": "update_paddle_speed",
-                    "user_id": user_id,
-                    "speed": speed,
-                }
-            )
-        else:
-            logger.warning("Game manager channel not set. Cannot send paddle speed update.")
-
-    async def update_paddle_speed(self, event):
-        user_id = event["user_id"]
-        speed = event["speed"]
-        async with self.game_lock:
-            pos = await self.match_user_id(user_id)
-            if pos == 0:
-                self.left_paddle_speed = speed
-            elif pos == 1:
-                self.right_paddle_speed = speed
-            elif pos == 2:
-                self.top_paddle_speed = speed
-            elif pos == 3:
-                self.bottom_paddle_speed = speed
-            else:
-                logger.warning(f"User ID {user_id} not found in the game.")
+        await self.send_paddle_speed(user_id, speed, content.get("seq"), content.get("view_tick"))
 
     async def game_loop(self):
-        while self.game_in_progress:
-            await self.game_tick()
-            await asyncio.sleep(1 / 60)
-
-    def update_paddle_position(self, paddle, speed):
-        if paddle == "left":
-            self.left_paddle_y = max(0, min(self.left_paddle_y + speed, 800 - 60))
-        elif paddle == "right":
-            self.right_paddle_y = max(0, min(self.right_paddle_y + speed, 800 - 60))
-        elif paddle == "top":
-            self.top_paddle_x = max(0, min(self.top_paddle_x + speed, 800 - 60))
-        elif paddle == "bottom":
-            self.bottom_paddle_x = max(0, min(self.bottom_paddle_x + speed, 800 - 60))
-
-    async def game_tick(self):
-        async with self.game_lock:
+        await FixedTimestepLoop(tick_rate=self.simulation_rate).run(self.game_tick, lambda: self.game_in_progress)
 
-            # Update paddle positions
-            self.update_paddle_position("left", self.left_paddle_speed)
-            self.update_paddle_position("right", self.right_paddle_speed)
-            self.update_paddle_position("top", self.top_paddle_speed)
-            self.update_paddle_position("bottom", self.bottom_paddle_speed)
-
-            # Update ball position
-            self.ball_x += self.ball_direction_x * self.ball_speed
-            self.ball_y += self.ball_direction_y * self.ball_speed
-
-            # Paddle collision handling
-            if self.ball_x - 15 <= 10 and self.left_paddle_y < self.ball_y < self.left_paddle_y + 60:
-                self.ball_direction_x *= -1
-                self.last_touch = "left"
-            elif self.ball_x + 15 >= 790 and self.right_paddle_y < self.ball_y < self.right_paddle_y + 60:
-                self.ball_direction_x *= -1
-                self.last_touch = "right"
-            elif self.ball_y - 15 <= 10 and self.top_paddle_x < self.ball_x < self.top_paddle_x + 60:
-                self.ball_direction_y *= -1
-                self.last_touch = "top"
-            elif self.ball_y + 15 >= 790 and self.bottom_paddle_x < self.ball_x < self.bottom_paddle_x + 60:
-                self.ball_direction_y *= -1
-                self.last_touch = "bottom"
-
-            # Scoring logic
-            scoring_player = None
-            if self.last_touch:
-                if self.ball_x <= 0 or self.ball_x >= 800 or self.ball_y <= 0 or self.ball_y >= 800:
-                    scoring_player = self.last_touch
-                    await self.reset_ball()
-                    if scoring_player == "left":
-                        self.left_score += 1
-                    elif scoring_player == "right":
-                        self.right_score += 1
-                    elif scoring_player == "top":
-                        self.top_score += 1
-                    elif scoring_player == "bottom":
-                        self.bottom_score += 1
-            else:
-                if self.ball_x <= 0 or self.ball_x >= 800 or self.ball_y <= 0 or self.ball_y >= 800:
-                    await self.reset_ball()
+    async def game_tick(self, dt):
+        async with self.game_lock:
+            # Apply the inputs that arrived since the last tick
+            self.inputs.drain(self.world)
+            # Move paddles and ball, resolve collisions and scoring
+            self.world.step(dt)
 
             # **Add this block to check for round completion**
-            if any(score >= self.round_score_limit for score in [self.left_score, self.right_score, self.top_score, self.bottom_score]):
+            if self.world.round_over(self.round_score_limit):
                 await self.complete_round()
                 return  # Exit the game tick to prevent further processing until the next loop
 
-            # Send game state to clients
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    "type": "game_state",
-                    "leftScore": self.left_score,
-                    "rightScore": self.right_score,
-                    "topScore": self.top_score,
-                    "bottomScore": self.bottom_score,
-                    "ball_x": self.ball_x,
-                    "ball_y": self.ball_y,
-                    "left_paddle_y": self.left_paddle_y,
-                    "right_paddle_y": self.right_paddle_y,
-                    "top_paddle_x": self.top_paddle_x,
-                    "bottom_paddle_x": self.bottom_paddle_x,
-                    "left_speed": self.left_paddle_speed,
-                    "right_speed": self.right_paddle_speed,
-                    "top_speed": self.top_paddle_speed,
-                    "bottom_speed": self.bottom_paddle_speed,
-                }
-            )
+        # Send game state to clients, outside the lock so inputs don't wait on the channel layer
+        if self.broadcast_pacer.due(dt):
+            await self.broadcast_state()
+        await self.feed_spectators()
 
     async def complete_round(self):
         print("Round completed")
+        scores = self.world.scores
         # Determine round winner
-        scores = { self.game.player1.username: self.left_score,
-                   self.game.player2.username: self.right_score,
-                   self.game.player3.username: self.top_score,
-                   self.game.player4.username: self.bottom_score }
+        usernames = { self.game.player1.username: scores["left"],
+                      self.game.player2.username: scores["right"],
+                      self.game.player3.username: scores["top"],
+                      self.game.player4.username: scores["bottom"] }
 
-        round_winner = max(scores, key=scores.get)
+        round_winner = max(usernames, key=usernames.get)
 
         # Record round details
         round_data = {
             'round_number': self.current_round,
             'start_time': self.round_start_time.isoformat(),
             'end_time': timezone.now().isoformat(),
-            'score_player1': self.left_score,
-            'score_player2': self.right_score,
-            'score_player3': self.top_score,
-            'score_player4': self.bottom_score,
+            'score_player1': scores["left"],
+            'score_player2': scores["right"],
+            'score_player3': scores["top"],
+            'score_player4': scores["bottom"],
             'winner': round_winner
         }
 
@@ -2004,10 +1896,7 @@ class ArenaLobbyConsumer(AsyncJsonWebsocketConsumer):
             return  # Exit the game tick to prevent further processing until the next loop
 
         # Reset scores for next round
-        self.left_score = 0
-        self.right_score = 0
-        self.top_score = 0
-        self.bottom_score = 0
+        self.world.next_round()
         self.round_start_time = timezone.now()  # Reset round start time
 
     async def round_completed(self, event):
@@ -2025,49 +1914,15 @@ class ArenaLobbyConsumer(AsyncJsonWebsocketConsumer):
         })
 
     async def add_round_to_game(self, round_data):
+        # Written to the Game with the result (see games.results), journaled meanwhile
         self.rounds.append(round_data)
-        await database_sync_to_async(self._save_rounds_to_game)()
-
-    def _save_rounds_to_game(self):
-        self.game.rounds = self.rounds
-        self.game.save()   
+        await journal_round(self.game.pk, round_data)
 
     @database_sync_to_async
     def set_game_status(self, status):
         """Sets the status of the current game."""
         self.game.status = status
-        self.game.save()
-
-    async def calculate_xp_gain(self, game, player, is_winner=False):
-        # Set a default duration to handle None values
-        game_duration = game.duration if game.duration is not None else 0
-
-        # Base XP values
-        base_xp = 50  # Base XP for winning a game
-        level_bonus = 1.5 * await self.get_player_level(player)  # Use async method to get player level
-
-        # Calculate duration-based XP, with diminishing returns
-        if game_duration < 300:  # Short game
-            duration_xp = game_duration * 0.5  # 0.5 XP per second for shorter games
-        elif game_duration < 1200:  # Medium game
-            duration_xp = game_duration * 0.3  # 0.3 XP per second for medium length games
-        else:  # Long game
-            duration_xp = min(400 + (game_duration - 1200) * 0.1, 600)  # Cap XP for long games
-
-        # Score difference multiplier for higher XP based on performance
-        score_difference = abs(game.score_player1 - game.score_player2)
-        performance_multiplier = 1 + min(score_difference / 100, 0.5)  # Up to +50% XP based on score gap
-
-        mode_multiplier = 1.2 if not is_winner else 1.4  # Online PvP, higher reward for higher challenge
-
-        # Apply base, duration, level, performance, and mode multipliers
-        xp_gain = (base_xp + duration_xp + level_bonus) * performance_multiplier * mode_multiplier
-
-        # Additional XP for winning, varies by game mode
-        if is_winner:
-            xp_gain += 50 if game.game_mode == Game.PVE else 75  # Higher bonus for PvP games
-
-        return int(xp_gain)
+        self.game.save(update_fields=['status'])
 
     async def end_game(self):
         logger.info(f"Game data: {self.game}")
@@ -2110,12 +1965,11 @@ class ArenaLobbyConsumer(AsyncJsonWebsocketConsumer):
 
         logger.info(f"Game winner: {winner}")
 
-        # Calculate XP gain
-        winner_xp = await self.calculate_xp_gain(self.game, winner, is_winner=True) if winner else 0
-        loser_xps = [await self.calculate_xp_gain(self.game, player, is_winner=False) for player in losers]
-  # loser_xp = max(10, await self.calculate_xp_gain(self.game, loser, is_winner=False) // 4) if loser else 0
-
-        await self.finalize_game(winner, Game.FINISHED, winner_xp, loser_xps)
+        # XP is worked out when the result is written (see games.results)
+        awards = [xp_award(player) for player in losers if isinstance(player, User)]
+        if isinstance(winner, User):
+            awards.append(xp_award(winner, is_winner=True))
+        result = game_result(self.game, self.rounds, winner, Game.FINISHED, awards)
 
         # Notify players that the game has ended
         await self.channel_layer.group_send(
@@ -2126,16 +1980,15 @@ class ArenaLobbyConsumer(AsyncJsonWebsocketConsumer):
             }
         )
 
+        # Persist the result behind the end screen
+        await submit_result(result)
+        await clear_journal(self.game.pk)
+
         # Give some time for messages to be sent
         await asyncio.sleep(0.1)
 
-        # Cancel the game loop task
-        if hasattr(self, 'game_loop_task'):
-            self.game_loop_task.cancel()
-
-    @database_sync_to_async
-    def get_player_level(self, player):
-        return player.profile.level
+        # Called from a tick too, whose loop ends by itself now that game_in_progress is False
+        await self.stop_game_loop()
 
     @database_sync_to_async
     def get_player_usernames(self):
@@ -2145,48 +1998,9 @@ class ArenaLobbyConsumer(AsyncJsonWebsocketConsumer):
         player4_username = self.game.player4.username
         return player1_username, player2_username, player3_username, player4_username
 
-    @database_sync_to_async
-    def finalize_game(self, winner, status, winner_xp, loser_xps):
-        self.game.end_time = timezone.now()
-        self.game.duration = (self.game.end_time - self.game.start_time).total_seconds()
-        self.game.winner = winner
-        self.game.is_completed = True
-        self.game.status = status
-
-        # Save the game instance
-        self.game.save()
-
-        # Apply XP to profiles if winner and loser are actual User instances
-        if isinstance(winner, User):
-            winner.profile.add_xp(winner_xp)
-
-        for loser, loser_xp in zip([self.game.player2, self.game.player3, self.game.player4], loser_xps):
-            if isinstance(loser, User):
-                loser.profile.add_xp(loser_xp)
-
-
-    async def reset_ball(self):
-        # Reset ball position to the center
-        self.ball_x = 400
-        self.ball_y = 400
-
-        self.last_touch = None
-
-        # Randomly set the ball direction to left or right
-        self.ball_direction_x = -1 if random.random() < 0.5 else 1
-
-        # Set the ball direction Y to a small random value to avoid straight horizontal movement
-        self.ball_direction_y = (random.random() * 2 - 1) * 0.5  # Random value between -0.5 and 0.5
-
-        # Reset ball speed
-        self.ball_speed = 5
-
     async def game_started(self, event):
         await self.send_json({"type": "game_started"})
 
-    async def game_state(self, event):
-        await self.send_json(event)
-
     async def ready_status(self, event):
         await self.send_json({
             "type": "ready_status",
@@ -2307,20 +2121,6 @@ class ArenaLobbyConsumer(AsyncJsonWebsocketConsumer):
         lobby = ArenaLobby.objects.get(room_id=self.room_id)
         return self.user == lobby.player_one
 
-    @database_sync_to_async
-    def match_user_id(self, user_id):
-        lobby = ArenaLobby.objects.get(room_id=self.room_id)
-        if user_id == lobby.player_one_id:
-            return 0
-        elif lobby.player_two and user_id == lobby.player_two_id:
-            return 1
-        elif lobby.player_three and user_id == lobby.player_three_id:
-            return 2
-        elif lobby.player_four and user_id == lobby.player_four_id:
-            return 3
-        else:
-            return -1
-
     @database_sync_to_async
     def delete_lobby(self):
         """Delete the lobby if the host disconnects."""
@@ -2772,11 +2572,13 @@ class TournamentConsumer(AsyncJsonWebsocketConsumer):
             raise Exception("Both players need to be real players to start a game!")
         logger.debug(f"Sending message to start game for match {match_id}")
         logger.debug(f"start_game p1_id: {p1.id}, p2_id: {p2.id}")
+        worker = await sync_to_async(assign_worker)(self.room_id, match_id)
         await self.channel_layer.group_send(
             self.room_group_name,
             {
                 "type": "join_match",
                 "match_id": match_id,
+                "worker": worker,
                 "p1_id": p1.id,
                 "p2_id": p2.id
             }
@@ -2814,6 +2616,7 @@ class TournamentConsumer(AsyncJsonWebsocketConsumer):
         await self.send_json({
             "type": "join_match",
             "match_id": match_id,
+            "worker": event.get("worker"),
             "players": {
                 "p1_id": p1_id,
                 "p2_id": p2_id
@@ -2821,29 +2624,17 @@ class TournamentConsumer(AsyncJsonWebsocketConsumer):
         })
 
       
-class TournamentMatchConsumer(AsyncJsonWebsocketConsumer):
+class TournamentMatchConsumer(GameSimulationMixin, AsyncJsonWebsocketConsumer):
+    timer_rate = 10  # clock ticks per second of the start countdown and the match timer
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.game_in_progress = False
-
-        self.left_paddle_y = 250
-        self.right_paddle_y = 250
-        self.left_paddle_speed = 0
-        self.right_paddle_speed = 0
-
-        self.ball_x = 500
-        self.ball_y = 250
-        self.ball_direction_x = 1
-        self.ball_direction_y = 0.5
-        self.ball_speed = 5
-
-        self.left_score = 0 # player1
-        self.right_score = 0 # player2
-
+        self.world = create_world("classic") # left is player1, right is player2
         self.game_lock = Lock()
         self.game_loop_task = None
-        self.countdown_task = None
-        self.match_end_task = None
+        self.match_timers = TimerWheel()
+        self.timer_task = None
 
         self.left_player = None
         self.right_player = None
@@ -2902,12 +2693,11 @@ class TournamentMatchConsumer(AsyncJsonWebsocketConsumer):
         )
         await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
         if self.game_loop_task and not self.game_loop_task.done():
-            self.game_loop_task.cancel()
             self.game_in_progress = False
-        if self.countdown_task and not self.countdown_task.done():
-            self.countdown_task.cancel()
-        if self.match_end_task and not self.match_end_task.done():
-            self.match_end_task.cancel()
+        await self.stop_game_loop()
+        self.match_timers.clear()
+        if self.timer_task and not self.timer_task.done():
+            self.timer_task.cancel()
 
     async def receive_json(self, content):
         try:
@@ -2915,13 +2705,15 @@ class TournamentMatchConsumer(AsyncJsonWebsocketConsumer):
             logger.debug(f"Received action: {action} from user {self.user.username}")
             if action in ["keydown", "keyup"]:
                 await self.handle_key_event(action, content)
+            elif action == "request_keyframe":
+                await self.request_keyframe()
 
         except Exception as e:
             logger.error(f"Error receiving message: {e}")
             await self.send_json({"type": "error", "message": str(e)})
 
-    async def is_left_player_id(self, user_id):
-        return user_id == str(self.left_player.id)
+    def simulation_sides(self):
+        return {str(self.left_player.id): "left"}, "right"
 
     async def handle_key_event(self, action, content):
         key = content.get("key")
@@ -2937,28 +2729,8 @@ class TournamentMatchConsumer(AsyncJsonWebsocketConsumer):
                 speed = 0
         else:
             speed = 0
-        
-        if self.game_manager_channel:
-            await self.channel_layer.send(
-                self.game_manager_channel,
-                {
-                    "type": "update_paddle_speed",
-                    "speed": speed,
-                    "user_id": user_id
-                }
-            )
-        else:
-            logger.warning("Game manager channel is not set. Cannot send paddle speed update.")
 
-    async def update_paddle_speed(self, event):
-        user_id = event["user_id"]
-        speed = event["speed"]
-        async with self.game_lock:
-            if await self.is_left_player_id(user_id):
-                self.left_paddle_speed = speed
-            else:
-                self.right_paddle_speed = speed
-            logger.debug(f'updated paddle speeds: left: {self.left_paddle_speed} right: {self.right_paddle_speed}')
+        await self.send_paddle_speed(user_id, speed, content.get("seq"), content.get("view_tick"))
 
     async def player_disconnected(self, event):
         await self.send_json({
@@ -2968,23 +2740,42 @@ class TournamentMatchConsumer(AsyncJsonWebsocketConsumer):
         await self.end_match()
         
 
+    def schedule(self, seconds, callback, *args):
+        """Await callback(*args) on the match clock the given number of seconds from now."""
+        self.match_timers.schedule(round(seconds * self.timer_rate), callback, *args)
+        if self.timer_task is None or self.timer_task.done():
+            self.timer_task = asyncio.create_task(self.run_timers())
+
+    async def run_timers(self):
+        # One clock for all pending timers, it stops once none are left
+        await FixedTimestepLoop(tick_rate=self.timer_rate).run(self.timer_tick, lambda: len(self.match_timers) > 0)
+
+    async def timer_tick(self, dt):
+        for callback, args in self.match_timers.advance():
+            await callback(*args)
+
+    async def count_down(self, event_type, remaining_time, finished):
+        """Send remaining_time to the room now and every following second, then await finished()."""
+        logger.debug(f"{event_type}: {remaining_time}, sent from {self.user.username}")
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {
+                "type": event_type,
+                "remaining_time": remaining_time
+            }
+        )
+        if remaining_time > 1:
+            self.schedule(1, self.count_down, event_type, remaining_time - 1, finished)
+        else:
+            self.schedule(1, finished)
+
     async def start_countdown(self):
-        try:
-            total_time = 5  # Total match time in seconds
-            for remaining_time in range(total_time, 0, -1):
-                logger.debug(f"Remaining time until start: {remaining_time}, sent from {self.user.username}")
-                await self.channel_layer.group_send(
-                    self.room_group_name,
-                    {
-                        "type": "timer_until_start",
-                        "remaining_time": remaining_time
-                    }
-                )
-                await asyncio.sleep(1)
-            if not self.game_in_progress:
-                await self.start_game()
-        except asyncio.CancelledError:
-            return
+        total_time = 5  # Seconds until the match starts
+        await self.count_down("timer_until_start", total_time, self.countdown_finished)
+
+    async def countdown_finished(self):
+        if not self.game_in_progress:
+            await self.start_game()
 
     async def start_game(self):
         if self.game_manager_channel == self.channel_name:
@@ -2993,9 +2784,10 @@ class TournamentMatchConsumer(AsyncJsonWebsocketConsumer):
                 self.room_group_name,
                 {"type": "game_started"}
             )
+            await self.save_match_seed(self.world.seed)
         self.game_in_progress = True
-        self.game_loop_task = asyncio.create_task(self.game_loop())
-        self.match_end_task = asyncio.create_task(self.match_timer())
+        await self.start_simulation()
+        await self.match_timer()
         
 
     @database_sync_to_async
@@ -3022,31 +2814,17 @@ class TournamentMatchConsumer(AsyncJsonWebsocketConsumer):
     async def player_ready(self, event): # only received by the game manager, so the game manager can start the game
         """game manager listenes to player_ready event, so it can start the game+countdown"""
         logger.debug(f'player_ready event received by {self.user.username}')
-        self.countdown_task = asyncio.create_task(self.start_countdown())
+        await self.start_countdown()
 
     async def match_timer(self):
-        try:
-            total_time = 5  # Total match time in seconds TODO set back to 30
-            for remaining_time in range(total_time, 0, -1):
-                logger.debug(f"Remaining time: {remaining_time}")
-                await self.channel_layer.group_send(
-                    self.room_group_name,
-                    {
-                        "type": "match_timer_update",
-                        "remaining_time": remaining_time
-                    }
-                )
-                await asyncio.sleep(1)
-            await self.end_match()
-        except asyncio.CancelledError:
-            return
+        total_time = 5  # Total match time in seconds TODO set back to 30
+        await self.count_down("match_timer_update", total_time, self.end_match)
 
     async def end_match(self):
         logger.info('ending match')
         self.game_in_progress = False
-        if self.game_loop_task and not self.game_loop_task.done():
-            self.game_loop_task.cancel()
-        await self.save_match_results(self.left_score, self.right_score)
+        await self.stop_game_loop()
+        await self.save_match_results(self.world.scores["left"], self.world.scores["right"])
         await self.channel_layer.group_send(
             self.room_group_name,
             {
@@ -3055,52 +2833,20 @@ class TournamentMatchConsumer(AsyncJsonWebsocketConsumer):
         )
 
     async def game_loop(self):
-        while self.game_in_progress:
-            await self.game_tick()
-            await asyncio.sleep(1 / 60)
+        await FixedTimestepLoop(tick_rate=self.simulation_rate).run(self.game_tick, lambda: self.game_in_progress)
 
-    async def game_tick(self):
+    async def game_tick(self, dt):
         async with self.game_lock:
-            self.left_paddle_y = max(0, min(self.left_paddle_y + self.left_paddle_speed, 440))
-            self.right_paddle_y = max(0, min(self.right_paddle_y + self.right_paddle_speed, 440))
-            self.ball_x += self.ball_direction_x * self.ball_speed
-            self.ball_y += self.ball_direction_y * self.ball_speed
-
-            if self.ball_y <= 0 or self.ball_y >= 500:
-                self.ball_direction_y *= -1
-
-            if self.ball_x <= 10 and self.left_paddle_y < self.ball_y < self.left_paddle_y + 60:
-                self.ball_direction_x *= -1
-            if self.ball_x >= 990 and self.right_paddle_y < self.ball_y < self.right_paddle_y + 60:
-                self.ball_direction_x *= -1
-
-            if self.ball_x <= 0:
-                self.right_score += 1
-                await self.reset_ball()
-            elif self.ball_x >= 1000:
-                self.left_score += 1
-                await self.reset_ball()
+            self.inputs.drain(self.world)
+            self.world.step(dt)
 
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    "type": "game_state",
-                    "leftScore": self.left_score,
-                    "rightScore": self.right_score,
-                    "ball_x": self.ball_x,
-                    "ball_y": self.ball_y,
-                    "left_paddle_y": self.left_paddle_y,
-                    "right_paddle_y": self.right_paddle_y,
-                    "left_speed": self.left_paddle_speed,
-                    "right_speed": self.right_paddle_speed,
-                }
-            )
+        if self.broadcast_pacer.due(dt):
+            await self.broadcast_state()
+        await self.feed_spectators()
 
-    async def reset_ball(self):
-        self.ball_x = 500
-        self.ball_y = 250
-        self.ball_direction_x = -1 if random.random() < 0.5 else 1
-        self.ball_direction_y = (random.random() * 2 - 1) * 0.5
+    @database_sync_to_async
+    def save_match_seed(self, seed):
+        OnlineMatch.objects.filter(pk=self.match.pk).update(seed=seed)
 
     @database_sync_to_async
     def save_match_results(self, left_score, right_score):
@@ -3153,13 +2899,161 @@ class TournamentMatchConsumer(AsyncJsonWebsocketConsumer):
             "remaining_time": event["remaining_time"]
         })
 
-    async def game_state(self, event):
-        await self.send_json(event)
-
     async def game_started(self, event):
         await self.send_json({"type": "game_started"})
 
     async def game_ended(self, event):
         await self.send_json({
             "type": "game_ended",
-        })
\ No newline at end of file
+        })
+
+class ReplayConsumer(WireFormatMixin, AsyncJsonWebsocketConsumer):
+    """
+    Plays a recorded Game back from its replay file (see replay.py), to
+    the game's players and staff only.
+
+    The file is read once on connect, without any further database access;
+    the game is then re-simulated on this connection with the regular engine
+    and sent as the usual game_state frames, at the broadcast rate of its
+    mode and 1x, 2x or 4x speed. Clients control playback with the pause,
+    play, set_speed ({"speed": 2}) and seek ({"tick": n}) actions; seeking
+    re-simulates from the nearest checkpoint of the ReplayPlayer, in a
+    thread as that can take a while, and playback waits meanwhile.
+    """
+    speeds = (1, 2, 4)
+
+    async def connect(self):
+        self.user = self.scope['user']
+        if isinstance(self.user, AnonymousUser):
+            await self.close()
+            return
+        data = await self.load_replay(self.scope['url_route']['kwargs']['game_id'], self.user)
+        if data is None:
+            await self.close()
+            return
+        self.player = ReplayPlayer(data)
+        self.mode = self.player.header["mode"]
+        self.state_encoder = StateEncoder()
+        self.speed = 1
+        self.pending_ticks = 0.0
+        self.playing = True
+        self.seeking = False
+        self.playback_task = None
+        await self.accept()
+        await self.send_json({
+            "type": "replay_info",
+            "mode": self.mode,
+            "tick_rate": self.player.tick_rate,
+            "end_tick": self.player.end_tick,
+            "speeds": self.speeds,
+        })
+        await self.send_state()
+        self.start_playback()
+
+    @database_sync_to_async
+    def load_replay(self, game_id, user):
+        games = Game.objects.filter(pk=game_id)
+        if not user.is_staff:
+            games = games.filter(Q(player1=user) | Q(player2=user) | Q(player3=user) | Q(player4=user))
+        game = games.first()
+        if game is None or not game.replay:
+            return None
+        try:
+            with game.replay.open("rb") as replay:
+                return replay.read()
+        except OSError:
+            logger.warning(f"Replay file of game {game_id} is missing")
+            return None
+
+    async def disconnect(self, close_code):
+        self.playing = False
+        if getattr(self, "playback_task", None) and not self.playback_task.done():
+            self.playback_task.cancel()
+
+    def start_playback(self):
+        if self.playback_task is None or self.playback_task.done():
+            rate = settings.GAME_RATES[self.mode]["broadcast"]
+            self.playback_task = asyncio.create_task(
+                FixedTimestepLoop(tick_rate=rate).run(self.playback_tick, lambda: self.playing)
+            )
+
+    async def playback_tick(self, dt):
+        if self.seeking:
+            return
+        self.pending_ticks += dt * self.player.tick_rate * self.speed
+        while self.pending_ticks >= 1 and not self.player.finished:
+            self.player.step()
+            self.pending_ticks -= 1
+        await self.send_state()
+        if self.player.finished:
+            self.playing = False
+            await self.send_json({"type": "replay_finished", "tick": self.player.world.tick})
+
+    async def send_state(self):
+        world = self.player.world
+        frame = self.state_encoder.encode(world.snapshot(), world.tick)
+        await self.send_payload(encode_payload(self.wire_format, self.mode, frame, self.state_encoder.last))
+
+    async def receive_json(self, content):
+        action = content.get("action")
+        if action == "pause":
+            self.playing = False
+        elif action == "play":
+            if not self.player.finished:
+                self.playing = True
+                self.start_playback()
+        elif action == "set_speed":
+            if content.get("speed") in self.speeds:
+                self.speed = content["speed"]
+        elif action == "seek":
+            tick = content.get("tick", 0)
+            if isinstance(tick, bool) or not isinstance(tick, (int, float)) or not math.isfinite(tick):
+                await self.send_json({"type": "error", "message": "tick must be a number"})
+                return
+            self.seeking = True
+            try:
+                await sync_to_async(self.player.seek, thread_sensitive=False)(tick)
+            finally:
+                self.seeking = False
+            self.pending_ticks = 0.0
+            self.state_encoder.request_keyframe()
+            await self.send_state()
+        elif action == "request_keyframe":
+            self.state_encoder.request_keyframe()
+
+
+class SpectatorConsumer(WireFormatMixin, AsyncJsonWebsocketConsumer):
+    """
+    Watches a lobby game or a tournament match without taking part in it.
+
+    Spectators only join the room's spectator group and never the players'
+    one. They receive the downsampled, delayed stream the match owner sends
+    there (see engine.spectate), already encoded in every wire format; a
+    delta client that joins between two keyframes waits for the next one.
+    """
+
+    async def connect(self):
+        self.user = self.scope['user']
+        if isinstance(self.user, AnonymousUser):
+            await self.close()
+            return
+        kwargs = self.scope['url_route']['kwargs']
+        self.spectator_group = spectator_group_name(kwargs['room_id'], kwargs.get('match_id'))
+        self.state_decoder = StateDecoder()
+        await self.channel_layer.group_add(self.spectator_group, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'spectator_group'):
+            await self.channel_layer.group_discard(self.spectator_group, self.channel_name)
+
+    async def receive_json(self, content):
+        pass  # spectators have nothing to say to the match
+
+    async def spectator_state(self, event):
+        if not self.state_decoder.apply(event) and self.wire_format == FORMAT_DELTA:
+            return
+        await self.send_payload(event["payloads"][self.wire_format])
+
+    async def spectate_ended(self, event):
+        await self.send_json({"type": "spectate_ended"})
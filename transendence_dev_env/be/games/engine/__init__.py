@@ -0,0 +1,9 @@
+from .world import World, Paddle
+from .rules import Rules, ClassicRules, ChaosRules, ArenaRules, create_world, BASE_TICK_RATE
+from .loop import FixedTimestepLoop, BroadcastPacer
+from .batch import BatchSimulator, MatchView
+from .sync import StateEncoder, StateDecoder
+from .timers import TimerWheel
+from .inputs import InputRing
+from .history import PaddleHistory
+from .spectate import SpectatorFeed
@@ -0,0 +1,240 @@
+# batch.py
+"""
+Structure-of-arrays simulator for many classic matches at once.
+
+Every hosted match owns one slot (row) in a set of NumPy arrays, and step()
+advances all of them with a handful of vectorized operations, so the cost of
+a tick barely grows with the number of matches. The physics are the same as
+ClassicRules, lag compensation included: the paddle history is one more
+array, indexed by a batch-wide clock. Free slots are parked with a still
+ball in the middle of the field so they never collide or score and need no
+masking.
+"""
+import random
+
+import numpy as np
+
+from .world import new_seed
+
+from .rules import ClassicRules, BASE_TICK_RATE, PADDLE_LENGTH, PADDLE_OFFSET
+from .history import HISTORY_DEPTH, MAX_REWIND
+
+SIDES = ("left", "right")
+NO_SCORER = -1
+
+
+class BatchSimulator:
+    """Steps every registered classic match in a single call per tick."""
+    rules = ClassicRules
+    width = ClassicRules.width
+    height = ClassicRules.height
+
+    def __init__(self, capacity=64, history_depth=HISTORY_DEPTH):
+        self.capacity = 0
+        self.free_slots = []
+        self.views = {}
+        self.rngs = {}  # slot -> the match's own random.Random, see World
+        self.history_depth = history_depth
+        self.clock = 0  # steps taken, indexes the paddle history
+        self.tick_rate = 60
+        self._grow(max(1, capacity))
+
+    def __len__(self):
+        return len(self.views)
+
+    def _grow(self, capacity):
+        used = self.capacity
+
+        def grow(name, fill, columns=None, dtype=np.float64):
+            shape = (capacity,) if columns is None else (capacity, columns)
+            array = np.full(shape, fill, dtype=dtype)
+            if used:
+                array[:used] = getattr(self, name)
+            setattr(self, name, array)
+
+        grow("ball_x", self.width / 2)
+        grow("ball_y", self.height / 2)
+        grow("direction_x", 0.0)
+        grow("direction_y", 0.0)
+        grow("ball_speed", 0.0)
+        # Column 0 is the left paddle, column 1 the right one
+        grow("paddles", self.rules.paddle_start["left"], columns=2)
+        grow("paddle_speeds", 0.0, columns=2)
+        grow("scores", 0, columns=2, dtype=np.int64)
+        grow("ticks", 0, dtype=np.int64)
+        grow("input_delays", 0, columns=2, dtype=np.int64)
+
+        # Paddle positions at the end of each of the last history_depth steps, row clock % depth
+        history = np.full((self.history_depth, capacity, 2), self.rules.paddle_start["left"], dtype=np.float64)
+        if used:
+            history[:, :used] = self.history
+        self.history = history
+        self.slot_indexes = np.arange(capacity)[:, None]
+
+        self.free_slots.extend(reversed(range(used, capacity)))
+        self.capacity = capacity
+
+    def add_match(self, seed=None):
+        """Claim a slot for a new match, seeded like World, and return its MatchView."""
+        if not self.free_slots:
+            self._grow(self.capacity * 2)
+        slot = self.free_slots.pop()
+        seed = new_seed() if seed is None else seed
+        self.rngs[slot] = random.Random(seed)
+        self.paddles[slot] = (self.rules.paddle_start["left"], self.rules.paddle_start["right"])
+        self.paddle_speeds[slot] = 0
+        self.history[:, slot] = self.paddles[slot]
+        self.input_delays[slot] = 0
+        self.scores[slot] = 0
+        self.ticks[slot] = 0
+        self.ball_x[slot] = self.width / 2
+        self.ball_y[slot] = self.height / 2
+        # Same opening serve as a fresh World
+        self.direction_x[slot] = 1
+        self.direction_y[slot] = 0.5
+        self.ball_speed[slot] = 5
+        view = MatchView(self, slot, seed)
+        self.views[slot] = view
+        return view
+
+    def remove_match(self, slot):
+        """Release a slot; the match stops moving immediately."""
+        if self.views.pop(slot, None) is None:
+            return
+        del self.rngs[slot]
+        self.ball_x[slot] = self.width / 2
+        self.ball_y[slot] = self.height / 2
+        self.direction_x[slot] = 0
+        self.direction_y[slot] = 0
+        self.ball_speed[slot] = 0
+        self.paddle_speeds[slot] = 0
+        self.free_slots.append(slot)
+
+    def step(self, dt):
+        """
+        Advance every match by dt seconds.
+
+        Returns an array with one entry per slot: the index into SIDES of the
+        side that scored on this step, or NO_SCORER.
+        """
+        scale = dt * BASE_TICK_RATE
+        self.tick_rate = round(1 / dt)
+        self.ticks += 1
+        self.clock += 1
+
+        np.clip(self.paddles + self.paddle_speeds * scale, 0, self.height - PADDLE_LENGTH, out=self.paddles)
+
+        distance = self.ball_speed * scale
+        self.ball_x += self.direction_x * distance
+        self.ball_y += self.direction_y * distance
+        ball_x = self.ball_x
+        ball_y = self.ball_y
+
+        # Top/bottom walls
+        walls = (ball_y <= 0) | (ball_y >= self.height)
+        self.direction_y[walls] *= -1
+
+        # Where the players see their paddles, see Rules.contact_position. The rows a
+        # match hasn't stepped through yet still hold its start positions, as for World
+        delays = self.input_delays
+        rewound = self.history[(self.clock - delays) % self.history_depth, self.slot_indexes, (0, 1)]
+        seen = np.where(delays > 0, rewound + self.paddle_speeds * scale * delays, self.paddles)
+        np.clip(seen, 0, self.height - PADDLE_LENGTH, out=seen)
+
+        def in_reach(paddles):
+            return (paddles < ball_y[:, None]) & (ball_y[:, None] < paddles + PADDLE_LENGTH)
+
+        reach = in_reach(seen)
+        hit_left = (ball_x <= PADDLE_OFFSET) & reach[:, 0]
+        hit_right = (ball_x >= self.width - PADDLE_OFFSET) & reach[:, 1]
+        self.direction_x[hit_left | hit_right] *= -1
+        self.history[self.clock % self.history_depth] = self.paddles
+
+        scorers = np.full(self.capacity, NO_SCORER, dtype=np.int8)
+        scorers[ball_x >= self.width] = 0
+        scorers[ball_x <= 0] = 1
+        scored = np.flatnonzero(scorers != NO_SCORER)
+        if scored.size:
+            # A point is rare compared to a tick, so serving again one by one is fine
+            for slot in scored:
+                self.scores[slot, scorers[slot]] += 1
+                self.serve(slot)
+        return scorers
+
+    def serve(self, slot):
+        self.ball_x[slot] = self.width / 2
+        self.ball_y[slot] = self.height / 2
+        rng = self.rngs[slot]
+        self.direction_x[slot] = -1 if rng.random() < 0.5 else 1
+        self.direction_y[slot] = (rng.random() * 2 - 1) * 0.5
+        self.ball_speed[slot] = 5
+
+
+class MatchView:
+    """
+    World-like handle on one slot of a BatchSimulator.
+
+    Offers the parts of the World interface the simulation worker uses, so a
+    batched match is driven the same way as a standalone one, except that
+    stepping is done for the whole batch at once.
+    """
+    sides = SIDES
+
+    def __init__(self, batch, slot, seed=None):
+        self.batch = batch
+        self.slot = slot
+        self.seed = seed
+        self.max_rewind = MAX_REWIND
+        self.recorder = None
+
+    @property
+    def tick(self):
+        return int(self.batch.ticks[self.slot])
+
+    @property
+    def scores(self):
+        left, right = self.batch.scores[self.slot]
+        return {"left": int(left), "right": int(right)}
+
+    @scores.setter
+    def scores(self, scores):
+        self.batch.scores[self.slot] = (scores.get("left", 0), scores.get("right", 0))
+
+    def set_paddle_speed(self, side, speed):
+        self.batch.paddle_speeds[self.slot, SIDES.index(side)] = speed
+
+    def set_input_delay(self, side, ticks):
+        batch = self.batch
+        limit = min(round(self.max_rewind * batch.tick_rate), batch.history_depth - 1)
+        delay = max(0, min(int(ticks), limit))
+        batch.input_delays[self.slot, SIDES.index(side)] = delay
+        return delay
+
+    def reset_ball(self):
+        self.batch.serve(self.slot)
+
+    def reset_scores(self):
+        self.batch.scores[self.slot] = 0
+
+    def next_round(self):
+        self.reset_scores()
+        if self.recorder is not None:
+            self.recorder.record_round(self.tick)
+
+    def round_over(self, score_limit):
+        return bool((self.batch.scores[self.slot] >= score_limit).any())
+
+    def snapshot(self):
+        batch = self.batch
+        slot = self.slot
+        left, right = batch.scores[slot]
+        return {
+            "leftScore": int(left),
+            "rightScore": int(right),
+            "ball_x": float(batch.ball_x[slot]),
+            "ball_y": float(batch.ball_y[slot]),
+            "left_paddle_y": float(batch.paddles[slot, 0]),
+            "right_paddle_y": float(batch.paddles[slot, 1]),
+            "left_speed": float(batch.paddle_speeds[slot, 0]),
+            "right_speed": float(batch.paddle_speeds[slot, 1]),
+        }
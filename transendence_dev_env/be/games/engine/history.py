@@ -0,0 +1,39 @@
+# history.py
+"""
+Recent paddle positions, for lag compensation.
+
+A remote player reacts to a state that is a few ticks old by the time it is
+on their screen, and their input needs as long again to reach the
+simulation. The world records where every paddle was at the end of each of
+the last HISTORY_DEPTH ticks, and a ball-paddle contact also counts against
+the paddle as it was at the tick the player was looking at when they
+pressed the key, at most the world's max rewind ago. Before the first tick
+the paddles were where the match started them.
+"""
+from array import array
+
+HISTORY_DEPTH = 64  # ticks kept, about half a second at 120 Hz
+MAX_REWIND = 0.1  # seconds a contact is rewound by default
+
+
+class PaddleHistory:
+    def __init__(self, paddles, depth=HISTORY_DEPTH):
+        self.depth = depth
+        self.ticks = array("q", [-1] * depth)
+        self.positions = {side: array("d", [paddle.position] * depth) for side, paddle in paddles.items()}
+        self.start = {side: paddle.position for side, paddle in paddles.items()}
+
+    def record(self, tick, paddles):
+        slot = tick % self.depth
+        self.ticks[slot] = tick
+        for side, paddle in paddles.items():
+            self.positions[side][slot] = paddle.position
+
+    def position(self, side, tick):
+        """Where side's paddle was at the end of tick, or None if that tick isn't kept."""
+        if tick <= 0:
+            return self.start[side]
+        slot = tick % self.depth
+        if self.ticks[slot] != tick:
+            return None
+        return self.positions[side][slot]
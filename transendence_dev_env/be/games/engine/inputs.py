@@ -0,0 +1,76 @@
+# inputs.py
+"""
+Paddle inputs on their way from the socket handlers to the simulation.
+
+Handlers push into a fixed-size ring and return straight away; the tick
+drains the ring into the world at the start of each step. Neither side
+awaits anything while touching the ring, so on the event loop they can't
+interleave and no lock is needed: an input never waits for a tick that is
+busy broadcasting, and a tick never waits for an input.
+
+Inputs may carry the client's sequence number. Draining records the last
+one applied per side in acks, which the state frames echo back so clients
+can reconcile their predicted paddles. They may also carry the tick the
+player was looking at, which sets how far the world rewinds contacts with
+their paddle (see history.py). Applied inputs are also passed on to the
+world's replay recorder, if it has one.
+
+Each connection coalesces its key events into at most one update per
+simulation tick, numbered per connection, and the match owner drops an
+update older than one it already applied from the same connection (see
+GameSimulationMixin.send_paddle_speed).
+"""
+
+INPUT_CAPACITY = 64
+
+
+class InputRing:
+    def __init__(self, capacity=INPUT_CAPACITY):
+        self.capacity = capacity
+        self.sides = [None] * capacity
+        self.speeds = [0] * capacity
+        self.seqs = [None] * capacity
+        self.view_ticks = [None] * capacity
+        self.acks = {}  # side -> seq of the last input applied
+        # Running counts of pushed and drained inputs, the slot is the count modulo capacity
+        self.head = 0
+        self.tail = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return self.tail - self.head
+
+    def push(self, side, speed, seq=None, view_tick=None):
+        if self.tail - self.head == self.capacity:
+            # Full: the oldest input would be overridden by the newer ones anyway
+            self.head += 1
+            self.dropped += 1
+        slot = self.tail % self.capacity
+        self.sides[slot] = side
+        self.speeds[slot] = speed
+        self.seqs[slot] = seq
+        self.view_ticks[slot] = view_tick
+        self.tail += 1
+
+    def drain(self, world):
+        """Apply the queued inputs to world in the order they arrived. Returns how many there were."""
+        count = self.tail - self.head
+        recorder = world.recorder
+        # Drained right before the step that applies the inputs
+        tick = world.tick + 1
+        for position in range(self.head, self.tail):
+            slot = position % self.capacity
+            side = self.sides[slot]
+            world.set_paddle_speed(side, self.speeds[slot])
+            if self.seqs[slot] is not None:
+                self.acks[side] = self.seqs[slot]
+            delay = None
+            if self.view_ticks[slot] is not None:
+                delay = world.set_input_delay(side, tick - self.view_ticks[slot])
+            if recorder is not None:
+                recorder.record_input(tick, side, self.speeds[slot], delay)
+        self.head = self.tail
+        return count
+
+    def clear(self):
+        self.head = self.tail
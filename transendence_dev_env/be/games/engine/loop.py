@@ -0,0 +1,92 @@
+# loop.py
+import asyncio
+import time
+
+import logging
+logger = logging.getLogger('game_debug')
+
+
+class FixedTimestepLoop:
+    """
+    Calls an async step(dt) callback at a fixed rate.
+
+    Elapsed wall time is measured with the monotonic clock and accumulated;
+    every full dt in the accumulator runs one step. A slow tick or a busy
+    event loop is made up for by running several steps back to back, so the
+    simulation keeps its exact rate instead of drifting like a plain
+    sleep(1 / 60) loop. The backlog is capped at max_catch_up steps so a long
+    stall can't turn into an ever-growing burst.
+    """
+
+    def __init__(self, tick_rate=60, max_catch_up=5):
+        self.tick_rate = tick_rate
+        self.dt = 1 / tick_rate
+        self.max_catch_up = max_catch_up
+        self.dropped_steps = 0
+
+    async def run(self, step, is_running):
+        previous = time.monotonic()
+        accumulator = 0.0
+        while is_running():
+            now = time.monotonic()
+            accumulator += now - previous
+            previous = now
+
+            steps = 0
+            while accumulator >= self.dt and is_running():
+                if steps == self.max_catch_up:
+                    dropped = int(accumulator / self.dt)
+                    self.dropped_steps += dropped
+                    logger.warning(f"Simulation fell {dropped} steps behind, dropping backlog")
+                    accumulator -= dropped * self.dt
+                    break
+                await step(self.dt)
+                accumulator -= self.dt
+                steps += 1
+
+            await asyncio.sleep(max(0.0, self.dt - accumulator))
+
+
+class BroadcastPacer:
+    """
+    Decides on which simulation steps a game_state is broadcast.
+
+    Broadcasts go out at up to `rate` per second regardless of the simulation
+    rate. After each one the caller reports how long the send took and, when
+    it knows it, how many messages are waiting in the receivers' queues. A
+    send slower than latency_budget of the broadcast interval, or a queue of
+    max_queue_depth messages, cuts the current rate by backoff_factor (never
+    below min_rate); every fast send wins back recovery_step per second until
+    the configured rate is reached again.
+    """
+
+    def __init__(self, rate, min_rate=10, latency_budget=0.5, max_queue_depth=8, backoff_factor=0.5, recovery_step=1):
+        self.target_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.latency_budget = latency_budget
+        self.max_queue_depth = max_queue_depth
+        self.backoff_factor = backoff_factor
+        self.recovery_step = recovery_step
+        self.elapsed = 0.0
+
+    def due(self, dt):
+        """Account for one simulation step of dt seconds; True if a broadcast should follow it."""
+        interval = 1 / self.rate
+        self.elapsed += dt
+        # Small tolerance so e.g. 60 Hz broadcasts on a 60 Hz loop fire every step
+        if self.elapsed < interval - 1e-9:
+            return False
+        self.elapsed = min(self.elapsed - interval, interval)
+        return True
+
+    def record(self, latency, queue_depth=0):
+        if latency > self.latency_budget / self.rate or queue_depth >= self.max_queue_depth:
+            rate = max(self.min_rate, self.rate * self.backoff_factor)
+            if rate < self.rate:
+                logger.warning(
+                    f"Broadcast backing off to {rate:.0f} Hz (send took {latency * 1000:.1f} ms, queue depth {queue_depth})"
+                )
+            self.rate = rate
+        elif self.rate < self.target_rate:
+            self.rate = min(self.target_rate, self.rate + self.recovery_step)
@@ -0,0 +1,327 @@
+# rules.py
+"""
+Rule sets for the online game modes.
+
+A rule set knows the field layout of its mode and how to advance a World by
+one fixed step. Speeds are expressed per base tick, so step() scales every
+displacement by dt * BASE_TICK_RATE and the game plays the same at any
+simulation rate.
+
+Ball-paddle contacts are tested against the position contact_position()
+returns for the paddle, which is where a lagging player sees it.
+"""
+from .world import World
+from .spatial import POWER_UPS
+from .collision import sweep_ball
+
+BASE_TICK_RATE = 60
+
+PADDLE_LENGTH = 60
+PADDLE_OFFSET = 10  # distance between the field edge and the paddle face
+BALL_RADIUS = 15
+POWER_UP_RADIUS = 15
+
+# power-up type -> (modifier attribute, factor on pickup, factor on expiry)
+POWER_UP_EFFECTS = {
+    "enlargePaddle": ("paddle_size_modifier", 1.5, 0.5),
+    "shrinkPaddle": ("paddle_size_modifier", 0.5, 1.5),
+    "slowBall": ("ball_speed_modifier", 0.5, 1.5),
+    "fastBall": ("ball_speed_modifier", 1.5, 0.5),
+    "shrinkBall": ("ball_size_modifier", 0.5, 1.5),
+    "growBall": ("ball_size_modifier", 1.5, 0.5),
+}
+POWER_UP_DURATION = 5  # seconds
+MAX_ACTIVE_POWER_UPS = 50  # spawns pause while this many are lying on the field
+MODIFIER_MIN = 0.25
+MODIFIER_MAX = 3.375
+
+
+def clamp(value, low, high):
+    return max(low, min(value, high))
+
+
+class Rules:
+    """Base rule set: two horizontal-facing paddles on a 1000x500 field."""
+    width = 1000
+    height = 500
+    paddle_start = {"left": 250, "right": 250}
+
+    def create_world(self, seed=None, **settings):
+        return World(
+            self,
+            self.width,
+            self.height,
+            self.paddle_start,
+            self.width / 2,
+            self.height / 2,
+            seed=seed,
+            **settings
+        )
+
+    def start(self, world):
+        """Called right before the first step, once world.tick_rate is known."""
+
+    def step(self, world, dt):
+        raise NotImplementedError
+
+    def reset_ball(self, world):
+        world.ball_x = world.center_x
+        world.ball_y = world.center_y
+        # Randomly send the ball left or right, with a small vertical component
+        world.ball_direction_x = -1 if world.rng.random() < 0.5 else 1
+        world.ball_direction_y = (world.rng.random() * 2 - 1) * 0.5
+        world.ball_speed = 5
+
+    def move_paddles(self, world, scale):
+        for paddle in world.paddles.values():
+            limit = world.height - paddle.length * world.paddle_size_modifier
+            paddle.position = clamp(paddle.position + paddle.speed * scale, 0, limit)
+
+    def contact_position(self, world, side, scale):
+        """
+        Position of side's paddle that returns the ball: where its player sees
+        it. That is its position at the tick the player was looking at (see
+        history.py) moved on at the speed of their latest input, which is where
+        their input would have put it by now had it arrived instantly; without
+        an input delay, where the paddle is.
+        """
+        paddle = world.paddles[side]
+        delay = world.input_delays[side]
+        if not delay:
+            return paddle.position
+        rewound = world.history.position(side, world.tick - delay)
+        limit = world.height - paddle.length * world.paddle_size_modifier
+        return clamp(rewound + paddle.speed * scale * delay, 0, limit)
+
+    def move_ball(self, world, scale):
+        speed = world.ball_speed * world.ball_speed_modifier * scale
+        world.ball_x += world.ball_direction_x * speed
+        world.ball_y += world.ball_direction_y * speed
+
+    @staticmethod
+    def in_reach(position, length, coordinate):
+        return position < coordinate < position + length
+
+    def score(self, world, side):
+        world.scores[side] += 1
+        self.reset_ball(world)
+        return side
+
+    def snapshot(self, world):
+        paddles = world.paddles
+        return {
+            "leftScore": world.scores["left"],
+            "rightScore": world.scores["right"],
+            "ball_x": world.ball_x,
+            "ball_y": world.ball_y,
+            "left_paddle_y": paddles["left"].position,
+            "right_paddle_y": paddles["right"].position,
+            "left_speed": paddles["left"].speed,
+            "right_speed": paddles["right"].speed,
+        }
+
+
+class ClassicRules(Rules):
+    """Online PvP and tournament matches."""
+
+    def step(self, world, dt):
+        scale = dt * BASE_TICK_RATE
+        self.move_paddles(world, scale)
+        self.move_ball(world, scale)
+
+        # Top/bottom walls
+        if world.ball_y <= 0 or world.ball_y >= world.height:
+            world.ball_direction_y *= -1
+
+        left = self.contact_position(world, "left", scale)
+        right = self.contact_position(world, "right", scale)
+        if world.ball_x <= PADDLE_OFFSET and self.in_reach(left, world.paddles["left"].length, world.ball_y):
+            world.ball_direction_x *= -1
+        elif world.ball_x >= world.width - PADDLE_OFFSET and self.in_reach(right, world.paddles["right"].length, world.ball_y):
+            world.ball_direction_x *= -1
+
+        if world.ball_x <= 0:
+            return self.score(world, "right")
+        if world.ball_x >= world.width:
+            return self.score(world, "left")
+        return None
+
+
+class ChaosRules(Rules):
+    """
+    Classic field with power-ups that change paddle size, ball size and ball
+    speed. The ball can get fast enough to skip past a paddle or power-up
+    between two ticks, so its move is swept (see collision.py).
+    Spawns and expiry run on the world's timer wheel.
+    """
+
+    def start(self, world):
+        world.after(world.settings.get("powerup_spawn_rate", 10), self.spawn_power_up, world)
+
+    def step(self, world, dt):
+        scale = dt * BASE_TICK_RATE
+        self.move_paddles(world, scale)
+
+        radius = BALL_RADIUS * world.ball_size_modifier
+        paddle_length = PADDLE_LENGTH * world.paddle_size_modifier
+        right_face = world.width - PADDLE_OFFSET
+        left = self.contact_position(world, "left", scale)
+        right = self.contact_position(world, "right", scale)
+        paddles = [(PADDLE_OFFSET, 1, left, left + paddle_length), (right_face, -1, right, right + paddle_length)]
+        distance = world.ball_speed * world.ball_speed_modifier * scale
+        world.ball_x, world.ball_y, flip_x, flip_y, path = sweep_ball(
+            world.ball_x,
+            world.ball_y,
+            world.ball_direction_x * distance,
+            world.ball_direction_y * distance,
+            radius,
+            world.height,
+            paddles,
+        )
+        if flip_x:
+            world.ball_direction_x *= -1
+        if flip_y:
+            world.ball_direction_y *= -1
+
+        power_ups = world.active_power_ups
+        for power_up_id in power_ups.touching(path, POWER_UP_RADIUS + radius):
+            power_up_type = power_ups.type_of(power_up_id)
+            power_ups.remove(power_up_id)
+            self.activate_power_up(world, power_up_type)
+
+        self.enforce_modifier_bounds(world)
+
+        scorer = None
+        radius = BALL_RADIUS * world.ball_size_modifier
+        if world.ball_x - radius <= 0:
+            scorer = self.score(world, "right")
+        elif world.ball_x + radius >= world.width:
+            scorer = self.score(world, "left")
+        return scorer
+
+    def reset_ball(self, world):
+        super().reset_ball(world)
+        world.ball_speed_modifier = 1
+        world.ball_size_modifier = 1
+        world.paddle_size_modifier = 1
+        # Drop running effects so they can't stack between points
+        for timer in world.expire_power_ups:
+            world.timers.cancel(timer)
+        world.expire_power_ups.clear()
+
+    def spawn_power_up(self, world):
+        self.generate_power_up(world)
+        world.after(world.settings.get("powerup_spawn_rate", 10), self.spawn_power_up, world)
+
+    def generate_power_up(self, world):
+        if len(world.active_power_ups) >= MAX_ACTIVE_POWER_UPS:
+            return
+        world.active_power_ups.add(
+            world.rng.randint(25, world.width - 25),
+            world.rng.randint(25, world.height - 25),
+            world.rng.choice(POWER_UPS),
+        )
+
+    def activate_power_up(self, world, power_up_type):
+        if power_up_type == "teleportBall":
+            margin = 2 * BALL_RADIUS * world.ball_size_modifier
+            world.ball_x = world.rng.randint(int(margin), int(world.width - margin))
+            world.ball_y = world.rng.randint(int(margin), int(world.height - margin))
+            return
+        attribute, factor, _ = POWER_UP_EFFECTS[power_up_type]
+        setattr(world, attribute, getattr(world, attribute) * factor)
+        world.expire_power_ups.append(world.after(POWER_UP_DURATION, self.expire_power_up, world, power_up_type))
+
+    def expire_power_up(self, world, power_up_type):
+        attribute, _, factor = POWER_UP_EFFECTS[power_up_type]
+        setattr(world, attribute, getattr(world, attribute) * factor)
+        world.expire_power_ups = [timer for timer in world.expire_power_ups if timer.pending]
+        # Expiry factors aren't the inverse of the pickup ones, keep the result in range
+        self.enforce_modifier_bounds(world)
+
+    def enforce_modifier_bounds(self, world):
+        world.paddle_size_modifier = clamp(world.paddle_size_modifier, MODIFIER_MIN, MODIFIER_MAX)
+        world.ball_size_modifier = clamp(world.ball_size_modifier, MODIFIER_MIN, MODIFIER_MAX)
+        world.ball_speed_modifier = clamp(world.ball_speed_modifier, MODIFIER_MIN, MODIFIER_MAX)
+
+    def snapshot(self, world):
+        state = super().snapshot(world)
+        state.update({
+            "paddle_size_modifier": world.paddle_size_modifier,
+            "ball_size_modifier": world.ball_size_modifier,
+            "active_power_ups": world.active_power_ups.as_list(),
+        })
+        return state
+
+
+class ArenaRules(Rules):
+    """Four players on an 800x800 field; a point goes to whoever touched the ball last."""
+    width = 800
+    height = 800
+    paddle_start = {"left": 400, "right": 400, "top": 370, "bottom": 370}
+
+    def step(self, world, dt):
+        scale = dt * BASE_TICK_RATE
+        self.move_paddles(world, scale)
+        self.move_ball(world, scale)
+
+        def in_reach(side, coordinate):
+            return self.in_reach(self.contact_position(world, side, scale), world.paddles[side].length, coordinate)
+
+        near = PADDLE_OFFSET + BALL_RADIUS
+        far_x = world.width - near
+        far_y = world.height - near
+        if world.ball_x <= near and in_reach("left", world.ball_y):
+            world.ball_direction_x *= -1
+            world.last_touch = "left"
+        elif world.ball_x >= far_x and in_reach("right", world.ball_y):
+            world.ball_direction_x *= -1
+            world.last_touch = "right"
+        elif world.ball_y <= near and in_reach("top", world.ball_x):
+            world.ball_direction_y *= -1
+            world.last_touch = "top"
+        elif world.ball_y >= far_y and in_reach("bottom", world.ball_x):
+            world.ball_direction_y *= -1
+            world.last_touch = "bottom"
+
+        out = world.ball_x <= 0 or world.ball_x >= world.width or world.ball_y <= 0 or world.ball_y >= world.height
+        if not out:
+            return None
+        if world.last_touch:
+            return self.score(world, world.last_touch)
+        # Nobody touched it yet, just serve again
+        self.reset_ball(world)
+        return None
+
+    def reset_ball(self, world):
+        super().reset_ball(world)
+        world.last_touch = None
+
+    def snapshot(self, world):
+        paddles = world.paddles
+        state = super().snapshot(world)
+        state.update({
+            "topScore": world.scores["top"],
+            "bottomScore": world.scores["bottom"],
+            "top_paddle_x": paddles["top"].position,
+            "bottom_paddle_x": paddles["bottom"].position,
+            "top_speed": paddles["top"].speed,
+            "bottom_speed": paddles["bottom"].speed,
+        })
+        return state
+
+
+RULES = {
+    "classic": ClassicRules,
+    "chaos": ChaosRules,
+    "arena": ArenaRules,
+}
+
+
+def create_world(mode, seed=None, **settings):
+    """Build a fresh World for the given mode ("classic", "chaos" or "arena"), with a new seed unless one is given."""
+    try:
+        rules = RULES[mode]()
+    except KeyError:
+        raise ValueError(f"Unknown game mode: {mode}")
+    return rules.create_world(seed=seed, **settings)
@@ -0,0 +1,114 @@
+# spatial.py
+"""
+Power-ups on the field, kept in flat arrays and indexed by a uniform grid.
+
+Pickup checks only look at the grid cells around the path the ball travels
+in a step, so their cost doesn't grow with the number of power-ups lying
+around elsewhere on the field.
+"""
+from array import array
+
+from .collision import segment_distance_squared
+
+POWER_UPS = ["enlargePaddle", "shrinkPaddle", "slowBall", "fastBall", "teleportBall", "shrinkBall", "growBall"]
+
+CELL_SIZE = 64
+
+
+class PowerUpField:
+    def __init__(self, types=POWER_UPS, cell_size=CELL_SIZE):
+        self.types = list(types)
+        self.cell_size = cell_size
+        self.next_id = 0
+        self.clear()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __bool__(self):
+        return len(self.ids) > 0
+
+    def cell(self, x, y):
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def add(self, x, y, power_up_type):
+        power_up_id = self.next_id
+        self.next_id += 1
+        self.slots[power_up_id] = len(self.ids)
+        self.xs.append(x)
+        self.ys.append(y)
+        self.kinds.append(self.types.index(power_up_type))
+        self.ids.append(power_up_id)
+        self.grid.setdefault(self.cell(x, y), []).append(power_up_id)
+        self._as_list = None
+        return power_up_id
+
+    def remove(self, power_up_id):
+        slot = self.slots.pop(power_up_id)
+        cell = self.cell(self.xs[slot], self.ys[slot])
+        members = self.grid[cell]
+        members.remove(power_up_id)
+        if not members:
+            del self.grid[cell]
+
+        last = len(self.ids) - 1
+        if slot != last:
+            self.xs[slot] = self.xs[last]
+            self.ys[slot] = self.ys[last]
+            self.kinds[slot] = self.kinds[last]
+            self.ids[slot] = self.ids[last]
+            self.slots[self.ids[slot]] = slot
+        del self.xs[last], self.ys[last], self.kinds[last], self.ids[last]
+        self._as_list = None
+
+    def clear(self):
+        # One power-up per slot (spawned on whole canvas units); removal moves the last slot into the hole
+        self.xs = array("i")
+        self.ys = array("i")
+        self.kinds = array("B")
+        self.ids = array("L")
+        self.slots = {}  # power-up id -> slot
+        self.grid = {}  # (column, row) -> power-up ids
+        self._as_list = None
+
+    def type_of(self, power_up_id):
+        return self.types[self.kinds[self.slots[power_up_id]]]
+
+    def touching(self, segments, reach):
+        """
+        Ids of the power-ups whose centre comes within reach of any of the
+        (x0, y0, x1, y1) segments, in the order they were spawned.
+        """
+        reach_squared = reach * reach
+        found = set()
+        for x0, y0, x1, y1 in segments:
+            for power_up_id in self.candidates(x0, y0, x1, y1, reach):
+                if power_up_id in found:
+                    continue
+                slot = self.slots[power_up_id]
+                if segment_distance_squared(self.xs[slot], self.ys[slot], x0, y0, x1, y1) < reach_squared:
+                    found.add(power_up_id)
+        return sorted(found)
+
+    def candidates(self, x0, y0, x1, y1, reach):
+        """Ids in the cells overlapping the segment's bounding box grown by reach."""
+        first_column, first_row = self.cell(min(x0, x1) - reach, min(y0, y1) - reach)
+        last_column, last_row = self.cell(max(x0, x1) + reach, max(y0, y1) + reach)
+        if (last_column - first_column + 1) * (last_row - first_row + 1) > len(self.grid):
+            # A box bigger than the occupied part of the grid, walk the occupied cells instead
+            for (column, row), members in self.grid.items():
+                if first_column <= column <= last_column and first_row <= row <= last_row:
+                    yield from members
+            return
+        for column in range(first_column, last_column + 1):
+            for row in range(first_row, last_row + 1):
+                yield from self.grid.get((column, row), ())
+
+    def as_list(self):
+        """The power-ups as the [{"x", "y", "type"}] list sent in game_state."""
+        if self._as_list is None:
+            self._as_list = [
+                {"x": x, "y": y, "type": self.types[kind]}
+                for x, y, kind in zip(self.xs, self.ys, self.kinds)
+            ]
+        return self._as_list
@@ -0,0 +1,43 @@
+# spectate.py
+"""
+Downsampled, delayed game state for spectators.
+
+The match owner hands every stepped world to its SpectatorFeed, which keeps a
+snapshot every simulation_rate / rate ticks and releases each one delay
+seconds later as a frame of its own StateEncoder sequence: a keyframe once a
+second and deltas in between. Spectators listen on a group of their own, so
+the players' broadcasts don't grow with the audience, and the delay keeps
+the stream from being any use to a player.
+"""
+from collections import deque
+
+from .sync import StateEncoder
+
+SPECTATOR_RATE = 20  # frames per second
+SPECTATOR_DELAY = 1.0  # seconds
+
+
+class SpectatorFeed:
+    def __init__(self, simulation_rate, rate=SPECTATOR_RATE, delay=SPECTATOR_DELAY):
+        self.interval = max(1, round(simulation_rate / rate))
+        self.delay_ticks = round(delay * simulation_rate)
+        self.encoder = StateEncoder(keyframe_interval=rate)
+        self.samples = deque()  # (tick, state) not released yet
+
+    def sample(self, world):
+        """Account for a step of world; returns the frame due for spectators now, or None."""
+        tick = world.tick
+        if tick % self.interval == 0:
+            self.samples.append((tick, world.snapshot()))
+        if self.samples and self.samples[0][0] <= tick - self.delay_ticks:
+            sample_tick, state = self.samples.popleft()
+            return self.encoder.encode(state, sample_tick)
+        return None
+
+    def flush(self):
+        """Frame of the newest sample still held back, or None if there is none. Empties the feed."""
+        if not self.samples:
+            return None
+        tick, state = self.samples[-1]
+        self.samples.clear()
+        return self.encoder.encode(state, tick)
@@ -0,0 +1,81 @@
+# sync.py
+"""
+Delta compression for game_state broadcasts.
+
+The match owner runs a StateEncoder: every frame gets a sequence number, every
+keyframe_interval-th frame is a keyframe carrying the complete state, and the
+frames in between only carry the fields whose (quantized) value changed.
+Receivers keep a StateDecoder that rebuilds the full state; a frame that does
+not follow the last one it applied is a gap, and the receiver has to ask for
+a keyframe before it can continue. Clients that connect with ?sync=delta get
+the frames as they are and send a request_keyframe action on a gap; the
+consumers decode the frames for every other client and send it the full
+state.
+
+Frames also carry the simulation tick they show and the input acks, the
+sequence number of the last input applied for each side, so clients can
+run prediction and reconcile against the authoritative state.
+"""
+
+KEYFRAME_INTERVAL = 60  # one keyframe per second at 60 Hz
+PRECISION = 1  # decimal places kept for positions and speeds
+
+
+def quantize(value, precision=PRECISION):
+    if isinstance(value, float):
+        value = round(value, precision)
+        # 5.0 and 5 compare equal but 5 is shorter on the wire
+        return int(value) if value.is_integer() else value
+    return value
+
+
+class StateEncoder:
+    def __init__(self, keyframe_interval=KEYFRAME_INTERVAL, precision=PRECISION):
+        self.keyframe_interval = keyframe_interval
+        self.precision = precision
+        self.seq = 0
+        self.last = {}
+        self.keyframe_requested = False
+
+    def request_keyframe(self):
+        """Make the next frame a keyframe."""
+        self.keyframe_requested = True
+
+    def encode(self, state, tick=None, acks=None):
+        """Turn a full state into the next frame: {"seq", "keyframe", "tick", "acks", "state"}."""
+        current = {key: quantize(value, self.precision) for key, value in state.items()}
+        keyframe = self.keyframe_requested or self.seq % self.keyframe_interval == 0
+        if keyframe:
+            changed = current
+            self.keyframe_requested = False
+        else:
+            last = self.last
+            changed = {key: value for key, value in current.items() if key not in last or last[key] != value}
+        self.last = current
+        frame = {"seq": self.seq, "keyframe": keyframe, "tick": tick, "acks": dict(acks or {}), "state": changed}
+        self.seq += 1
+        return frame
+
+
+class StateDecoder:
+    def __init__(self):
+        self.seq = None
+        self.state = {}
+        self.awaiting_keyframe = False
+
+    def apply(self, frame):
+        """
+        Merge a frame into the rebuilt state. Returns False if the frame was
+        skipped because of a gap; the state stays at the last good frame until
+        a keyframe arrives.
+        """
+        if frame["keyframe"]:
+            self.state = dict(frame["state"])
+            self.awaiting_keyframe = False
+        elif self.awaiting_keyframe or self.seq is None or frame["seq"] != self.seq + 1:
+            self.awaiting_keyframe = True
+            return False
+        else:
+            self.state.update(frame["state"])
+        self.seq = frame["seq"]
+        return True
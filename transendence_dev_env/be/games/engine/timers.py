@@ -0,0 +1,77 @@
+# timers.py
+"""
+Tick-indexed event scheduling.
+
+A hashed timing wheel: an event is dropped into the slot of the tick it is
+due on (modulo the wheel size) and every advance() only looks at the slot of
+the new tick. Scheduling and cancelling are O(1) and events fire on exactly
+the tick they were scheduled for, however many are pending.
+"""
+
+WHEEL_SIZE = 512
+
+
+class Timer:
+    __slots__ = ("due", "callback", "args", "cancelled", "fired")
+
+    def __init__(self, due, callback, args):
+        self.due = due
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+        self.fired = False
+
+    @property
+    def pending(self):
+        return not (self.cancelled or self.fired)
+
+
+class TimerWheel:
+    def __init__(self, size=WHEEL_SIZE):
+        self.size = size
+        self.tick = 0
+        self.clear()
+
+    def __len__(self):
+        return self.pending
+
+    def clear(self):
+        self.slots = [[] for _ in range(self.size)]
+        self.pending = 0
+
+    def schedule(self, delay, callback, *args):
+        """Have callback(*args) returned by advance() delay ticks from now (at least one). Returns its Timer."""
+        return self.schedule_at(self.tick + max(1, int(delay)), callback, *args)
+
+    def schedule_at(self, tick, callback, *args):
+        """Have callback(*args) returned by the advance() to tick, the next one if that has passed. Returns its Timer."""
+        timer = Timer(max(int(tick), self.tick + 1), callback, args)
+        self.slots[timer.due % self.size].append(timer)
+        self.pending += 1
+        return timer
+
+    def cancel(self, timer):
+        if timer.pending:
+            timer.cancelled = True
+            self.pending -= 1
+
+    def advance(self):
+        """Move to the next tick and return the (callback, args) pairs due on it, in scheduling order."""
+        self.tick += 1
+        index = self.tick % self.size
+        slot = self.slots[index]
+        if not slot:
+            return []
+        due = []
+        waiting = []
+        for timer in slot:
+            if timer.cancelled:
+                continue
+            if timer.due == self.tick:
+                timer.fired = True
+                due.append((timer.callback, timer.args))
+            else:
+                waiting.append(timer)  # due on a later turn of the wheel
+        self.slots[index] = waiting
+        self.pending -= len(due)
+        return due
@@ -0,0 +1,118 @@
+# world.py
+"""
+Plain-Python state of a single running match.
+
+Positions are in canvas units, speeds are in canvas units per base tick
+(1/60 s), which is what the game consumers have always used.
+
+Every random decision of a match (serves, power-up spawns, teleports) is
+drawn from the world's own rng, seeded with world.seed, so a match is fully
+determined by its seed and its inputs.
+"""
+import random
+from .spatial import PowerUpField
+from .timers import TimerWheel
+from .history import PaddleHistory, MAX_REWIND
+
+
+class Paddle:
+    __slots__ = ("position", "speed", "length")
+
+    def __init__(self, position, length=60):
+        self.position = position
+        self.speed = 0
+        self.length = length
+
+
+def new_seed():
+    """A fresh match seed, fits a signed 64-bit database column."""
+    return random.SystemRandom().getrandbits(63)
+
+
+class World:
+    def __init__(self, rules, width, height, paddle_positions, ball_x, ball_y, seed=None, **settings):
+        self.rules = rules
+        self.seed = new_seed() if seed is None else seed
+        self.rng = random.Random(self.seed)
+        self.width = width
+        self.height = height
+        self.center_x = ball_x
+        self.center_y = ball_y
+
+        self.ball_x = ball_x
+        self.ball_y = ball_y
+        self.ball_direction_x = 1
+        self.ball_direction_y = 0.5
+        self.ball_speed = 5
+
+        self.paddles = {side: Paddle(position) for side, position in paddle_positions.items()}
+        self.scores = {side: 0 for side in paddle_positions}
+        self.last_touch = None
+
+        # Chaos modifiers, left at 1 by the other rule sets
+        self.paddle_size_modifier = 1
+        self.ball_size_modifier = 1
+        self.ball_speed_modifier = 1
+        self.active_power_ups = PowerUpField()
+        self.expire_power_ups = []
+
+        # Lag compensation: recent paddle positions and how many ticks behind each player sees the match
+        self.history = PaddleHistory(self.paddles)
+        self.input_delays = {side: 0 for side in paddle_positions}
+        self.max_rewind = MAX_REWIND
+
+        self.tick = 0
+        self.tick_rate = 60  # until the first step tells us otherwise
+        self.timers = TimerWheel()
+        self.recorder = None  # replay recorder (see games.replay), told about inputs and round resets
+        self.settings = settings
+
+    @property
+    def sides(self):
+        return tuple(self.paddles)
+
+    def set_paddle_speed(self, side, speed):
+        self.paddles[side].speed = speed
+
+    def set_input_delay(self, side, ticks):
+        """Record that the player of side acts on a view of the match ticks old, up to max_rewind."""
+        limit = min(round(self.max_rewind * self.tick_rate), self.history.depth - 1)
+        self.input_delays[side] = max(0, min(int(ticks), limit))
+        return self.input_delays[side]
+
+    def step(self, dt):
+        """Advance the simulation by dt seconds. Returns the scoring side, or None."""
+        self.tick += 1
+        self.tick_rate = round(1 / dt)
+        if self.tick == 1:
+            self.rules.start(self)
+        scorer = self.rules.step(self, dt)
+        self.history.record(self.tick, self.paddles)
+        for callback, args in self.timers.advance():
+            callback(*args)
+        return scorer
+
+    def after(self, seconds, callback, *args):
+        """Call callback(*args) at the end of the step the given number of seconds from now."""
+        # From the tick being stepped: during a step the wheel is still on the previous one
+        return self.timers.schedule_at(self.tick + max(1, round(seconds * self.tick_rate)), callback, *args)
+
+    def reset_ball(self):
+        self.rules.reset_ball(self)
+
+    def reset_scores(self):
+        for side in self.scores:
+            self.scores[side] = 0
+
+    def next_round(self):
+        self.reset_scores()
+        self.active_power_ups.clear()
+        if self.recorder is not None:
+            self.recorder.record_round(self.tick)
+
+    def round_over(self, score_limit):
+        return any(score >= score_limit for score in self.scores.values())
+
+    def snapshot(self):
+        """Return the game_state payload (without the message type) for this world."""
+        return self.rules.snapshot(self)
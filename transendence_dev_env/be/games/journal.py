@@ -0,0 +1,63 @@
+# journal.py
+"""
+Write-ahead journal for the rounds of running games.
+
+The game manager keeps a game's rounds in memory and writes them to the Game
+row once, together with the result (see finalize_game). When
+GAME_ROUND_JOURNAL is set to a Redis URL, every round is also appended to a
+Redis list before it is announced, so rounds played by a manager that dies
+mid-game survive it: `manage.py recover_game_rounds` writes them back to the
+rows of the games that never finished.
+"""
+import json
+
+import redis
+import redis.asyncio
+from django.conf import settings
+
+import logging
+logger = logging.getLogger('game_debug')
+
+JOURNAL_TTL = 24 * 60 * 60  # seconds a journal outlives its last round
+
+_client = None
+
+
+def journal_key(game_id):
+    return f"game:{game_id}:rounds"
+
+
+def journal_client():
+    global _client
+    if _client is None:
+        _client = redis.asyncio.Redis.from_url(settings.GAME_ROUND_JOURNAL)
+    return _client
+
+
+async def journal_round(game_id, round_data):
+    if not settings.GAME_ROUND_JOURNAL:
+        return
+    key = journal_key(game_id)
+    try:
+        await journal_client().pipeline().rpush(key, json.dumps(round_data)).expire(key, JOURNAL_TTL).execute()
+    except redis.RedisError as e:
+        logger.warning(f"Could not journal round of game {game_id}: {e}")
+
+
+async def clear_journal(game_id):
+    """Drop a game's journal once its rounds are in the database."""
+    if not settings.GAME_ROUND_JOURNAL:
+        return
+    try:
+        await journal_client().delete(journal_key(game_id))
+    except redis.RedisError as e:
+        logger.warning(f"Could not clear the round journal of game {game_id}: {e}")
+
+
+def journaled_games(client):
+    """{game id: [round data]} for every journal in Redis, read with a synchronous client."""
+    games = {}
+    for key in client.scan_iter(match=journal_key("*")):
+        game_id = int(key.decode().split(":")[1])
+        games[game_id] = [json.loads(entry) for entry in client.lrange(key, 0, -1)]
+    return games
@@ -0,0 +1,279 @@
+# layers.py
+"""
+Channel layer with an in-process fast path.
+
+HybridChannelLayer is a RedisChannelLayer that delivers messages for the
+channels receiving in this process straight into their queues, without a
+Redis round trip and without serializing them, whether they are sent to the
+channel directly or to a group. Like the messages channels_redis buffers
+for several local channels, a locally delivered message is shared by its
+receivers and must not be changed after it is sent.
+
+Groups are still kept in Redis, so other processes reach our members as
+before, and group_send only goes to Redis for the members receiving
+elsewhere. Those are cached for membership_ttl seconds: a channel another
+process adds to a group may miss up to that long of the group's messages
+sent from here. Our own group_add and group_discard calls count at once.
+
+A local channel is live from new_channel() until its receiver goes away:
+its receive() is cancelled, as consumers' are when they close, or it is
+not received from for `expiry` seconds. Messages for a channel that isn't
+live are dropped, as Redis would expire them, and the channel leaves its
+local groups. Local group membership also expires after group_expiry
+seconds, like the membership kept in Redis.
+
+The local queues and groups are exposed as `channels` and `groups`, like
+the in-memory layer's, so GameSimulationMixin.group_queue_depth() sees the
+queues of the members in this process.
+
+Underneath, ShardedChannelLayer spreads the Redis side over several
+instances. Channels are hashed over `hosts`, and the groups of each prefix
+in `shards` over that prefix's own instances, so lobby, tournament and
+notification groups don't compete for one Redis. Hashing is consistent:
+adding an instance to a list only moves its share of the keys.
+"""
+import asyncio
+import collections
+import hashlib
+import time
+
+from channels_redis.core import BoundedQueue, RedisChannelLayer
+from channels_redis.utils import decode_hosts
+
+MEMBERSHIP_TTL = 1.0  # seconds
+
+# Same as RedisChannelLayer.group_send's script, trimming expired messages in the same call
+GROUP_SEND_LUA = """
+    local over_capacity = 0
+    local current_time = ARGV[#ARGV - 1]
+    local expiry = ARGV[#ARGV]
+    for i=1,#KEYS do
+        redis.call('ZREMRANGEBYSCORE', KEYS[i], 0, current_time - expiry)
+        if redis.call('ZCOUNT', KEYS[i], '-inf', '+inf') < tonumber(ARGV[i + #KEYS]) then
+            redis.call('ZADD', KEYS[i], current_time, ARGV[i])
+            redis.call('EXPIRE', KEYS[i], expiry)
+        else
+            over_capacity = over_capacity + 1
+        end
+    end
+    return over_capacity
+"""
+
+
+def jump_hash(key, buckets):
+    """Jump consistent hash (Lamping and Veach) of the string key into range(buckets)."""
+    if buckets == 1:
+        return 0
+    key = int.from_bytes(hashlib.blake2b(key.encode("utf8"), digest_size=8).digest(), "little")
+    bucket = jump = 0
+    while jump < buckets:
+        bucket = jump
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        jump = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+class ShardedChannelLayer(RedisChannelLayer):
+    """
+    RedisChannelLayer with groups kept on separate Redis instances by name
+    prefix: shards={"lobby_": [hosts], "tournament_": [hosts], ...}. An
+    instance may be listed under several prefixes and in hosts.
+    """
+    def __init__(self, hosts=None, shards=None, **kwargs):
+        super().__init__(hosts=hosts, **kwargs)
+        self.channel_hosts = list(range(len(self.hosts)))
+        self.shards = []  # (group prefix, indexes in self.hosts of its instances)
+        for prefix, shard_hosts in (shards or {}).items():
+            indexes = []
+            for host in decode_hosts(shard_hosts):
+                if host not in self.hosts:
+                    self.hosts.append(host)
+                indexes.append(self.hosts.index(host))
+            self.shards.append((prefix, indexes))
+        self.ring_size = len(self.hosts)
+
+    def consistent_hash(self, value):
+        """Index of the instance for a channel or group name."""
+        if "!" in value:
+            # Where the process receives: RedisChannelLayer.send() hashes the full name of a
+            # process-local channel, which with several hosts sends it to the wrong instance
+            value = self.non_local_name(value)
+        indexes = self.channel_hosts
+        for prefix, shard in self.shards:
+            if value.startswith(prefix):
+                indexes = shard
+                break
+        return indexes[jump_hash(value, len(indexes))]
+
+
+class HybridChannelLayer(ShardedChannelLayer):
+    def __init__(self, *args, membership_ttl=MEMBERSHIP_TTL, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.membership_ttl = membership_ttl
+        self.channels = {}  # live channel receiving in this process -> queue of its local messages
+        self.last_receives = {}  # live channel -> when it last called or returned from receive()
+        self.groups = collections.defaultdict(dict)  # group -> {member created in this process: when added}
+        self.memberships = collections.defaultdict(set)  # local channel -> its local groups
+        self.swept = time.monotonic()
+        self.remote_groups = {}  # group -> (fetched at, members receiving elsewhere)
+        self.redis_receives = {}  # channel -> pending RedisChannelLayer.receive() task
+        self.local_deliveries = 0
+        self.remote_deliveries = 0
+        self.dropped = 0  # local messages for channels that weren't live
+
+    def is_local(self, channel):
+        return "!" in channel and self.non_local_name(channel).endswith(self.client_prefix + "!")
+
+    def local_queue(self, channel):
+        self.last_receives[channel] = time.monotonic()
+        queue = self.channels.get(channel)
+        if queue is None:
+            queue = self.channels[channel] = BoundedQueue(self.capacity)
+        return queue
+
+    def deliver(self, channel, message):
+        queue = self.channels.get(channel)
+        if queue is None:
+            self.dropped += 1
+            self.forget(channel)
+            return
+        queue.put_nowait(message)
+        self.local_deliveries += 1
+
+    def forget(self, channel):
+        """Drop the queue and the local group memberships of a channel whose receiver is gone."""
+        self.channels.pop(channel, None)
+        self.last_receives.pop(channel, None)
+        redis_receive = self.redis_receives.pop(channel, None)
+        if redis_receive is not None:
+            redis_receive.cancel()
+        for group in self.memberships.pop(channel, ()):
+            members = self.groups.get(group)
+            if members is not None:
+                members.pop(channel, None)
+                if not members:
+                    del self.groups[group]
+
+    def expire_channels(self):
+        """Forget the channels not received from for `expiry` seconds, at most once every `expiry` seconds."""
+        now = time.monotonic()
+        if now - self.swept < self.expiry:
+            return
+        self.swept = now
+        idle = [
+            channel for channel, last_receive in self.last_receives.items()
+            if now - last_receive > self.expiry and channel not in self.redis_receives
+        ]
+        for channel in idle:
+            self.forget(channel)
+
+    async def new_channel(self, prefix="specific"):
+        channel = await super().new_channel(prefix)
+        self.expire_channels()
+        # Live from now on, messages sent before its first receive wait for it
+        self.local_queue(channel)
+        return channel
+
+    async def send(self, channel, message):
+        if self.is_local(channel):
+            assert isinstance(message, dict), "message is not a dict"
+            self.deliver(channel, message)
+            return
+        self.remote_deliveries += 1
+        await super().send(channel, message)
+
+    async def receive(self, channel):
+        """
+        Receive from the local queue and from Redis at the same time. A Redis
+        receive that loses the race stays pending for the next call instead
+        of being cancelled.
+        """
+        if not self.is_local(channel):
+            return await super().receive(channel)
+        queue = self.local_queue(channel)
+        redis_receive = self.redis_receives.get(channel)
+        if redis_receive is not None and redis_receive.done():
+            del self.redis_receives[channel]
+            return redis_receive.result()
+        if not queue.empty():
+            return queue.get_nowait()
+        if redis_receive is None:
+            redis_receive = self.redis_receives[channel] = asyncio.ensure_future(super().receive(channel))
+        local_receive = asyncio.ensure_future(queue.get())
+        try:
+            await asyncio.wait((redis_receive, local_receive), return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            # The receiver is going away
+            local_receive.cancel()
+            self.forget(channel)
+            raise
+        self.last_receives[channel] = time.monotonic()
+        if local_receive.done():
+            return local_receive.result()
+        local_receive.cancel()
+        del self.redis_receives[channel]
+        return redis_receive.result()
+
+    async def group_add(self, group, channel):
+        await super().group_add(group, channel)
+        if self.is_local(channel):
+            self.groups[group][channel] = time.monotonic()
+            self.memberships[channel].add(group)
+
+    async def group_discard(self, group, channel):
+        await super().group_discard(group, channel)
+        members = self.groups.get(group)
+        if members is not None:
+            members.pop(channel, None)
+            if not members:
+                del self.groups[group]
+        memberships = self.memberships.get(channel)
+        if memberships is not None:
+            memberships.discard(group)
+            if not memberships:
+                del self.memberships[channel]
+
+    async def group_send(self, group, message):
+        assert self.require_valid_group_name(group), "Group name not valid"
+        members = self.groups.get(group)
+        if members:
+            joined_since = time.monotonic() - self.group_expiry
+            for channel, joined in list(members.items()):
+                if joined < joined_since:
+                    await self.group_discard(group, channel)
+                else:
+                    self.deliver(channel, message)
+        remote = await self.remote_members(group)
+        if remote:
+            await self.send_to_remote(remote, message)
+
+    async def remote_members(self, group):
+        now = time.monotonic()
+        cached = self.remote_groups.get(group)
+        if cached is not None and now - cached[0] < self.membership_ttl:
+            return cached[1]
+        connection = self.connection(self.consistent_hash(group))
+        names = await connection.zrangebyscore(self._group_key(group), min=int(time.time()) - self.group_expiry, max="+inf")
+        members = [name.decode("utf8") for name in names]
+        remote = [name for name in members if not self.is_local(name)]
+        if len(self.remote_groups) > 1000:
+            # Forget the groups nobody sent to lately, mostly finished matches
+            self.remote_groups = {name: entry for name, entry in self.remote_groups.items() if now - entry[0] < self.membership_ttl}
+        self.remote_groups[group] = (now, remote)
+        return remote
+
+    async def send_to_remote(self, channel_names, message):
+        """One script call per Redis host for every channel, like RedisChannelLayer.group_send."""
+        connection_to_keys, key_to_message, key_to_capacity = self._map_channel_keys_to_connection(channel_names, message)
+        for index, keys in connection_to_keys.items():
+            args = [key_to_message[key] for key in keys]
+            args += [key_to_capacity[key] for key in keys]
+            args += [time.time(), self.expiry]
+            await self.connection(index).eval(GROUP_SEND_LUA, len(keys), *keys, *args)
+        self.remote_deliveries += len(channel_names)
+
+    async def flush(self):
+        await super().flush()
+        self.groups.clear()
+        self.memberships.clear()
+        self.remote_groups.clear()
@@ -0,0 +1,96 @@
+import asyncio
+import statistics
+import time
+
+from channels_redis.core import RedisChannelLayer
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from games.engine import create_world, StateEncoder
+from games.layers import HybridChannelLayer
+from games.wire import FORMATS, encode_payloads
+
+LAYERS = {
+    "redis": RedisChannelLayer,
+    "hybrid": HybridChannelLayer,
+}
+GROUPS = ("lobby_BENCH01", "tournament_match_BENCH01_1")
+PREFIX = "asgi-benchmark"  # flushed after every run, keeps the real layer's keys alone
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure game_state group_send latency and throughput through the plain Redis channel layer "
+        "and HybridChannelLayer, for lobby and tournament match groups whose members share this process."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=2000, help="game_state messages per run (default: 2000).")
+        parser.add_argument("--members", type=int, default=2, help="Consumers in each group (default: 2, the players).")
+        parser.add_argument("--key-every", type=int, default=4,
+                            help="Also send a paddle update to the first member every this many frames (default: 4).")
+
+    def handle(self, *args, **options):
+        hosts = settings.CHANNEL_LAYERS["default"]["CONFIG"]["hosts"]
+        messages = self.make_messages(options["messages"])
+        self.stdout.write(f"{len(messages)} game_state messages to {options['members']} members, Redis at {hosts}")
+        self.stdout.write(f"{'group':<28} {'layer':<7} {'msg/s':>9} {'mean':>9} {'p99':>9}")
+        for group in GROUPS:
+            for name, layer_class in LAYERS.items():
+                layer = layer_class(hosts=hosts, prefix=PREFIX, capacity=len(messages) * 2)
+                rate, latencies = asyncio.run(self.run(layer, group, messages, options["members"], options["key_every"]))
+                latencies.sort()
+                self.stdout.write(
+                    f"{group:<28} {name:<7} {rate:>9.0f} {statistics.mean(latencies) * 1e3:>6.3f} ms "
+                    f"{latencies[int(len(latencies) * 0.99)] * 1e3:>6.3f} ms"
+                )
+
+    @staticmethod
+    def make_messages(count):
+        world = create_world("classic")
+        encoder = StateEncoder()
+        messages = []
+        for _ in range(count):
+            world.step(1 / 60)
+            frame = encoder.encode(world.snapshot(), world.tick)
+            messages.append({"type": "game_state", **frame, "payloads": encode_payloads("classic", frame, encoder.last, FORMATS)})
+        return messages
+
+    async def run(self, layer, group, messages, members, key_every):
+        """Deliveries per second and the send-to-receive latency of every delivery."""
+        channels = [await layer.new_channel() for _ in range(members)]
+        for channel in channels:
+            await layer.group_add(group, channel)
+        keys = len(messages) // key_every
+        expected = len(messages) * members + keys
+        latencies = []
+        done = asyncio.Event()
+
+        async def receive(channel):
+            while True:
+                message = await layer.receive(channel)
+                if message["type"] == "benchmark_done":
+                    return
+                latencies.append(time.perf_counter() - message["sent"])
+                if len(latencies) == expected:
+                    done.set()
+
+        receivers = [asyncio.create_task(receive(channel)) for channel in channels]
+        started = time.perf_counter()
+        for index, message in enumerate(messages):
+            await layer.group_send(group, {**message, "sent": time.perf_counter()})
+            if index % key_every == 0 and index // key_every < keys:
+                await layer.send(channels[0], {"type": "update_paddle_speed", "speed": 10, "sent": time.perf_counter()})
+        await asyncio.wait_for(done.wait(), timeout=60)
+        elapsed = time.perf_counter() - started
+
+        # Stop the receivers with a message rather than cancelling them mid-receive
+        for channel in channels:
+            await layer.send(channel, {"type": "benchmark_done"})
+        await asyncio.gather(*receivers)
+        for channel in channels:
+            await layer.group_discard(group, channel)
+            if isinstance(layer, HybridChannelLayer):
+                layer.forget(channel)  # its Redis receive is still pending
+        await layer.flush()
+        return expected / elapsed, latencies
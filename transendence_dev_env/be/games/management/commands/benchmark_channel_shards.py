@@ -0,0 +1,140 @@
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import time
+
+import redis
+from channels.exceptions import ChannelFull
+from django.core.management.base import BaseCommand, CommandError
+
+from games.layers import ShardedChannelLayer
+
+PREFIXES = ("lobby_", "tournament_", "notifications_")
+PREFIX = "asgi-benchmark"
+MESSAGE = {"type": "game_state", "tick": 1, "state": {"ball": {"x": 400.0, "y": 300.0}, "paddles": {"left": 250.0, "right": 250.0}}}
+
+
+class Command(BaseCommand):
+    help = (
+        "Start local redis-server instances and measure group_send deliveries per second through "
+        "ShardedChannelLayer as lobby_, tournament_ and notifications_ groups are spread over 1 to N of them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--shards", type=int, default=4, help="Most Redis instances to spread over (default: 4).")
+        parser.add_argument("--port", type=int, default=7400, help="Port of the first instance, the others follow (default: 7400).")
+        parser.add_argument("--clients", type=int, default=os.cpu_count(), help="Client processes (default: one per CPU).")
+        # A process receives all its channels through one channels_redis receive loop, with many groups
+        # per client that loop is what gets measured instead of Redis: add clients rather than groups
+        parser.add_argument("--groups", type=int, default=4, help="Groups per client, two members each (default: 4).")
+        parser.add_argument("--seconds", type=float, default=5, help="Length of each run (default: 5).")
+        parser.add_argument("--redis-server", default="redis-server", help="redis-server executable (default: from PATH).")
+
+    def handle(self, *args, **options):
+        ports = [options["port"] + index for index in range(options["shards"])]
+        servers = self.start_servers(options["redis_server"], ports)
+        try:
+            self.stdout.write(f"{options['clients']} clients, {options['groups']} groups each, {options['seconds']} s per run")
+            self.stdout.write(f"{'instances':>9} {'deliveries/s':>13} {'speedup':>8} {'busiest redis':>14}")
+            baseline = None
+            for count in range(1, len(ports) + 1):
+                for port in ports:
+                    redis.Redis(port=port).flushall()
+                before = [redis_cpu(port) for port in ports[:count]]
+                rate = self.run(shard_config(ports[:count]), options)
+                # CPU of the busiest instance over the run, the one that caps throughput given enough cores
+                busiest = max(redis_cpu(port) - cpu for port, cpu in zip(ports, before)) / options["seconds"]
+                baseline = baseline or rate
+                self.stdout.write(f"{count:>9} {rate:>13.0f} {rate / baseline:>7.2f}x {busiest:>13.0%}")
+        finally:
+            for server in servers:
+                server.terminate()
+                server.wait()
+
+    def start_servers(self, executable, ports):
+        servers = []
+        for port in ports:
+            try:
+                servers.append(subprocess.Popen(
+                    [executable, "--port", str(port), "--save", "", "--appendonly", "no"],
+                    stdout=subprocess.DEVNULL,
+                ))
+            except FileNotFoundError:
+                for server in servers:
+                    server.terminate()
+                raise CommandError(f"{executable} not found, pass --redis-server")
+        for port in ports:
+            client = redis.Redis(port=port)
+            for _ in range(50):
+                try:
+                    client.ping()
+                    break
+                except redis.ConnectionError:
+                    time.sleep(0.1)
+            else:
+                raise CommandError(f"redis-server on port {port} did not come up")
+        return servers
+
+    def run(self, config, options):
+        """Messages received per second over all clients."""
+        with multiprocessing.Pool(options["clients"]) as pool:
+            counts = pool.starmap(run_client, [
+                (config, client, options["groups"], options["seconds"]) for client in range(options["clients"])
+            ])
+        return sum(counts) / options["seconds"]
+
+
+def redis_cpu(port):
+    """CPU seconds the instance on port has used so far."""
+    info = redis.Redis(port=port).info("cpu")
+    return info["used_cpu_sys"] + info["used_cpu_user"]
+
+
+def shard_config(ports):
+    """Channels over every instance, each prefix's groups over every third one starting from its own."""
+    urls = [f"redis://localhost:{port}" for port in ports]
+    return {
+        "hosts": urls,
+        "shards": {prefix: urls[index % len(urls)::len(PREFIXES)] for index, prefix in enumerate(PREFIXES)},
+    }
+
+
+def run_client(config, client, groups, seconds):
+    return asyncio.run(load(ShardedChannelLayer(prefix=PREFIX, **config), client, groups, seconds))
+
+
+async def load(layer, client, groups, seconds):
+    """Send to every group of this client in turn for seconds, returns how many messages were received meanwhile."""
+    names = [f"{PREFIXES[index % len(PREFIXES)]}bench_{client}_{index}" for index in range(groups)]
+    channels = []
+    for name in names:
+        for _ in range(2):
+            channel = await layer.new_channel()
+            await layer.group_add(name, channel)
+            channels.append(channel)
+    received = 0
+    deadline = time.monotonic() + seconds
+
+    async def receive(channel):
+        nonlocal received
+        while True:
+            message = await layer.receive(channel)
+            if message["type"] == "benchmark_done":
+                return
+            if time.monotonic() < deadline:
+                received += 1
+
+    receivers = [asyncio.create_task(receive(channel)) for channel in channels]
+    while time.monotonic() < deadline:
+        await asyncio.gather(*(layer.group_send(name, MESSAGE) for name in names))
+    # Stop the receivers with a message rather than cancelling them mid-receive
+    for channel in channels:
+        while True:
+            try:
+                await layer.send(channel, {"type": "benchmark_done"})
+                break
+            except ChannelFull:
+                await asyncio.sleep(0.01)
+    await asyncio.gather(*receivers)
+    return received
@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+from django.core.management.base import BaseCommand
+
+from games.consumers import LobbyConsumer, ChaosLobbyConsumer, ArenaLobbyConsumer
+from games.engine import create_world, StateEncoder
+from games.wire import FORMATS, encode_payloads
+
+CONSUMERS = {
+    "classic": LobbyConsumer,
+    "chaos": ChaosLobbyConsumer,
+    "arena": ArenaLobbyConsumer,
+}
+QUERY_STRINGS = {
+    "json": b"",
+    "delta": b"sync=delta",
+    "binary": b"wire=binary",
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the CPU spent delivering game_state frames to a room, with every consumer "
+        "serializing the frame itself versus forwarding a payload encoded once by the match owner."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--members", default="2,8,32,128",
+                            help="Comma separated room sizes to measure (default: 2,8,32,128).")
+        parser.add_argument("--frames", type=int, default=600, help="Frames per run (default: 600, 10 s at 60 Hz).")
+        parser.add_argument("--mode", choices=sorted(CONSUMERS), default="classic")
+        parser.add_argument("--format", choices=FORMATS, default="json", help="Wire format of the members.")
+
+    def handle(self, *args, **options):
+        members = [int(count) for count in options["members"].split(",")]
+        frames = self.make_frames(options["mode"], options["frames"])
+        self.stdout.write(f"{options['frames']} {options['mode']} frames, {options['format']} members")
+        self.stdout.write(f"{'members':>8} {'per consumer':>14} {'encode once':>13} {'saved':>7}")
+        for count in members:
+            per_consumer = asyncio.run(self.run(options["mode"], options["format"], count, frames, encode_once=False))
+            encode_once = asyncio.run(self.run(options["mode"], options["format"], count, frames, encode_once=True))
+            saved = 1 - encode_once / per_consumer if per_consumer else 0
+            self.stdout.write(
+                f"{count:>8} {per_consumer * 1e6 / len(frames):>11.1f} us {encode_once * 1e6 / len(frames):>10.1f} us {saved:>6.0%}"
+            )
+
+    @staticmethod
+    def make_frames(mode, count):
+        world = create_world(mode)
+        encoder = StateEncoder()
+        frames = []
+        for _ in range(count):
+            world.step(1 / 60)
+            frame = encoder.encode(world.snapshot())
+            frames.append((frame, dict(encoder.last)))
+        return frames
+
+    @staticmethod
+    def make_consumer(mode, wire_format):
+        consumer = CONSUMERS[mode]()
+        consumer.scope = {"query_string": QUERY_STRINGS[wire_format]}
+
+        async def send(text_data=None, bytes_data=None, close=False):
+            pass
+
+        consumer.send = send
+        return consumer
+
+    async def run(self, mode, wire_format, count, frames, encode_once):
+        """CPU seconds spent turning the frames into what goes out on every socket."""
+        consumers = [self.make_consumer(mode, wire_format) for _ in range(count)]
+        formats = {wire_format} if encode_once else set()
+        started = time.process_time()
+        for frame, state in frames:
+            event = {"type": "game_state", **frame, "payloads": encode_payloads(mode, frame, state, formats)}
+            for consumer in consumers:
+                await consumer.game_state(event)
+        return time.process_time() - started
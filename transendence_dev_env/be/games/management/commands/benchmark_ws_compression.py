@@ -0,0 +1,123 @@
+import base64
+import collections
+import json
+import time
+import zlib
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from be.server import MEM_LEVEL, WINDOW_BITS, compression_threshold
+
+TAIL = b"\x00\x00\xff\xff"  # end of the sync flush, left off the wire by permessage-deflate
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a recorded WebSocket traffic sample (WEBSOCKET_TRAFFIC_SAMPLE, see be/server.py) through "
+        "permessage-deflate and report the bytes saved against the CPU spent, per message type, with the "
+        "WEBSOCKET_COMPRESSION thresholds and with every message compressed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("sample", nargs="?", default=settings.WEBSOCKET_TRAFFIC_SAMPLE,
+                            help="Recorded sample (default: WEBSOCKET_TRAFFIC_SAMPLE).")
+        parser.add_argument("--window-bits", type=int, default=WINDOW_BITS, help=f"Default: {WINDOW_BITS}.")
+        parser.add_argument("--mem-level", type=int, default=MEM_LEVEL, help=f"Default: {MEM_LEVEL}.")
+        parser.add_argument("--repeat", type=int, default=5, help="Times the sample is replayed (default: 5).")
+
+    def handle(self, *args, **options):
+        if not options["sample"]:
+            raise CommandError("No sample, record one with WEBSOCKET_TRAFFIC_SAMPLE set or pass its path")
+        try:
+            with open(options["sample"]) as sample:
+                messages = [read_message(json.loads(line)) for line in sample if line.strip()]
+        except OSError as e:
+            raise CommandError(f"Could not read the sample: {e}")
+        connections = len({connection for connection, _, _, _ in messages})
+        self.stdout.write(
+            f"{len(messages)} messages on {connections} connections, "
+            f"window bits {options['window_bits']}, mem level {options['mem_level']}"
+        )
+        for title, threshold in (("WEBSOCKET_COMPRESSION", compression_threshold), ("everything", lambda path: 0)):
+            stats = replay(messages, threshold, options["window_bits"], options["mem_level"], options["repeat"])
+            self.stdout.write(f"\n{title}")
+            self.stdout.write(
+                f"{'type':<24} {'messages':>9} {'compressed':>11} {'bytes/msg':>10} {'sent/msg':>10} {'saved':>7} "
+                f"{'deflate us':>11} {'inflate us':>11} {'us/KB saved':>12}"
+            )
+            for kind, row in sorted(stats.items(), key=lambda item: -item[1]["bytes"]):
+                self.stdout.write(format_row(kind, row))
+            total = collections.Counter()
+            for row in stats.values():
+                total.update(row)
+            self.stdout.write(format_row("total", total))
+
+
+def read_message(entry):
+    """(connection, path, type, payload bytes) of a line of the sample."""
+    if entry["binary"]:
+        return entry["connection"], entry["path"], "binary state", base64.b64decode(entry["payload"])
+    payload = entry["payload"].encode()
+    try:
+        data = json.loads(payload)
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        kind = "other"
+    elif "type" in data:
+        kind = str(data["type"])
+    elif "notification_type" in data:
+        kind = "notification"  # NotificationConsumer sends them as they are
+    else:
+        kind = "other"
+    return entry["connection"], entry["path"], kind, payload
+
+
+def replay(messages, threshold, window_bits, mem_level, repeat):
+    """
+    Counts and timings per message type of sending messages over permessage-deflate, each connection with
+    its own compressor and decompressor (context takeover, as browsers and be/server.py negotiate), the
+    messages under threshold(path) sent as they are. threshold returning None leaves the route uncompressed.
+    """
+    stats = collections.defaultdict(collections.Counter)
+    thresholds = {}
+    for _ in range(repeat):
+        contexts = {}
+        for connection, path, kind, payload in messages:
+            if path not in thresholds:
+                thresholds[path] = threshold(path)
+            row = stats[kind]
+            row["messages"] += 1
+            row["bytes"] += len(payload)
+            limit = thresholds[path]
+            if limit is None or len(payload) < limit:
+                row["sent"] += len(payload)
+                continue
+            if connection not in contexts:
+                contexts[connection] = (
+                    zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -window_bits, mem_level),
+                    zlib.decompressobj(-window_bits),
+                )
+            compressor, decompressor = contexts[connection]
+            start = time.perf_counter_ns()
+            compressed = compressor.compress(payload) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            middle = time.perf_counter_ns()
+            decompressor.decompress(compressed)
+            end = time.perf_counter_ns()
+            row["compressed"] += 1
+            row["sent"] += len(compressed) - len(TAIL)
+            row["deflate_ns"] += middle - start
+            row["inflate_ns"] += end - middle
+    return stats
+
+
+def format_row(kind, row):
+    messages = row["messages"] or 1
+    saved = row["bytes"] - row["sent"]
+    per_kb = f"{row['deflate_ns'] / 1000 / (saved / 1024):.1f}" if saved > 0 else "-"
+    return (
+        f"{kind:<24} {row['messages']:>9} {row['compressed']:>11} {row['bytes'] / messages:>10.0f} "
+        f"{row['sent'] / messages:>10.0f} {saved / max(row['bytes'], 1):>6.1%} "
+        f"{row['deflate_ns'] / 1000 / messages:>11.2f} {row['inflate_ns'] / 1000 / messages:>11.2f} {per_kb:>12}"
+    )
@@ -0,0 +1,22 @@
+import redis
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from games.journal import journal_key, journaled_games
+from games.models import Game
+
+
+class Command(BaseCommand):
+    help = "Write the journaled rounds of games whose manager died mid-game back to their Game rows."
+
+    def handle(self, *args, **options):
+        if not settings.GAME_ROUND_JOURNAL:
+            raise CommandError("GAME_ROUND_JOURNAL is not set, there is no journal to recover from.")
+        client = redis.Redis.from_url(settings.GAME_ROUND_JOURNAL)
+        recovered = 0
+        for game_id, rounds in journaled_games(client).items():
+            # Finished games already have their rounds, the journal is just left over
+            if Game.objects.filter(pk=game_id, is_completed=False).update(rounds=rounds):
+                recovered += 1
+            client.delete(journal_key(game_id))
+        self.stdout.write(self.style.SUCCESS(f"Recovered the rounds of {recovered} game(s)"))
@@ -0,0 +1,50 @@
+import multiprocessing
+import os
+
+from django.core.management.base import BaseCommand
+
+from games.workers import GAME_SIMULATION_CHANNEL
+
+
+def run_worker():
+    # Everything channel-layer related is created inside the child process
+    from channels.layers import get_channel_layer
+    from channels.routing import get_default_application
+    from channels.worker import Worker
+
+    worker = Worker(
+        application=get_default_application(),
+        channels=[GAME_SIMULATION_CHANNEL],
+        channel_layer=get_channel_layer(),
+    )
+    worker.run()
+
+
+class Command(BaseCommand):
+    help = "Start game simulation worker processes that run the matches handed off by the game consumers."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Number of simulation processes to start (default: one per CPU).",
+        )
+
+    def handle(self, *args, **options):
+        count = max(1, options["workers"])
+        processes = [
+            multiprocessing.Process(target=run_worker, name=f"game-worker-{i}", daemon=True)
+            for i in range(count)
+        ]
+        for process in processes:
+            process.start()
+        self.stdout.write(self.style.SUCCESS(
+            f"Started {count} game simulation worker(s) on channel '{GAME_SIMULATION_CHANNEL}'"
+        ))
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
@@ -0,0 +1,33 @@
+import redis
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from games.results import RESULT_BATCH_SIZE, RESULT_FAILED, RESULT_QUEUE, requeue_failed, run_writer
+
+
+class Command(BaseCommand):
+    help = "Write the game results queued by the game consumers to the database in batches. Run a single one."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=RESULT_BATCH_SIZE,
+            help=f"Most results written per transaction (default: {RESULT_BATCH_SIZE}).",
+        )
+        parser.add_argument(
+            "--requeue-failed",
+            action="store_true",
+            help=f"Move the results in '{RESULT_FAILED}' back onto the queue and exit.",
+        )
+
+    def handle(self, *args, **options):
+        if not settings.GAME_RESULT_QUEUE:
+            raise CommandError("GAME_RESULT_QUEUE is not set, results are written by the consumers.")
+        client = redis.Redis.from_url(settings.GAME_RESULT_QUEUE)
+        if options["requeue_failed"]:
+            moved = requeue_failed(client)
+            self.stdout.write(self.style.SUCCESS(f"Moved {moved} result(s) from '{RESULT_FAILED}' to '{RESULT_QUEUE}'"))
+            return
+        self.stdout.write(self.style.SUCCESS(f"Writing game results from '{RESULT_QUEUE}'"))
+        run_writer(client, max(1, options["batch_size"]))
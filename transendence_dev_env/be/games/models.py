@@ -62,6 +62,7 @@ class OnlineMatch(BaseMatch):
     player2_ready = models.BooleanField(default=False)
     winner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='matches_won', blank=True, null=True)
     game_manager = models.CharField(max_length=255, blank=True, null=True)
+    seed = models.BigIntegerField(blank=True, null=True)  # Seed of the match's engine RNG, replays it together with the inputs
 
     def record_match_result(self):
         if self.winner != None:
@@ -564,6 +565,8 @@ class Game(models.Model):
     # Detailed Logging
     moves_log = models.JSONField(blank=True, null=True)  # Log of moves (timestamps, player actions)
     rounds = models.JSONField(blank=True, null=True)     # Round details (scores, times, round winner)
+    seed = models.BigIntegerField(blank=True, null=True)  # Seed of the engine RNG, replays the game together with the inputs
+    replay = models.FileField(upload_to='replays/', blank=True, null=True)  # Seed and input log, see games/replay.py
     status = models.CharField(max_length=20, choices=STATES, default=STARTED)
     # Scores and Results
     score_player1 = models.IntegerField(default=0)
@@ -0,0 +1,134 @@
+# outbound.py
+"""
+Per-connection queue of the messages on their way to a game client.
+
+The consumer's handlers put messages in the queue and return, and a writer
+task sends them, so a client that can't keep up never holds up the
+consumer's channel layer receive loop (whose messages would otherwise pile
+up until the layer drops them). What the queue may hold is bounded:
+
+- State frames supersede each other. Only the newest one not sent yet is
+  kept, the older one is dropped where it waited. Clients on the delta
+  format notice the gap in seq and ask for a keyframe as they would after
+  any lost frame.
+- Everything else (round_completed, game_ended, alert, ...) is sent in
+  order and never dropped. A connection with more than `capacity` of them
+  waiting is hopeless and gets closed instead, the client reconnects and
+  gets the initial state again.
+
+The queue fills while the writer waits on a send, which be/server.py holds
+while the socket has more than a few KB it couldn't write yet. It only holds
+the sends marked QUEUED_SEND, the ones a writer makes; other consumers'
+sends go out as before. The writer can be stuck on such a send for good, so
+an overflowing queue's writer is started over to send the close (see
+OutboundQueueMixin).
+
+Every open queue is in `queues`, for outbound_metrics().
+"""
+import asyncio
+import collections
+import weakref
+
+import logging
+logger = logging.getLogger('game_debug')
+
+OUTBOUND_CAPACITY = 64  # control messages a connection may have waiting
+QUEUED_SEND = "queued"  # key set on the ASGI messages sent by a queue's writer
+
+queues = weakref.WeakSet()
+totals = collections.Counter()  # sent, superseded and overflowed, over every queue so far
+
+
+class OutboundQueue:
+    def __init__(self, send, capacity=OUTBOUND_CAPACITY):
+        self.send = send  # coroutine function sending one ASGI message
+        self.capacity = capacity
+        self.entries = collections.deque()  # [message] lists, a superseded frame's message set to None
+        self.pending_state = None  # entry of the state frame waiting to be sent, if any
+        self.depth = 0  # messages waiting
+        self.controls = 0  # of which control messages
+        self.high_water = 0
+        self.superseded = 0
+        self.sent = 0
+        self.closed = False
+        self.ready = asyncio.Event()
+        queues.add(self)
+
+    def __len__(self):
+        return self.depth
+
+    def put(self, message, state=False):
+        """Queue message, False if the connection is too far behind and should be closed."""
+        if self.closed:
+            return True
+        if state:
+            if self.pending_state is not None:
+                self.pending_state[0] = None
+                self.depth -= 1
+                self.superseded += 1
+                totals["superseded"] += 1
+            self.pending_state = entry = [message]
+        else:
+            if self.controls >= self.capacity:
+                totals["overflowed"] += 1
+                return False
+            self.controls += 1
+            entry = [message]
+        self.append(entry)
+        return True
+
+    def append(self, entry):
+        self.entries.append(entry)
+        self.depth += 1
+        self.high_water = max(self.high_water, self.depth)
+        self.ready.set()
+
+    def close(self, message):
+        """Send message (the websocket.close) after what is waiting, and nothing after it."""
+        if not self.closed:
+            self.controls += 1
+            self.append([message])
+            self.closed = True
+
+    def overflow(self, message):
+        """Drop everything waiting and send message (the websocket.close) next."""
+        logger.warning(f"Closing a connection {self.controls} messages behind")
+        self.entries.clear()
+        self.pending_state = None
+        self.depth = self.controls = 0
+        self.closed = False
+        self.close(message)
+
+    async def run(self):
+        while True:
+            while not self.entries:
+                self.ready.clear()
+                await self.ready.wait()
+            entry = self.entries.popleft()
+            if entry is self.pending_state:
+                self.pending_state = None
+            elif entry[0] is not None:
+                self.controls -= 1
+            message = entry[0]
+            if message is None:
+                continue  # superseded
+            self.depth -= 1
+            await self.send(message)
+            self.sent += 1
+            totals["sent"] += 1
+            if message["type"] == "websocket.close":
+                return
+
+
+def outbound_metrics():
+    """Queue depths of the open connections of this process and the totals so far."""
+    depths = [queue.depth for queue in queues]
+    return {
+        "connections": len(depths),
+        "waiting": sum(depths),
+        "deepest": max(depths, default=0),
+        "high_water": max((queue.high_water for queue in queues), default=0),
+        "sent": totals["sent"],
+        "superseded": totals["superseded"],
+        "overflowed": totals["overflowed"],
+    }
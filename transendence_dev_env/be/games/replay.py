@@ -0,0 +1,225 @@
+# replay.py
+"""
+Compact match replays.
+
+A match is fully determined by its seed and its inputs (see engine.world),
+so a replay stores just those: a header with the seed and the settings the
+world was built with, then one record per input applied and per round
+reset, in tick order, and one for the tick the match was stopped on.
+Nothing is stored per tick.
+
+A record is the tick as a varint delta from the previous record, a byte
+with the record kind and the side, and for inputs the speed and, when the
+input changed it, the player's input delay (see engine.history).
+
+ReplayRecorder buffers records and appends them to the replay file under
+MEDIA_ROOT CHUNK_SIZE bytes at a time. The writes run on WRITER, a single
+thread shared by every recorder, so a slow disk doesn't hold the game loop
+the records come from, and a file's chunks are written in the order they
+were handed over. ReplayPlayer rebuilds the match from
+the file contents tick by tick. It keeps a copy of the world every
+CHECKPOINT_INTERVAL seconds of the match it has simulated, so seeking back
+only re-simulates from the nearest checkpoint instead of from the start.
+"""
+import copy
+import json
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .engine import create_world
+from .wire import SIDES
+
+import logging
+logger = logging.getLogger('game_debug')
+
+MAGIC = b"PRPL"
+VERSION = 1
+HEADER = struct.Struct("<4sBH")  # magic, version, length of the JSON header that follows
+SPEED = struct.Struct("<b")
+DELAY = struct.Struct("<B")
+
+RECORD_INPUT = 0
+RECORD_INPUT_DELAY = 1  # input that also set the player's input delay
+RECORD_ROUND = 2  # world.next_round() after the step of the tick
+RECORD_END = 3  # last tick of the match
+
+CHUNK_SIZE = 4096
+CHECKPOINT_INTERVAL = 5  # seconds of match time between two ReplayPlayer checkpoints
+REPLAY_DIR = "replays"
+
+WRITER = ThreadPoolExecutor(max_workers=1, thread_name_prefix="replay-writer")
+
+
+def encode_varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def decode_varint(data, offset):
+    """Returns (value, offset past it)."""
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, offset
+        shift += 7
+
+
+def replay_header(mode, world, tick_rate):
+    return {
+        "mode": mode,
+        "seed": world.seed,
+        "tick_rate": tick_rate,
+        "max_rewind": world.max_rewind,
+        "settings": getattr(world, "settings", {}),
+    }
+
+
+class ReplayRecorder:
+    """Records the inputs and round resets of one match into a replay file."""
+
+    def __init__(self, name, header, chunk_size=CHUNK_SIZE):
+        self.path = os.path.join(settings.MEDIA_ROOT, name)
+        self.chunk_size = chunk_size
+        self.last_tick = 0
+        self.buffer = bytearray()
+        encoded = json.dumps(header).encode()
+        self.write(HEADER.pack(MAGIC, VERSION, len(encoded)) + encoded, "wb")
+
+    def record(self, tick, kind, side=None, payload=b""):
+        self.buffer += encode_varint(tick - self.last_tick)
+        self.buffer.append(kind << 4 | (SIDES.index(side) if side else 0))
+        self.buffer += payload
+        self.last_tick = tick
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+
+    def record_input(self, tick, side, speed, delay=None):
+        if delay is None:
+            self.record(tick, RECORD_INPUT, side, SPEED.pack(int(speed)))
+        else:
+            self.record(tick, RECORD_INPUT_DELAY, side, SPEED.pack(int(speed)) + DELAY.pack(delay))
+
+    def record_round(self, tick):
+        self.record(tick, RECORD_ROUND)
+
+    def write(self, data, mode="ab"):
+        self.written = WRITER.submit(self.write_file, data, mode)
+
+    def write_file(self, data, mode):
+        try:
+            if mode == "wb":
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, mode) as replay:
+                replay.write(data)
+        except OSError:
+            logger.exception(f"Could not write the replay {self.path}")
+
+    def flush(self):
+        if not self.buffer:
+            return
+        self.write(bytes(self.buffer))
+        self.buffer.clear()
+
+    def close(self, tick=None):
+        """
+        Flush what is left, ending the replay at tick if given. Returns the
+        concurrent.futures.Future of the last write, done once the file is
+        complete.
+        """
+        if tick is not None:
+            self.record(tick, RECORD_END)
+        self.flush()
+        return self.written
+
+
+def read_replay(data):
+    """Returns (header, records) with records as (tick, kind, side, speed, delay) tuples."""
+    magic, version, length = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a replay this version can read")
+    offset = HEADER.size
+    header = json.loads(data[offset:offset + length])
+    offset += length
+    records = []
+    tick = 0
+    while offset < len(data):
+        delta, offset = decode_varint(data, offset)
+        tick += delta
+        kind, side = data[offset] >> 4, SIDES[data[offset] & 0x0F]
+        offset += 1
+        speed = delay = None
+        if kind in (RECORD_INPUT, RECORD_INPUT_DELAY):
+            (speed,) = SPEED.unpack_from(data, offset)
+            offset += SPEED.size
+        if kind == RECORD_INPUT_DELAY:
+            (delay,) = DELAY.unpack_from(data, offset)
+            offset += DELAY.size
+        records.append((tick, kind, side, speed, delay))
+    return header, records
+
+
+class ReplayPlayer:
+    """Re-simulates a recorded match, one tick per step(), and seeks in it."""
+
+    def __init__(self, data, checkpoint_interval=CHECKPOINT_INTERVAL):
+        self.header, self.records = read_replay(data)
+        self.world = create_world(self.header["mode"], seed=self.header["seed"], **self.header["settings"])
+        self.world.max_rewind = self.header["max_rewind"]
+        self.tick_rate = self.header["tick_rate"]
+        self.dt = 1 / self.tick_rate
+        self.end_tick = self.records[-1][0] if self.records else 0
+        self.position = 0
+        self.checkpoint_ticks = max(1, round(checkpoint_interval * self.tick_rate))
+        self.checkpoints = {}  # tick -> (world, position)
+        self.checkpoint()
+
+    @property
+    def finished(self):
+        return self.world.tick >= self.end_tick
+
+    def checkpoint(self):
+        if self.world.tick not in self.checkpoints:
+            self.checkpoints[self.world.tick] = (copy.deepcopy(self.world), self.position)
+
+    def step(self):
+        world = self.world
+        records = self.records
+        tick = world.tick + 1
+        while self.position < len(records) and records[self.position][0] == tick and records[self.position][1] <= RECORD_INPUT_DELAY:
+            _, kind, side, speed, delay = records[self.position]
+            world.set_paddle_speed(side, speed)
+            if kind == RECORD_INPUT_DELAY:
+                world.input_delays[side] = delay
+            self.position += 1
+        world.step(self.dt)
+        while self.position < len(records) and records[self.position][0] == tick:
+            if records[self.position][1] == RECORD_ROUND:
+                world.next_round()
+            self.position += 1
+        if tick % self.checkpoint_ticks == 0:
+            self.checkpoint()
+        return world
+
+    def seek(self, tick):
+        """Bring the world to tick (clamped to the match), from the nearest checkpoint at or before it."""
+        tick = max(0, min(int(tick), self.end_tick))
+        start = max(checkpoint for checkpoint in self.checkpoints if checkpoint <= tick)
+        if not start <= self.world.tick <= tick:
+            world, self.position = self.checkpoints[start]
+            self.world = copy.deepcopy(world)
+        while self.world.tick < tick:
+            self.step()
+        return self.world
@@ -0,0 +1,231 @@
+# results.py
+"""
+Write-behind persistence of game results.
+
+end_game builds its result in memory with game_result(), announces the
+winner straight away and then hands the result to submit_result(). With
+GAME_RESULT_QUEUE set to a Redis URL the result is pushed onto a Redis list
+and `manage.py run_result_writer` drains it, up to RESULT_BATCH_SIZE results
+per transaction: one bulk_update of the Game rows, one XP award per player
+and the stats and achievements the Game post_save signal would have
+updated. Taken results sit on a processing list until they are written, so
+a writer that dies puts them back on the queue when it starts again.
+
+A batch that hits a transient database error (a lost connection, a
+deadlock) is tried again, RESULT_RETRIES times with a backoff doubling from
+RESULT_RETRY_DELAY. A batch that still fails is written one result at a
+time, so a bad result doesn't take the others down with it, and the results
+that fail on their own go to the failed list. `manage.py run_result_writer
+--requeue-failed` puts them back on the queue once the cause is fixed.
+Without a queue, or with Redis unreachable, the result is written the same
+way right away.
+
+XP is worked out by the writer, from the game's duration and the levels the
+players have when their result is written.
+"""
+import itertools
+import json
+import time
+
+import redis
+import redis.asyncio
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import InterfaceError, OperationalError, close_old_connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from accounts.models import Profile
+from .models import Game
+from .signals import record_game_stats
+
+import logging
+logger = logging.getLogger('game_debug')
+
+RESULT_QUEUE = "game-results"
+RESULT_PROCESSING = "game-results:processing"
+RESULT_FAILED = "game-results:failed"
+RESULT_BATCH_SIZE = 50
+RESULT_RETRIES = 4
+RESULT_RETRY_DELAY = 0.5  # seconds before the first retry of a batch, doubled for each next one
+TRANSIENT_ERRORS = (OperationalError, InterfaceError)
+
+RESULT_FIELDS = [
+    'end_time', 'duration', 'winner', 'is_completed', 'status', 'rounds',
+    'score_player1', 'score_player2', 'score_player3', 'score_player4',
+]
+
+_client = None
+
+
+def queue_client():
+    global _client
+    if _client is None:
+        _client = redis.asyncio.Redis.from_url(settings.GAME_RESULT_QUEUE)
+    return _client
+
+
+def xp_award(player, is_winner=False, share=1, minimum=0):
+    """XP for player: calculate_xp_gain() divided by share, at least minimum."""
+    return {"user_id": player.id, "is_winner": is_winner, "share": share, "minimum": minimum}
+
+
+def game_result(game, rounds, winner, status, awards=()):
+    """The result of game as it stands in memory, ready for submit_result()."""
+    end_time = timezone.now()
+    return {
+        "game_id": game.pk,
+        "end_time": end_time.isoformat(),
+        "duration": (end_time - game.start_time).total_seconds(),
+        "winner_id": winner.id if winner else None,
+        "status": status,
+        "rounds": rounds,
+        "scores": [game.score_player1, game.score_player2, game.score_player3, game.score_player4],
+        "awards": list(awards),
+    }
+
+
+async def submit_result(result):
+    if settings.GAME_RESULT_QUEUE:
+        try:
+            await queue_client().lpush(RESULT_QUEUE, json.dumps(result))
+            return
+        except redis.RedisError as e:
+            logger.warning(f"Could not queue the result of game {result['game_id']}, writing it now: {e}")
+    await database_sync_to_async(write_results)([result])
+
+
+def calculate_xp_gain(game, level, is_winner=False):
+    # Set a default duration to handle None values
+    game_duration = game.duration if game.duration is not None else 0
+
+    # Base XP values
+    base_xp = 50  # Base XP for winning a game
+    level_bonus = 1.5 * level
+
+    # Calculate duration-based XP, with diminishing returns
+    if game_duration < 300:  # Short game
+        duration_xp = game_duration * 0.5  # 0.5 XP per second for shorter games
+    elif game_duration < 1200:  # Medium game
+        duration_xp = game_duration * 0.3  # 0.3 XP per second for medium length games
+    else:  # Long game
+        duration_xp = min(400 + (game_duration - 1200) * 0.1, 600)  # Cap XP for long games
+
+    # Score difference multiplier for higher XP based on performance
+    score_difference = abs(game.score_player1 - game.score_player2)
+    performance_multiplier = 1 + min(score_difference / 100, 0.5)  # Up to +50% XP based on score gap
+
+    # Game mode multiplier: more challenging modes award more XP
+    if game.game_mode == Game.PVE:
+        mode_multiplier = 0.7 if not is_winner else 1.0  # PvE easier, give less XP if lost
+    elif game.game_mode == Game.LOCAL_PVP:
+        mode_multiplier = 1.0 if not is_winner else 1.1  # Balanced mode, slight bonus for win
+    elif game.game_mode == Game.ONLINE_ARENA_PVP:
+        mode_multiplier = 1.2 if not is_winner else 1.4  # Four players online, highest reward
+    else:
+        mode_multiplier = 1.1 if not is_winner else 1.3  # Online PvP, higher reward for higher challenge
+
+    # Apply base, duration, level, performance, and mode multipliers
+    xp_gain = (base_xp + duration_xp + level_bonus) * performance_multiplier * mode_multiplier
+
+    # Additional XP for winning, varies by game mode
+    if is_winner:
+        xp_gain += 50 if game.game_mode == Game.PVE else 75  # Higher bonus for PvP games
+
+    return int(xp_gain)
+
+
+@transaction.atomic
+def write_results(results):
+    """Write a batch of results: the Game rows, the players' XP and, for finished games, their stats."""
+    games = Game.objects.select_related('player1', 'player2').in_bulk([result["game_id"] for result in results])
+    written = []
+    for result in results:
+        game = games.get(result["game_id"])
+        if game is None:
+            logger.warning(f"Dropping the result of game {result['game_id']}, it no longer exists")
+            continue
+        game.end_time = parse_datetime(result["end_time"])
+        game.duration = result["duration"]
+        game.winner_id = result["winner_id"]
+        game.is_completed = True
+        game.status = result["status"]
+        game.rounds = result["rounds"]
+        game.score_player1, game.score_player2, game.score_player3, game.score_player4 = result["scores"]
+        written.append((game, result))
+    Game.objects.bulk_update([game for game, _ in written], RESULT_FIELDS)
+
+    # All the XP a player earns in the batch goes in with one add_xp
+    user_ids = {award["user_id"] for _, result in written for award in result["awards"]}
+    profiles = {profile.user_id: profile for profile in Profile.objects.select_related('user').filter(user_id__in=user_ids)}
+    gains = {}
+    for game, result in written:
+        for award in result["awards"]:
+            profile = profiles.get(award["user_id"])
+            if profile is None:
+                continue
+            xp = calculate_xp_gain(game, profile.level, award["is_winner"]) // award["share"]
+            gains[profile.user_id] = gains.get(profile.user_id, 0) + max(award["minimum"], xp)
+    for user_id, xp in gains.items():
+        profiles[user_id].add_xp(xp)
+
+    for game, _ in written:
+        if game.status == Game.FINISHED:
+            record_game_stats(game)
+
+
+def write_with_retries(entries, retries=RESULT_RETRIES, delay=RESULT_RETRY_DELAY):
+    """write_results() of queue entries, tried again on transient database errors."""
+    results = [json.loads(entry) for entry in entries]
+    for attempt in itertools.count():
+        # Drops a connection the last attempt broke
+        close_old_connections()
+        try:
+            return write_results(results)
+        except TRANSIENT_ERRORS as e:
+            if attempt >= retries:
+                raise
+            logger.warning(f"Could not write {len(results)} game result(s), trying again: {e}")
+            time.sleep(delay * 2 ** attempt)
+
+
+def write_batch(client, batch, retries=RESULT_RETRIES, delay=RESULT_RETRY_DELAY):
+    """Write a batch of queue entries, one by one if it fails, the entries that still fail going to RESULT_FAILED."""
+    try:
+        write_with_retries(batch, retries, delay)
+        return
+    except Exception as e:
+        if len(batch) == 1:
+            logger.error(f"Could not write a game result, moving it to {RESULT_FAILED}: {e}")
+            client.lpush(RESULT_FAILED, *batch)
+            return
+        logger.warning(f"Could not write {len(batch)} game results together, writing them one by one: {e}")
+    for entry in batch:
+        write_batch(client, [entry], retries, delay)
+
+
+def requeue_failed(client):
+    """Move the results that could not be written back onto the queue. Returns how many were."""
+    moved = 0
+    while client.lmove(RESULT_FAILED, RESULT_QUEUE, "RIGHT", "LEFT"):
+        moved += 1
+    return moved
+
+
+def run_writer(client, batch_size=RESULT_BATCH_SIZE, timeout=5):
+    """Drain the result queue for ever, with a synchronous client. Only one writer may run at a time."""
+    # Results a previous writer took but never finished, back to the front of the queue
+    while client.lmove(RESULT_PROCESSING, RESULT_QUEUE, "LEFT", "RIGHT"):
+        pass
+    while True:
+        entry = client.blmove(RESULT_QUEUE, RESULT_PROCESSING, timeout, "RIGHT", "LEFT")
+        if entry is None:
+            continue
+        batch = [entry]
+        while len(batch) < batch_size:
+            entry = client.lmove(RESULT_QUEUE, RESULT_PROCESSING, "RIGHT", "LEFT")
+            if entry is None:
+                break
+            batch.append(entry)
+        write_batch(client, batch)
+        client.delete(RESULT_PROCESSING)
@@ -1,5 +1,5 @@
 from django.urls import path
-from .consumers import LobbyConsumer, ChaosLobbyConsumer, ArenaLobbyConsumer, TournamentLobbyConsumer, TournamentConsumer, TournamentMatchConsumer
+from .consumers import LobbyConsumer, ChaosLobbyConsumer, ArenaLobbyConsumer, TournamentLobbyConsumer, TournamentConsumer, TournamentMatchConsumer, ReplayConsumer, SpectatorConsumer
 
 websocket_urlpatterns = [
     path('ws/lobby/<str:room_id>/', LobbyConsumer.as_asgi()),
@@ -8,4 +8,9 @@ websocket_urlpatterns = [
     path('ws/tournament-lobby/<str:room_id>/', TournamentLobbyConsumer.as_asgi()),
     path('ws/tournament/<str:room_id>/', TournamentConsumer.as_asgi()),
     path('ws/tournament/<str:room_id>/<str:match_id>/', TournamentMatchConsumer.as_asgi()),
+    path('ws/replay/<int:game_id>/', ReplayConsumer.as_asgi()),
+    path('ws/spectate/<str:room_id>/', SpectatorConsumer.as_asgi()),
+    path('ws/spectate_chaos/<str:room_id>/', SpectatorConsumer.as_asgi()),
+    path('ws/spectate_arena/<str:room_id>/', SpectatorConsumer.as_asgi()),
+    path('ws/tournament/<str:room_id>/<str:match_id>/spectate/', SpectatorConsumer.as_asgi()),
 ]
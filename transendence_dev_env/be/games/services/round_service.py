@@ -8,6 +8,7 @@ from ..models import (
     TournamentType,
     Stage
 )
+from ..affinity import assign_worker
 import uuid
 
 import logging
@@ -78,6 +79,8 @@ class RoundService:
                 status="pending",
                 start_time=timezone.now()
             )
+            # Settle where the match will be played while nobody is waiting for it
+            assign_worker(match.room_id, match.match_id)
             matches.append(match)
         return matches
 
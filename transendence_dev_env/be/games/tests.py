@@ -1,14 +1,40 @@
-from django.test import TestCase, TransactionTestCase
+from django.test import TestCase, TransactionTestCase, SimpleTestCase, override_settings
 from django.contrib.auth.models import User
 from django.utils import timezone
+from django.db import OperationalError, connection
+from django.test.utils import CaptureQueriesContext
 from .models import (
     TournamentLobby, OnlineTournament, OnlineRound, OnlineMatch, 
-    TournamentType, Stage
+    TournamentType, Stage, Game
 )
 from .services.tournament_lobby_service import TournamentLobbyService
 from .services.round_service import RoundService
 from .services.tournament_service import TournamentService
+from .engine import create_world, BatchSimulator, BroadcastPacer, StateEncoder, StateDecoder, TimerWheel, InputRing, SpectatorFeed
+from .engine.spatial import PowerUpField
+from .workers import MatchSimulation, GameSimulationConsumer
+from .wire import encode_state, decode_state, encode_payloads
+from .replay import WRITER, ReplayPlayer, ReplayRecorder, replay_header
+from .results import RESULT_FAILED, RESULT_QUEUE, calculate_xp_gain, game_result, requeue_failed, submit_result, write_batch, write_results, xp_award
+from .consumers import LobbyConsumer, OutboundQueueMixin, ReplayConsumer
+from .affinity import assign_worker
+from .layers import HybridChannelLayer, ShardedChannelLayer, jump_hash
+from .outbound import QUEUED_SEND, OutboundQueue
+from .management.commands.benchmark_ws_compression import read_message, replay
+from be.server import CompressingServer, SendGate, compression_threshold, send_message
+from channels.layers import InMemoryChannelLayer
+from asgiref.sync import async_to_sync
+from rest_framework.test import APIClient
+import asyncio
+import collections
+import fakeredis
+import fakeredis.aioredis
+import json
 import math
+import os
+import tempfile
+import threading
+from unittest import mock
 
 class OnlineTournamentTestCase(TransactionTestCase):
     """
@@ -362,4 +388,1192 @@ class RoundServiceUnitTest(TestCase):
     def test_new_matchups_invalid_tournament_type(self):
         self.tournament.type = "invalid"
         with self.assertRaises(ValueError):
-            TournamentService.new_matchups(self.tournament, list(self.tournament.participants.all()))
\ No newline at end of file
+            TournamentService.new_matchups(self.tournament, list(self.tournament.participants.all()))
+
+class GamePersistenceTestCase(TestCase):
+    """
+    Tests that a game's rounds and result are written to the database once, after the game.
+    """
+    def setUp(self):
+        self.host = User.objects.create(username="Host")
+        self.guest = User.objects.create(username="Guest")
+        self.consumer = LobbyConsumer()
+        self.consumer.game = Game.objects.create(player1=self.host, player2=self.guest, game_mode=Game.ONLINE_PVP, start_time=timezone.now())
+        Game.objects.filter(pk=self.consumer.game.pk).update(replay="replays/game.replay")
+
+    def test_rounds_are_written_with_the_result(self):
+        consumer = self.consumer
+        rounds = [{"round_number": number, "score_player1": 3, "score_player2": 1, "winner": "Host"} for number in (1, 2)]
+        with self.assertNumQueries(0):
+            for round_data in rounds:
+                async_to_sync(consumer.add_round_to_game)(round_data)
+            result = game_result(consumer.game, consumer.rounds, None, Game.CANCELED_BY_GUEST)
+        with CaptureQueriesContext(connection) as queries:
+            async_to_sync(submit_result)(result)
+        self.assertEqual(len([query for query in queries if query["sql"].startswith('UPDATE "games_game"')]), 1)
+
+        game = Game.objects.get(pk=consumer.game.pk)
+        self.assertEqual(game.rounds, rounds)
+        self.assertEqual(game.status, Game.CANCELED_BY_GUEST)
+        # Only the result fields are written, the replay linked meanwhile stays
+        self.assertEqual(game.replay.name, "replays/game.replay")
+
+    def test_replays_are_for_the_players(self):
+        stranger = User.objects.create(username="Stranger")
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            os.makedirs(os.path.join(media, "replays"))
+            with open(os.path.join(media, "replays/game.replay"), "wb") as replay:
+                replay.write(b"PRPL")
+            load_replay = ReplayConsumer().load_replay
+            self.assertEqual(async_to_sync(load_replay)(self.consumer.game.pk, self.guest), b"PRPL")
+            self.assertIsNone(async_to_sync(load_replay)(self.consumer.game.pk, stranger))
+
+    def test_batch_writes_results_xp_and_stats(self):
+        other = Game.objects.create(player1=self.guest, player2=self.host, game_mode=Game.ONLINE_PVP, start_time=timezone.now())
+        results = [
+            game_result(game, [], self.host, Game.FINISHED, [xp_award(self.host, is_winner=True), xp_award(self.guest, share=4, minimum=10)])
+            for game in (self.consumer.game, other)
+        ]
+        write_results(results)
+
+        self.assertEqual(Game.objects.filter(status=Game.FINISHED, winner=self.host, is_completed=True).count(), 2)
+        host, guest = self.host.profile, self.guest.profile
+        host.refresh_from_db()
+        guest.refresh_from_db()
+        self.assertEqual((host.games_played, host.games_won, guest.games_lost), (2, 2, 2))
+        self.assertGreater(host.xp + host.level, guest.xp + guest.level)
+
+    def test_arena_xp_multiplier(self):
+        game = self.consumer.game
+        game.duration = 120  # 50 base + 60 for two minutes, at level 0 with no score gap
+        xp = {}
+        for mode in (Game.ONLINE_PVP, Game.ONLINE_ARENA_PVP):
+            game.game_mode = mode
+            xp[mode] = (calculate_xp_gain(game, 0), calculate_xp_gain(game, 0, is_winner=True))
+        self.assertEqual(xp, {Game.ONLINE_PVP: (121, 218), Game.ONLINE_ARENA_PVP: (132, 229)})
+
+    # Inside the test's transaction there is no connection to drop between attempts
+    @mock.patch("games.results.close_old_connections")
+    def test_bad_result_does_not_sink_its_batch(self, close_old_connections):
+        queue = fakeredis.FakeRedis()
+        good = game_result(self.consumer.game, [], self.host, Game.FINISHED)
+        missing_scores = dict(good, game_id=self.consumer.game.pk, scores=[1, 2])
+        batch = [json.dumps(missing_scores), "not a result", json.dumps(good)]
+        write_batch(queue, batch, delay=0)
+
+        self.assertEqual(Game.objects.get(pk=self.consumer.game.pk).status, Game.FINISHED)
+        self.assertEqual(sorted(queue.lrange(RESULT_FAILED, 0, -1)), sorted(entry.encode() for entry in batch[:2]))
+
+    @mock.patch("games.results.close_old_connections")
+    def test_transient_errors_are_retried(self, close_old_connections):
+        queue = fakeredis.FakeRedis()
+        result = json.dumps(game_result(self.consumer.game, [], self.host, Game.FINISHED))
+        with mock.patch("games.results.write_results", side_effect=[OperationalError("gone away"), None]) as write:
+            write_batch(queue, [result, result], delay=0)
+        self.assertEqual(write.call_count, 2)
+        self.assertEqual(queue.llen(RESULT_FAILED), 0)
+
+        with mock.patch("games.results.write_results", side_effect=OperationalError("gone away")) as write:
+            write_batch(queue, [result], retries=2, delay=0)
+        self.assertEqual(write.call_count, 3)
+        self.assertEqual(queue.lrange(RESULT_FAILED, 0, -1), [result.encode()])
+
+    def test_failed_results_can_be_requeued(self):
+        queue = fakeredis.FakeRedis()
+        queue.lpush(RESULT_QUEUE, "pending")
+        queue.lpush(RESULT_FAILED, "first", "second")
+        self.assertEqual(requeue_failed(queue), 2)
+        self.assertEqual(queue.llen(RESULT_FAILED), 0)
+        # Written after what is already waiting, oldest first
+        self.assertEqual(queue.lrange(RESULT_QUEUE, 0, -1), [b"second", b"first", b"pending"])
+
+@override_settings(GAME_ASGI_WORKERS=["asgi-1", "asgi-2", "asgi-3"], GAME_AFFINITY_REGISTRY="")
+class WorkerAffinityTestCase(TestCase):
+    """
+    Tests that both players of a room are pointed at the same ASGI worker.
+    """
+    def test_players_get_the_worker_of_the_room(self):
+        host = APIClient()
+        host.force_authenticate(User.objects.create(username="Host"))
+        guest = APIClient()
+        guest.force_authenticate(User.objects.create(username="Guest"))
+
+        created = host.post("/games/lobby/create/", {}, format="json").data
+        self.assertIn(created["worker"], ["asgi-1", "asgi-2", "asgi-3"])
+        for client in (host, guest):
+            joined = client.post("/games/lobby/join/", {"room_id": created["room_id"]}, format="json").data
+            self.assertEqual(joined["worker"], created["worker"])
+
+    def test_assignment_is_spread_and_independent_of_the_worker_order(self):
+        workers = [assign_worker("ROOM01", f"match{number}") for number in range(60)]
+        self.assertEqual(set(workers), {"asgi-1", "asgi-2", "asgi-3"})
+        with override_settings(GAME_ASGI_WORKERS=["asgi-3", "asgi-1", "asgi-2"]):
+            self.assertEqual([assign_worker("ROOM01", f"match{number}") for number in range(60)], workers)
+        with override_settings(GAME_ASGI_WORKERS=[]):
+            self.assertIsNone(assign_worker("ROOM01"))
+
+class ShardedChannelLayerTestCase(SimpleTestCase):
+    """
+    Tests that groups are kept on the Redis instances of their prefix.
+    """
+    def test_groups_go_to_their_shard(self):
+        layer = ShardedChannelLayer(
+            hosts=["redis://channels:6379"],
+            shards={"lobby_": ["redis://lobby-1:6379", "redis://lobby-2:6379"], "notifications_": ["redis://channels:6379"]},
+        )
+        self.assertEqual(layer.ring_size, 3)
+        self.assertEqual({layer.consistent_hash(f"lobby_ROOM{number}") for number in range(50)}, {1, 2})
+        self.assertEqual(layer.consistent_hash("notifications_7"), 0)
+        self.assertEqual(layer.consistent_hash("tournament_ROOM01"), 0)
+        # A process-local channel is sent to where its process receives
+        channel = f"specific.{layer.client_prefix}!abc"
+        self.assertEqual(layer.consistent_hash(channel), layer.consistent_hash(layer.non_local_name(channel)))
+
+    def test_adding_an_instance_moves_only_its_share(self):
+        keys = [f"lobby_{number}" for number in range(4000)]
+        moved = sum(jump_hash(key, 4) != jump_hash(key, 5) for key in keys)
+        self.assertLess(moved, len(keys) * 0.25)
+        self.assertTrue(all(jump_hash(key, 5) == 4 for key in keys if jump_hash(key, 4) != jump_hash(key, 5)))
+
+class HybridChannelLayerTestCase(SimpleTestCase):
+    """
+    Tests that messages between channels of the same process skip Redis and
+    the others still go through it, with two layers on one fake Redis
+    standing in for two processes.
+    """
+    def run_layers(self, scenario, **kwargs):
+        server = fakeredis.FakeServer()
+        hosts = [{"connection_class": fakeredis.aioredis.FakeConnection, "server": server}]
+
+        async def run():
+            here = HybridChannelLayer(hosts=hosts, **kwargs)
+            there = HybridChannelLayer(hosts=hosts, **kwargs)
+            try:
+                return await scenario(here, there)
+            finally:
+                for layer in (here, there):
+                    for channel in list(layer.channels):
+                        layer.forget(channel)
+        return async_to_sync(run)()
+
+    def receive(self, layer, channel):
+        return asyncio.wait_for(layer.receive(channel), timeout=2)
+
+    def test_local_send_skips_redis(self):
+        async def scenario(here, there):
+            channel = await here.new_channel()
+            message = {"type": "update_paddle_speed", "speed": 10}
+            # Sent before the first receive, still delivered
+            await here.send(channel, message)
+            received = await self.receive(here, channel)
+            return received is message, here.local_deliveries, here.remote_deliveries
+
+        self.assertEqual(self.run_layers(scenario), (True, 1, 0))
+
+    def test_group_send_reaches_local_and_remote_members(self):
+        async def scenario(here, there):
+            local = [await here.new_channel() for _ in range(2)]
+            remote = await there.new_channel()
+            for layer, channel in ((here, local[0]), (here, local[1]), (there, remote)):
+                await layer.group_add("lobby_ROOM01", channel)
+            await here.group_send("lobby_ROOM01", {"type": "game_state", "tick": 1})
+            ticks = [(await self.receive(here, channel))["tick"] for channel in local]
+            ticks.append((await self.receive(there, remote))["tick"])
+            return ticks, here.local_deliveries, here.remote_deliveries
+
+        self.assertEqual(self.run_layers(scenario), ([1, 1, 1], 2, 1))
+
+    def test_remote_members_are_cached(self):
+        async def scenario(here, there):
+            first = await there.new_channel()
+            await there.group_add("lobby_ROOM01", first)
+            await here.group_send("lobby_ROOM01", {"type": "game_state", "tick": 1})
+            late = await there.new_channel()
+            await there.group_add("lobby_ROOM01", late)
+            await here.group_send("lobby_ROOM01", {"type": "game_state", "tick": 2})
+            cached = [(await self.receive(there, first))["tick"] for _ in range(2)]
+            here.membership_ttl = 0
+            await here.group_send("lobby_ROOM01", {"type": "game_state", "tick": 3})
+            return cached, (await self.receive(there, late))["tick"]
+
+        self.assertEqual(self.run_layers(scenario, membership_ttl=60), ([1, 2], 3))
+
+    def test_receive_races_local_queue_and_redis(self):
+        async def scenario(here, there):
+            channel = await here.new_channel()
+            receive = asyncio.ensure_future(here.receive(channel))
+            await asyncio.sleep(0.05)
+            await here.send(channel, {"type": "local"})
+            first = await asyncio.wait_for(receive, timeout=2)
+            # The Redis receive that lost stays pending and gets the next message from elsewhere
+            pending = channel in here.redis_receives
+            await there.send(channel, {"type": "remote"})
+            second = await self.receive(here, channel)
+            return first["type"], pending, second["type"]
+
+        self.assertEqual(self.run_layers(scenario), ("local", True, "remote"))
+
+    def test_messages_for_gone_channels_are_dropped(self):
+        async def scenario(here, there):
+            channel = await here.new_channel()
+            await here.group_add("lobby_ROOM01", channel)
+            receive = asyncio.ensure_future(here.receive(channel))
+            await asyncio.sleep(0.05)
+            receive.cancel()
+            await asyncio.gather(receive, return_exceptions=True)
+            await here.send(channel, {"type": "game_state"})
+            await here.group_send("lobby_ROOM01", {"type": "game_state"})
+            return channel in here.channels, dict(here.groups), dict(here.memberships), here.dropped
+
+        self.assertEqual(self.run_layers(scenario), (False, {}, {}, 1))
+
+    def test_local_group_membership_expires(self):
+        async def scenario(here, there):
+            channel = await here.new_channel()
+            await here.group_add("lobby_ROOM01", channel)
+            here.group_expiry = -1
+            await here.group_send("lobby_ROOM01", {"type": "game_state"})
+            return dict(here.groups), here.channels[channel].qsize()
+
+        self.assertEqual(self.run_layers(scenario), ({}, 0))
+
+    def test_idle_channels_expire(self):
+        async def scenario(here, there):
+            idle = await here.new_channel()
+            await here.group_add("lobby_ROOM01", idle)
+            here.expiry = 0
+            here.swept -= 1
+            await here.new_channel()
+            return idle in here.channels, dict(here.groups)
+
+        self.assertEqual(self.run_layers(scenario), (False, {}))
+
+class EngineTestCase(SimpleTestCase):
+    """
+    Tests for the pure-Python simulation core in games/engine.
+    """
+    def test_step_scales_with_dt(self):
+        """two 120 Hz steps move the ball as far as one 60 Hz step"""
+        slow = create_world("classic")
+        fast = create_world("classic")
+        slow.step(1 / 60)
+        fast.step(1 / 120)
+        fast.step(1 / 120)
+        self.assertAlmostEqual(slow.ball_x, fast.ball_x)
+        self.assertAlmostEqual(slow.ball_y, fast.ball_y)
+
+    def test_paddle_is_clamped_to_field(self):
+        world = create_world("classic")
+        world.set_paddle_speed("left", 10)
+        for _ in range(100):
+            world.step(1 / 60)
+        self.assertEqual(world.paddles["left"].position, 440)
+
+    def test_score_resets_ball(self):
+        world = create_world("classic")
+        world.ball_x = 999
+        world.ball_y = 10
+        world.paddles["right"].position = 400
+        self.assertEqual(world.step(1 / 60), "left")
+        self.assertEqual(world.scores["left"], 1)
+        self.assertEqual((world.ball_x, world.ball_y), (500, 250))
+
+    def test_arena_point_goes_to_last_touch(self):
+        world = create_world("arena")
+        world.last_touch = "top"
+        world.ball_x = 799
+        world.ball_direction_x = 1
+        world.ball_direction_y = 0
+        self.assertEqual(world.step(1 / 60), "top")
+        self.assertEqual(world.scores["top"], 1)
+        self.assertIsNone(world.last_touch)
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            create_world("3d")
+
+class SweptCollisionTestCase(SimpleTestCase):
+    """
+    Tests that fast chaos balls can't tunnel through paddles, walls or power-ups.
+    """
+    def fast_world(self):
+        world = create_world("chaos", powerup_spawn_rate=1000)
+        world.ball_speed_modifier = 3.375
+        world.ball_direction_y = 0
+        return world
+
+    def test_fast_ball_bounces_off_paddle(self):
+        world = self.fast_world()
+        world.ball_x = 40
+        world.ball_y = 280
+        world.ball_direction_x = -1
+        # 50.625 units in one 20 Hz step, the ball would end up behind the paddle
+        self.assertIsNone(world.step(1 / 20))
+        self.assertEqual(world.ball_direction_x, 1)
+        self.assertAlmostEqual(world.ball_x, 25 + 50.625 - 15)
+
+    def test_ball_stays_inside_walls(self):
+        world = self.fast_world()
+        world.ball_y = 30
+        world.ball_direction_x = 0.1
+        world.ball_direction_y = -1
+        world.step(1 / 20)
+        self.assertEqual(world.ball_direction_y, 1)
+        self.assertGreaterEqual(world.ball_y, 15)
+
+    def test_power_up_on_the_path_is_picked_up(self):
+        world = self.fast_world()
+        world.ball_x = 400
+        world.ball_y = 250
+        world.ball_direction_x = 1
+        world.active_power_ups.add(425, 250, "shrinkPaddle")
+        world.step(1 / 20)
+        self.assertEqual(world.active_power_ups.as_list(), [])
+        self.assertEqual(world.paddle_size_modifier, 0.5)
+
+class PowerUpFieldTestCase(SimpleTestCase):
+    """
+    Tests for the grid-indexed power-up storage.
+    """
+    def test_only_power_ups_near_the_path_are_found(self):
+        field = PowerUpField()
+        near = field.add(120, 100, "fastBall")
+        field.add(900, 400, "slowBall")
+        far_cell = field.add(300, 100, "growBall")
+        self.assertEqual(field.touching([(100, 100, 140, 100)], 30), [near])
+        self.assertEqual(field.touching([(100, 100, 140, 100), (140, 100, 290, 100)], 30), [near, far_cell])
+
+    def test_remove_keeps_slots_consistent(self):
+        field = PowerUpField()
+        ids = [field.add(50 * i, 50, "fastBall") for i in range(1, 5)]
+        field.remove(ids[1])
+        self.assertEqual(len(field), 3)
+        self.assertEqual([p["x"] for p in field.as_list()], [50, 200, 150])
+        self.assertEqual(field.touching([(200, 50, 200, 50)], 1), [ids[3]])
+        field.clear()
+        self.assertFalse(field)
+
+class TimerWheelTestCase(SimpleTestCase):
+    """
+    Tests for tick-indexed timers.
+    """
+    def test_fires_on_the_scheduled_tick_only(self):
+        wheel = TimerWheel(size=8)
+        fired = []
+        wheel.schedule(3, fired.append, "soon")
+        late = wheel.schedule(20, fired.append, "after a full turn")
+        cancelled = wheel.schedule(3, fired.append, "cancelled")
+        wheel.cancel(cancelled)
+        self.assertEqual(len(wheel), 2)
+        for tick in range(1, 21):
+            for callback, args in wheel.advance():
+                callback(*args)
+                fired.append(tick)
+        self.assertEqual(fired, ["soon", 3, "after a full turn", 20])
+        self.assertFalse(late.pending)
+        self.assertEqual(len(wheel), 0)
+
+    def test_scheduled_from_inside_a_step(self):
+        world = create_world("classic")
+        fired = []
+        step = world.rules.step
+
+        def scheduling_step(world, dt):
+            if world.tick == 10:
+                world.after(3 / 60, lambda: fired.append(world.tick))
+            return step(world, dt)
+
+        world.rules.step = scheduling_step
+        for _ in range(20):
+            world.step(1 / 60)
+        self.assertEqual(fired, [13])
+
+    def test_chaos_power_up_expires_after_its_duration(self):
+        world = create_world("chaos")
+        world.ball_speed = 0
+        world.step(1 / 120)
+        world.rules.activate_power_up(world, "enlargePaddle")
+        self.assertEqual(world.paddle_size_modifier, 1.5)
+        for _ in range(5 * 120 - 1):
+            world.step(1 / 120)
+        self.assertEqual(world.paddle_size_modifier, 1.5)
+        world.step(1 / 120)
+        self.assertEqual(world.paddle_size_modifier, 0.75)
+        self.assertEqual(world.expire_power_ups, [])
+
+class InputRingTestCase(SimpleTestCase):
+    """
+    Tests for queuing paddle inputs between ticks.
+    """
+    def test_drain_applies_inputs_in_order(self):
+        world = create_world("classic")
+        inputs = InputRing(capacity=4)
+        for speed in (10, 0, -10, 0, 10, -10):
+            inputs.push("left", speed)
+        self.assertEqual((len(inputs), inputs.dropped), (4, 2))
+        self.assertEqual(inputs.drain(world), 4)
+        self.assertEqual(world.paddles["left"].speed, -10)
+        self.assertEqual(inputs.drain(world), 0)
+
+    def test_input_does_not_wait_for_the_tick(self):
+        consumer = LobbyConsumer()
+        consumer.player_sides, consumer.default_player_side = {"1": "left"}, "right"
+
+        async def update_while_locked():
+            async with consumer.game_lock:
+                await consumer.update_paddle_speed({"user_id": 1, "speed": 10})
+
+        async_to_sync(update_while_locked)()
+        self.assertEqual(len(consumer.inputs), 1)
+
+    def test_key_events_are_coalesced_per_tick(self):
+        consumer = LobbyConsumer()
+        consumer.room_group_name = "lobby_ABC123"
+        consumer.channel_layer = InMemoryChannelLayer()
+        consumer.game_manager_channel = "manager"
+        consumer.channel_name = "player"
+
+        async def mash_keys():
+            for speed in (-10, 0, 10, 0, 10):
+                await consumer.send_paddle_speed(1, speed)
+            await consumer.input_flush_task
+            message = await consumer.channel_layer.receive("manager")
+            self.assertEqual(consumer.channel_layer.channels.get("manager", ()), ())
+            return message
+
+        message = async_to_sync(mash_keys)()
+        self.assertEqual((message["user_id"], message["speed"]), (1, 10))
+        self.assertEqual(message["sequence"], 1)
+
+    @override_settings(GAME_MAX_REWIND=0.1)
+    def test_view_tick_is_checked(self):
+        consumer = LobbyConsumer()
+        # Nothing to rewind to before the first frame
+        self.assertIsNone(consumer.rewind_tick(5))
+        consumer.last_state_tick = 100
+        rewind = round(0.1 * consumer.simulation_rate)
+        self.assertEqual([consumer.rewind_tick(tick) for tick in (95, 10 ** 9, -7)], [95, 100, 100 - rewind])
+        for view_tick in ("5", float("nan"), True, [5]):
+            async_to_sync(consumer.send_paddle_speed)(1, 10, view_tick=view_tick)
+            self.assertIsNone(consumer.pending_input)
+
+    def test_seq_is_checked(self):
+        consumer = LobbyConsumer()
+        for seq in ("5", 5.0, -1, 2 ** 32, False):
+            async_to_sync(consumer.send_paddle_speed)(1, 10, seq=seq)
+            self.assertIsNone(consumer.pending_input)
+
+    def test_frames_acknowledge_applied_inputs(self):
+        world = create_world("classic")
+        inputs = InputRing()
+        inputs.push("left", 10, seq=4)
+        inputs.push("left", 0, seq=5)
+        inputs.push("right", 10)
+        encoder = StateEncoder()
+        self.assertEqual(encoder.encode(world.snapshot(), world.tick, inputs.acks)["acks"], {})
+        inputs.drain(world)
+        world.step(1 / 60)
+        frame = encoder.encode(world.snapshot(), world.tick, inputs.acks)
+        self.assertEqual((frame["tick"], frame["acks"]), (1, {"left": 5}))
+
+    def test_stale_updates_are_dropped(self):
+        consumer = LobbyConsumer()
+        consumer.player_sides, consumer.default_player_side = {"1": "left"}, "right"
+        world = create_world("classic")
+        for sequence, speed in ((5, 10), (4, -10), (6, 0)):
+            async_to_sync(consumer.update_paddle_speed)(
+                {"user_id": 2 if speed == 0 else 1, "speed": speed, "connection": "first", "sequence": sequence}
+            )
+        consumer.inputs.drain(world)
+        self.assertEqual((world.paddles["left"].speed, world.paddles["right"].speed), (10, 0))
+        # A new connection, through this process or another one, numbers its updates from 1 again
+        async_to_sync(consumer.update_paddle_speed)({"user_id": 1, "speed": -10, "connection": "second", "sequence": 1})
+        consumer.inputs.drain(world)
+        self.assertEqual(world.paddles["left"].speed, -10)
+
+class LagCompensationTestCase(SimpleTestCase):
+    """
+    Tests for rewinding paddle contacts to what a lagging player saw.
+    """
+    def late_save(self, world, view_delay, ball_x=12):
+        """Left player moves up to save a ball their input reaches the simulation too late for."""
+        world.ball_speed = 0
+        for _ in range(10):
+            world.step(1 / 60)
+        world.ball_x, world.ball_y = ball_x, 230
+        world.ball_direction_x, world.ball_direction_y, world.ball_speed = -1, 0, 5
+        inputs = InputRing()
+        inputs.push("left", -10, view_tick=None if view_delay is None else world.tick + 1 - view_delay)
+        inputs.drain(world)
+        world.step(1 / 60)
+        return world.ball_direction_x
+
+    def test_contact_counts_where_the_player_saw_the_paddle(self):
+        self.assertEqual(self.late_save(create_world("classic"), None), -1)
+        self.assertEqual(self.late_save(create_world("classic"), 6), 1)
+        # Chaos sweeps the ball's edge against the paddle face
+        self.assertEqual(self.late_save(create_world("chaos"), 6, ball_x=28), 1)
+
+    def test_current_paddle_does_not_count_for_a_lagging_player(self):
+        # The paddle covers the ball now, but the player saw it move away from it
+        world = create_world("classic")
+        world.ball_speed = 0
+        for _ in range(10):
+            world.step(1 / 60)
+        world.ball_x, world.ball_y = 12, 280
+        world.ball_direction_x, world.ball_direction_y, world.ball_speed = -1, 0, 5
+        inputs = InputRing()
+        inputs.push("left", 10, view_tick=world.tick - 5)
+        inputs.drain(world)
+        world.step(1 / 60)
+        self.assertEqual(world.ball_direction_x, -1)
+
+    def test_batch_agrees_with_world_at_the_start(self):
+        # The player saw the paddle before the match started
+        world = create_world("classic")
+        world.ball_x, world.ball_y, world.ball_direction_x, world.ball_direction_y = 12, 230, -1, 0
+        world.set_paddle_speed("left", -10)
+        world.set_input_delay("left", 6)
+        world.step(1 / 60)
+        batch = BatchSimulator(capacity=2)
+        view = batch.add_match()
+        batch.ball_x[view.slot], batch.ball_y[view.slot] = 12, 230
+        batch.direction_x[view.slot], batch.direction_y[view.slot] = -1, 0
+        view.set_paddle_speed("left", -10)
+        view.set_input_delay("left", 6)
+        batch.step(1 / 60)
+        self.assertEqual(world.ball_direction_x, 1)
+        self.assertEqual(batch.direction_x[view.slot], world.ball_direction_x)
+
+    def test_rewind_is_capped(self):
+        world = create_world("classic")
+        world.step(1 / 120)
+        world.set_input_delay("left", 1000)
+        self.assertEqual(world.input_delays["left"], 12)
+        world.set_input_delay("left", -3)
+        self.assertEqual(world.input_delays["left"], 0)
+
+    def test_batch_matches_world(self):
+        batch = BatchSimulator(capacity=2)
+        view = batch.add_match()
+        batch.ball_speed[view.slot] = 0
+        for _ in range(10):
+            batch.step(1 / 60)
+        batch.ball_x[view.slot], batch.ball_y[view.slot] = 12, 230
+        batch.direction_x[view.slot], batch.direction_y[view.slot], batch.ball_speed[view.slot] = -1, 0, 5
+        view.set_paddle_speed("left", -10)
+        view.set_input_delay("left", 6)
+        batch.step(1 / 60)
+        self.assertEqual(batch.direction_x[view.slot], 1)
+
+class DeterminismTestCase(SimpleTestCase):
+    """
+    Tests that a match is determined by its seed and its inputs.
+    """
+    def play(self, world, steps=3000):
+        inputs = InputRing()
+        for tick in range(steps):
+            if tick % 45 == 0:
+                inputs.push("left", 10 if tick % 90 else -10)
+                inputs.push("right", -10 if tick % 90 else 10)
+            inputs.drain(world)
+            world.step(1 / 120)
+        return world.snapshot()
+
+    def test_same_seed_same_match(self):
+        for mode in ("classic", "chaos", "arena"):
+            first = self.play(create_world(mode, seed=42, powerup_spawn_rate=1))
+            second = self.play(create_world(mode, seed=42, powerup_spawn_rate=1))
+            self.assertEqual(first, second)
+        chaos = self.play(create_world("chaos", seed=42, powerup_spawn_rate=1))
+        other = self.play(create_world("chaos", seed=43, powerup_spawn_rate=1))
+        self.assertNotEqual(chaos["active_power_ups"], other["active_power_ups"])
+
+    def test_batched_match_serves_like_its_world(self):
+        world = create_world("classic", seed=7)
+        view = BatchSimulator(capacity=2).add_match(seed=7)
+        for _ in range(3):
+            world.reset_ball()
+            view.reset_ball()
+            self.assertEqual(world.ball_direction_y, view.batch.direction_y[view.slot])
+
+class ReplayTestCase(SimpleTestCase):
+    """
+    Tests that a replay file re-simulates the recorded match.
+    """
+    def record(self, snapshots):
+        """Record a chaos match, keeping its snapshot at the ticks in snapshots."""
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            world = create_world("chaos", seed=5, powerup_spawn_rate=1)
+            world.max_rewind = 0.1
+            world.recorder = ReplayRecorder("replays/test.replay", replay_header("chaos", world, 120), chunk_size=64)
+            inputs = InputRing()
+            for tick in range(3000):
+                if tick % 45 == 0:
+                    inputs.push("left", 10 if tick % 90 else -10, view_tick=tick - 4)
+                    inputs.push("right", -10 if tick % 90 else 10)
+                inputs.drain(world)
+                world.step(1 / 120)
+                if tick == 1500:
+                    world.next_round()
+                if world.tick in snapshots:
+                    snapshots[world.tick] = world.snapshot()
+            world.recorder.close(world.tick).result()
+            with open(os.path.join(media, "replays/test.replay"), "rb") as replay:
+                return replay.read()
+
+    def test_replay_reproduces_match(self):
+        snapshots = {3000: None}
+        data = self.record(snapshots)
+        # A few bytes per input, nothing per tick
+        self.assertLess(len(data), 1000)
+        player = ReplayPlayer(data)
+        self.assertEqual(player.end_tick, 3000)
+        while not player.finished:
+            player.step()
+        self.assertEqual(player.world.tick, 3000)
+        self.assertEqual(player.world.snapshot(), snapshots[3000])
+
+    def test_recording_does_not_wait_for_the_disk(self):
+        disk = threading.Event()
+        WRITER.submit(disk.wait, 10)
+        try:
+            with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+                world = create_world("classic", seed=5)
+                recorder = ReplayRecorder("replays/slow.replay", replay_header("classic", world, 120), chunk_size=8)
+                for tick in range(1, 100):
+                    recorder.record_input(tick, "left", 10)
+                written = recorder.close(100)
+                path = os.path.join(media, "replays/slow.replay")
+                self.assertFalse(os.path.exists(path))
+                disk.set()
+                written.result()
+                with open(path, "rb") as data:
+                    self.assertEqual(ReplayPlayer(data.read()).end_tick, 100)
+        finally:
+            disk.set()
+
+    def test_seek_needs_a_number(self):
+        consumer = ReplayConsumer()
+        consumer.player = ReplayPlayer(self.record({}))
+        consumer.sent = []
+
+        async def send_json(content, close=False):
+            consumer.sent.append(content)
+
+        consumer.send_json = send_json
+        for tick in ("x", None, True, float("nan")):
+            async_to_sync(consumer.receive_json)({"action": "seek", "tick": tick})
+        self.assertEqual([content["type"] for content in consumer.sent], ["error"] * 4)
+        self.assertEqual(consumer.player.world.tick, 0)
+
+    def test_seek_runs_off_the_event_loop(self):
+        consumer = ReplayConsumer()
+        consumer.player = ReplayPlayer(self.record({}))
+        consumer.mode = consumer.player.header["mode"]
+        consumer.scope = {"query_string": b""}
+        consumer.state_encoder = StateEncoder()
+        consumer.seeking = False
+        consumer.speed = 1
+        consumer.pending_ticks = 0.0
+        consumer.sent = []
+
+        async def send(text_data=None, bytes_data=None, close=False):
+            consumer.sent.append(text_data)
+
+        consumer.send = send
+
+        async def scenario():
+            seek = asyncio.create_task(consumer.receive_json({"action": "seek", "tick": 3000}))
+            await asyncio.sleep(0)
+            # The loop is free meanwhile and playback leaves the world alone
+            seeking = consumer.seeking
+            await consumer.playback_tick(1)
+            await seek
+            return seeking
+
+        self.assertTrue(async_to_sync(scenario)())
+        self.assertEqual(consumer.player.world.tick, 3000)
+        self.assertEqual(len(consumer.sent), 1)
+
+    def test_seek(self):
+        snapshots = {700: None, 1800: None, 2500: None}
+        player = ReplayPlayer(self.record(snapshots), checkpoint_interval=5)
+        # Forward past the round reset, then back to before it and forward again
+        self.assertEqual(player.seek(2500).snapshot(), snapshots[2500])
+        self.assertEqual(player.seek(700).snapshot(), snapshots[700])
+        self.assertEqual(player.seek(1800).snapshot(), snapshots[1800])
+        self.assertEqual(sorted(player.checkpoints), [0, 600, 1200, 1800, 2400])
+        self.assertEqual(player.seek(10 ** 6).tick, 3000)
+
+class BroadcastPacerTestCase(SimpleTestCase):
+    """
+    Tests for decoupled and adaptive broadcast rates.
+    """
+    def test_broadcast_rate_is_independent_of_simulation_rate(self):
+        pacer = BroadcastPacer(30)
+        due = [pacer.due(1 / 120) for _ in range(120)]
+        self.assertEqual(sum(due), 30)
+        self.assertEqual(due[:8], [False, False, False, True] * 2)
+        same_rate = BroadcastPacer(60)
+        self.assertTrue(all(same_rate.due(1 / 60) for _ in range(60)))
+
+    def test_backs_off_and_recovers(self):
+        pacer = BroadcastPacer(60, min_rate=10)
+        pacer.record(latency=0.02)
+        self.assertEqual(pacer.rate, 30)
+        pacer.record(latency=0.0, queue_depth=100)
+        pacer.record(latency=0.5)
+        self.assertEqual(pacer.rate, 10)
+        for _ in range(100):
+            pacer.record(latency=0.001)
+        self.assertEqual(pacer.rate, 60)
+
+class BatchSimulatorTestCase(SimpleTestCase):
+    """
+    Tests that the vectorized classic simulator matches the per-match World.
+    """
+    def test_matches_classic_world(self):
+        batch = BatchSimulator(capacity=2)
+        views = [batch.add_match() for _ in range(3)]  # forces a grow
+        worlds = [create_world("classic") for _ in views]
+        for speed, view, world in zip((-4, 0, 6), views, worlds):
+            view.set_paddle_speed("left", speed)
+            world.set_paddle_speed("left", speed)
+        for _ in range(90):
+            batch.step(1 / 60)
+            for world in worlds:
+                world.step(1 / 60)
+        for view, world in zip(views, worlds):
+            for key, value in world.snapshot().items():
+                self.assertAlmostEqual(view.snapshot()[key], value, msg=key)
+
+    def test_scoring_and_release(self):
+        batch = BatchSimulator()
+        view = batch.add_match()
+        batch.ball_x[view.slot] = 999
+        batch.ball_y[view.slot] = 10
+        scorers = batch.step(1 / 60)
+        self.assertEqual(scorers[view.slot], 0)
+        self.assertEqual(view.scores, {"left": 1, "right": 0})
+        self.assertEqual((view.snapshot()["ball_x"], view.snapshot()["ball_y"]), (500, 250))
+        self.assertTrue(view.round_over(1))
+
+        batch.remove_match(view.slot)
+        self.assertEqual(len(batch), 0)
+        self.assertEqual(batch.add_match().scores, {"left": 0, "right": 0})
+
+class StateSyncTestCase(SimpleTestCase):
+    """
+    Tests for the delta-compressed game_state frames.
+    """
+    def test_keyframes_and_deltas(self):
+        encoder = StateEncoder(keyframe_interval=3)
+        world = create_world("classic")
+        frames = []
+        for _ in range(4):
+            world.step(1 / 60)
+            frames.append(encoder.encode(world.snapshot()))
+        self.assertEqual([frame["seq"] for frame in frames], [0, 1, 2, 3])
+        self.assertEqual([frame["keyframe"] for frame in frames], [True, False, False, True])
+        self.assertEqual(set(frames[1]["state"]), {"ball_x", "ball_y"})
+        self.assertEqual(len(frames[3]["state"]), len(world.snapshot()))
+
+    def test_values_are_quantized(self):
+        frame = StateEncoder().encode({"ball_x": 501.2345, "ball_y": 250.0, "leftScore": 1})
+        self.assertEqual(frame["state"], {"ball_x": 501.2, "ball_y": 250, "leftScore": 1})
+
+    def test_decoder_waits_for_keyframe_after_gap(self):
+        encoder = StateEncoder()
+        decoder = StateDecoder()
+        world = create_world("classic")
+        frames = []
+        for _ in range(4):
+            world.step(1 / 60)
+            frames.append(encoder.encode(world.snapshot()))
+        self.assertTrue(decoder.apply(frames[0]))
+        self.assertFalse(decoder.apply(frames[2]))
+        self.assertFalse(decoder.apply(frames[3]))
+        self.assertTrue(decoder.awaiting_keyframe)
+
+        encoder.request_keyframe()
+        self.assertTrue(decoder.apply(encoder.encode(world.snapshot())))
+        self.assertEqual(decoder.state["ball_x"], round(world.ball_x, 1))
+
+class WireFormatTestCase(SimpleTestCase):
+    """
+    Tests for the binary game_state frames.
+    """
+    def test_round_trip(self):
+        for mode in ("classic", "chaos", "arena"):
+            world = create_world(mode)
+            world.step(1 / 60)
+            if mode == "chaos":
+                world.active_power_ups.add(120, 80, "fastBall")
+            state = world.snapshot()
+            frame = encode_state(mode, state, seq=7)
+            decoded_mode, seq, decoded = decode_state(frame)
+            self.assertEqual((decoded_mode, seq), (mode, 7))
+            for key, value in state.items():
+                if isinstance(value, float):
+                    self.assertAlmostEqual(decoded[key], value, places=3)
+                else:
+                    self.assertEqual(decoded[key], value)
+
+    def test_classic_frame_is_small(self):
+        # 6 byte header, 4 byte tick, ack count and 22 bytes of state
+        self.assertLess(len(encode_state("classic", create_world("classic").snapshot())), 40)
+
+    def test_tick_and_acks_round_trip(self):
+        state = create_world("arena").snapshot()
+        frame = encode_state("arena", state, seq=3, tick=1234, acks={"left": 7, "bottom": 2})
+        _, _, decoded = decode_state(frame)
+        self.assertEqual(decoded["tick"], 1234)
+        self.assertEqual(decoded["acks"], {"left": 7, "bottom": 2})
+
+class StateFanoutTestCase(SimpleTestCase):
+    """
+    Tests that game consumers forward pre-encoded game_state payloads.
+    """
+    def make_consumer(self, query_string=b""):
+        consumer = LobbyConsumer()
+        consumer.scope = {"query_string": query_string}
+        consumer.room_group_name = "lobby_ABC123"
+        consumer.channel_layer = InMemoryChannelLayer()
+        consumer.sent = []
+
+        async def send(text_data=None, bytes_data=None, close=False):
+            consumer.sent.append(text_data if bytes_data is None else bytes_data)
+
+        consumer.send = send
+        return consumer
+
+    def make_event(self, formats):
+        world = create_world("classic")
+        encoder = StateEncoder()
+        frame = encoder.encode(world.snapshot())
+        return {"type": "game_state", **frame, "payloads": encode_payloads("classic", frame, encoder.last, formats)}
+
+    def test_payload_is_forwarded_as_is(self):
+        consumer = self.make_consumer(b"wire=binary")
+        event = self.make_event({"json", "binary"})
+        async_to_sync(consumer.game_state)(event)
+        self.assertIs(consumer.sent[0], event["payloads"]["binary"])
+
+    def test_missing_format_is_encoded_and_requested(self):
+        consumer = self.make_consumer()
+        consumer.game_manager_channel = "specific.test!manager"
+        async_to_sync(consumer.game_state)(self.make_event(set()))
+        async_to_sync(consumer.game_state)(self.make_event(set()))
+        self.assertEqual(json.loads(consumer.sent[0])["ball_x"], 500)
+
+        request = async_to_sync(consumer.channel_layer.receive)("specific.test!manager")
+        self.assertEqual(request["type"], "state_format_request")
+        self.assertEqual(request["format"], "json")
+        # Asked only once per match owner
+        self.assertNotIn("specific.test!manager", consumer.channel_layer.channels)
+
+class SpectatorFeedTestCase(SimpleTestCase):
+    """
+    Tests for the downsampled, delayed spectator stream.
+    """
+    def test_rate_and_delay(self):
+        world = create_world("classic")
+        feed = SpectatorFeed(60, rate=20, delay=1.0)
+        frames = []
+        for _ in range(300):
+            world.step(1 / 60)
+            frame = feed.sample(world)
+            if frame is not None:
+                self.assertEqual(frame["tick"], world.tick - 60)
+                frames.append(frame)
+        self.assertEqual([frame["tick"] for frame in frames], list(range(3, 241, 3)))
+        self.assertEqual([frame["seq"] for frame in frames if frame["keyframe"]], [0, 20, 40, 60])
+        # Ending the match releases the newest held back state
+        self.assertEqual(feed.flush()["tick"], 300)
+        self.assertIsNone(feed.flush())
+
+    def test_game_ended_by_its_own_tick_flushes_spectators(self):
+        consumer = LobbyConsumer()
+        consumer.channel_layer = InMemoryChannelLayer()
+        consumer.room_id = "ABC123"
+        consumer.world = create_world("classic")
+        consumer.spectator_feed = SpectatorFeed(60, rate=20, delay=1.0)
+        async_to_sync(consumer.channel_layer.group_add)("spectate_ABC123", "specific.test!spectator")
+        for _ in range(30):
+            consumer.world.step(1 / 60)
+            consumer.spectator_feed.sample(consumer.world)
+
+        async def tick():
+            # end_game() in the loop's own task
+            consumer.game_loop_task = asyncio.current_task()
+            await consumer.stop_game_loop()
+            return "finished"
+
+        async def scenario():
+            return await asyncio.create_task(tick())
+
+        self.assertEqual(async_to_sync(scenario)(), "finished")
+        received = [async_to_sync(consumer.channel_layer.receive)("specific.test!spectator") for _ in range(2)]
+        self.assertEqual([message["type"] for message in received], ["spectator_state", "spectate_ended"])
+        self.assertEqual(received[0]["tick"], 30)
+
+    def test_restarted_match_ends_spectating_once(self):
+        consumer = GameSimulationConsumer()
+        consumer.channel_layer = InMemoryChannelLayer()
+        consumer.channel_name = "specific.test!worker"
+        async_to_sync(consumer.channel_layer.group_add)("spectate_ABC123", "specific.test!spectator")
+        event = {
+            "match": "lobby_ABC123",
+            "group": "lobby_ABC123",
+            "reply_channel": "specific.test!reply",
+            "mode": "chaos",
+            "spectator_group": "spectate_ABC123",
+        }
+
+        async def scenario():
+            await consumer.simulation_start(event)
+            previous = consumer.matches["lobby_ABC123"]
+            await consumer.simulation_start(event)
+            await consumer.simulation_stop(event)
+            await asyncio.gather(previous.task, consumer.matches["lobby_ABC123"].task, *consumer.spectator_tasks)
+            messages = []
+            while True:
+                try:
+                    messages.append(await asyncio.wait_for(consumer.channel_layer.receive("specific.test!spectator"), 0.01))
+                except asyncio.TimeoutError:
+                    return [message["type"] for message in messages]
+
+        # One spectate_ended per simulation_start
+        self.assertEqual(async_to_sync(scenario)().count("spectate_ended"), 2)
+
+    def test_worker_sends_spectators_their_own_group(self):
+        consumer = GameSimulationConsumer()
+        consumer.channel_layer = InMemoryChannelLayer()
+        consumer.channel_name = "specific.test!worker"
+        async_to_sync(consumer.channel_layer.group_add)("spectate_ABC123", "specific.test!spectator")
+        match = MatchSimulation({
+            "match": "lobby_ABC123",
+            "group": "lobby_ABC123",
+            "reply_channel": "specific.test!reply",
+            "mode": "classic",
+            "spectator_group": "spectate_ABC123",
+            "spectator_rate": 20,
+            "spectator_delay": 0.1,
+        })
+        for _ in range(12):
+            match.world.step(1 / 60)
+            async_to_sync(consumer.advance)(match, None, 1 / 60)
+        received = async_to_sync(consumer.channel_layer.receive)("specific.test!spectator")
+        self.assertEqual(received["type"], "spectator_state")
+        self.assertEqual(received["tick"], 3)
+        self.assertEqual(set(received["payloads"]), {"json", "delta", "binary"})
+
+class OutboundQueueTestCase(SimpleTestCase):
+    """
+    Tests that a slow client gets the newest state and every control message.
+    """
+    def send_to_slow_client(self, capacity, puts):
+        """Runs puts(queue) while the client is still taking the first frame, returns what it got and put's result."""
+        async def scenario():
+            received = []
+            client_ready = asyncio.Event()
+
+            async def send(message):
+                await client_ready.wait()
+                received.append(message.get("text", message["type"]))
+
+            queue = OutboundQueue(send, capacity=capacity)
+            writer = asyncio.create_task(queue.run())
+            queue.put({"type": "websocket.send", "text": "state 1"}, state=True)
+            await asyncio.sleep(0)
+            result = puts(queue)
+            client_ready.set()
+            queue.close({"type": "websocket.close"})
+            await writer
+            return received, result
+        return async_to_sync(scenario)()
+
+    def test_superseded_states_are_dropped(self):
+        def puts(queue):
+            for number in range(2, 6):
+                queue.put({"type": "websocket.send", "text": f"state {number}"}, state=True)
+            queue.put({"type": "websocket.send", "text": "round_completed"})
+            queue.put({"type": "websocket.send", "text": "state 6"}, state=True)
+            queue.put({"type": "websocket.send", "text": "game_ended"})
+            return len(queue), queue.superseded
+
+        received, (depth, superseded) = self.send_to_slow_client(8, puts)
+        self.assertEqual((depth, superseded), (3, 4))
+        self.assertEqual(received, ["state 1", "round_completed", "state 6", "game_ended", "websocket.close"])
+
+    def test_too_many_control_messages_close_the_connection(self):
+        def puts(queue):
+            accepted = [queue.put({"type": "websocket.send", "text": f"alert {number}"}) for number in range(3)]
+            queue.overflow({"type": "websocket.close", "code": 1013})
+            return accepted
+
+        received, accepted = self.send_to_slow_client(2, puts)
+        self.assertEqual(accepted, [True, True, False])
+        self.assertEqual(received, ["state 1", "websocket.close"])
+
+    def test_client_that_never_takes_a_frame(self):
+        """Like be/server.py holding the sends of a socket the client stopped reading"""
+        class Socket:
+            async def accept(self, subprotocol=None, headers=None):
+                await self.base_send({"type": "websocket.accept"})
+
+            async def base_send(self, message):
+                sent.append(message.get("text", message["type"]))
+                if message["type"] == "websocket.send":
+                    await asyncio.Future()
+
+        class Connection(OutboundQueueMixin, Socket):
+            pass
+
+        sent = []
+
+        async def scenario():
+            connection = Connection()
+            await connection.accept()
+            connection.queue_message({"type": "websocket.send", "text": "state 0"}, state=True)
+            await asyncio.sleep(0)
+            for number in range(1, 10):
+                connection.queue_message({"type": "websocket.send", "text": f"state {number}"}, state=True)
+            superseded = connection.outbound.superseded
+            for number in range(connection.outbound.capacity + 1):
+                connection.queue_message({"type": "websocket.send", "text": f"alert {number}"})
+            await asyncio.wait_for(connection.outbound_task, timeout=1)
+            return superseded
+
+        self.assertEqual(async_to_sync(scenario)(), 8)
+        self.assertEqual(sent, ["websocket.accept", "state 0", "websocket.close"])
+
+    def test_only_queued_sends_wait_for_the_socket(self):
+        server = CompressingServer.__new__(CompressingServer)
+        gate = SendGate()
+        server.connections = {"socket": {"send_gate": gate}}
+        sent = []
+
+        async def scenario():
+            gate.pauseProducing()
+            with mock.patch("daphne.server.Server.handle_reply", side_effect=lambda protocol, message: sent.append(message["text"])):
+                await server.handle_reply("socket", {"type": "websocket.send", "text": "lobby"})
+                queued = asyncio.create_task(server.handle_reply("socket", {"type": "websocket.send", "text": "state", QUEUED_SEND: True}))
+                await asyncio.sleep(0)
+                held = list(sent)
+                gate.resumeProducing()
+                await queued
+            return held
+
+        self.assertEqual(async_to_sync(scenario)(), ["lobby"])
+        self.assertEqual(sent, ["lobby", "state"])
+
+@override_settings(WEBSOCKET_COMPRESSION={"/ws/tournament": 512, "/ws/tournament/": 256})
+class WebSocketCompressionTestCase(SimpleTestCase):
+    """
+    Tests which WebSocket messages are sent compressed.
+    """
+    def test_threshold_of_the_longest_prefix(self):
+        self.assertEqual(compression_threshold("/ws/tournament/ABC/"), 256)
+        self.assertEqual(compression_threshold("/ws/tournament-lobby/ABC/"), 512)
+        self.assertIsNone(compression_threshold("/ws/lobby/ABC/"))
+
+    def test_messages_under_the_threshold_are_not_compressed(self):
+        sent = []
+
+        def send(payload, isBinary, doNotCompress=False):
+            sent.append((len(payload), doNotCompress))
+
+        send_message(send, 256, b"x" * 40)
+        send_message(send, 256, b"x" * 256)
+        self.assertEqual(sent, [(40, True), (256, False)])
+
+    def test_benchmark_replay(self):
+        state = json.dumps({"type": "tournament_state", "rounds": [{"matches": ["pending"] * 8}] * 8})
+        frame = json.dumps({"type": "game_state", "tick": 1})
+        messages = [
+            read_message({"connection": "1-0", "path": "/ws/tournament/ABC/", "binary": False, "payload": payload})
+            for payload in (state, frame, state)
+        ]
+        stats = replay(messages, compression_threshold, 12, 5, 1)
+        self.assertEqual(stats["game_state"]["sent"], len(frame))
+        self.assertEqual(stats["tournament_state"]["compressed"], 2)
+        self.assertLess(stats["tournament_state"]["sent"], len(state) // 4)
+
+
+class MatchSimulationTestCase(SimpleTestCase):
+    """
+    Tests for the match state kept by the game simulation workers.
+    """
+    def event(self, **overrides):
+        event = {
+            "match": "lobby_ABC123",
+            "group": "lobby_ABC123",
+            "reply_channel": "specific.test!reply",
+            "mode": "chaos",
+            "settings": {"powerup_spawn_rate": 5},
+            "sides": {"1": "left"},
+            "default_side": "right",
+        }
+        event.update(overrides)
+        return event
+
+    def make_match(self, **overrides):
+        return MatchSimulation(self.event(**overrides))
+
+    def test_side_resolution(self):
+        match = self.make_match()
+        self.assertEqual(match.side_for(1), "left")
+        self.assertEqual(match.side_for("1"), "left")
+        self.assertEqual(match.side_for(2), "right")
+
+    def test_only_classic_matches_are_batched(self):
+        batch = BatchSimulator()
+        self.assertFalse(self.make_match().batched)
+        self.assertFalse(self.make_match(mode="classic").batched)
+        self.assertTrue(MatchSimulation(self.event(mode="classic"), batch).batched)
+        self.assertEqual(len(batch), 1)
+
+    def test_world_uses_mode_settings(self):
+        match = self.make_match()
+        self.assertEqual(match.world.settings["powerup_spawn_rate"], 5)
+        self.assertIn("active_power_ups", match.world.snapshot())
+
+    def test_batch_survives_a_failing_match(self):
+        consumer = GameSimulationConsumer()
+        consumer.channel_layer = InMemoryChannelLayer()
+        consumer.channel_name = "specific.test!worker"
+        sending = set()
+        overlapped = []
+        frames = collections.Counter()
+
+        async def group_send(group, message):
+            if group == "lobby_BAD":
+                raise RuntimeError("broken match")
+            sending.add(group)
+            overlapped.append(len(sending))
+            await asyncio.sleep(0.001)
+            sending.discard(group)
+            frames[group] += 1
+
+        async def scenario():
+            for key in ("lobby_BAD", "lobby_ONE", "lobby_TWO"):
+                await consumer.simulation_start(self.event(match=key, group=key, mode="classic"))
+            task = consumer.batch_tasks[60]
+            await asyncio.sleep(0.2)
+            hosting = sorted(consumer.matches)
+            for match in consumer.matches.values():
+                match.running = False
+            await asyncio.wait_for(task, 1)
+            return hosting
+
+        with mock.patch.object(consumer.channel_layer, "group_send", side_effect=group_send), \
+                self.assertLogs("game_debug", "ERROR") as logs:
+            hosting = async_to_sync(scenario)()
+        self.assertEqual(hosting, ["lobby_ONE", "lobby_TWO"])
+        self.assertIn("Simulation of lobby_BAD crashed", logs.output[0])
+        self.assertIn("RuntimeError: broken match", logs.output[0])
+        self.assertGreater(min(frames["lobby_ONE"], frames["lobby_TWO"]), 5)
+        # Both matches' frames were on their way at once
+        self.assertEqual(max(overlapped), 2)
@@ -1,12 +1,13 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import GameViewSet, TournamentViewSet, LobbyViewSet, ChaosLobbyViewSet, ArenaLobbyViewSet, StatsViewSet, TournamentLobbyViewSet, OnlineTournamentViewSet
+from .views import GameViewSet, TournamentViewSet, LobbyViewSet, ChaosLobbyViewSet, ArenaLobbyViewSet, StatsViewSet, TournamentLobbyViewSet, OnlineTournamentViewSet, MetricsViewSet
 
 router = DefaultRouter()
 router.register(r'games', GameViewSet, basename='game')
 router.register(r'tournaments', TournamentViewSet, basename='tournament')
 router.register(r'stats', StatsViewSet, basename='stats')
 router.register(r'online-tournaments', OnlineTournamentViewSet, basename='online-tournament')
+router.register(r'metrics', MetricsViewSet, basename='metrics')
 lobby_create = LobbyViewSet.as_view({'post': 'create_room'})
 lobby_join = LobbyViewSet.as_view({'post': 'join_room'})
 lobby_ready = LobbyViewSet.as_view({'post': 'set_ready'})
@@ -1,7 +1,7 @@
 from rest_framework import viewsets, status, serializers
 from .serializers import GameSerializer, GlobalStatsSerializer, UserStatsSerializer, TournamentSerializer, OnlineTournamentSerializer
 from django.utils import timezone
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -17,6 +17,8 @@ import random
 import string
 from django.db import transaction
 from .services.tournament_lobby_service import TournamentLobbyService
+from .affinity import assign_worker
+from .outbound import outbound_metrics
 from accounts.utils import get_display_name
 
 import logging
@@ -548,7 +550,7 @@ class LobbyViewSet(viewsets.ViewSet):
             round_score_limit=round_score_limit
         )
 
-        return Response({"room_id": room_id}, status=status.HTTP_201_CREATED)
+        return Response({"room_id": room_id, "worker": assign_worker(room_id)}, status=status.HTTP_201_CREATED)
 
     @action(detail=False, methods=['post'])
     @transaction.atomic  # Ensures that the following changes are atomic
@@ -563,14 +565,14 @@ class LobbyViewSet(viewsets.ViewSet):
             # Check if the user is the host; if so, ignore the request
             if lobby.host == user:
                 return Response(
-                    {"detail": "You are already the host of this room."},
+                    {"detail": "You are already the host of this room.", "worker": assign_worker(room_id)},
                     status=status.HTTP_200_OK
                 )
 
             # Check if the user is already the guest; if so, allow them to rejoin without modification
             if lobby.guest == user:
                 return Response(
-                    {"detail": "You are already the guest in this room."},
+                    {"detail": "You are already the guest in this room.", "worker": assign_worker(room_id)},
                     status=status.HTTP_200_OK
                 )
 
@@ -587,7 +589,7 @@ class LobbyViewSet(viewsets.ViewSet):
             lobby.save()
 
             return Response(
-                {"detail": "Joined room successfully. You were removed from any other active rooms."},
+                {"detail": "Joined room successfully. You were removed from any other active rooms.", "worker": assign_worker(room_id)},
                 status=status.HTTP_200_OK
             )
 
@@ -727,7 +729,7 @@ class ChaosLobbyViewSet(viewsets.ViewSet):
             powerup_spawn_rate=powerup_spawn_rate
         )
 
-        return Response({"room_id": room_id}, status=status.HTTP_201_CREATED)
+        return Response({"room_id": room_id, "worker": assign_worker(room_id)}, status=status.HTTP_201_CREATED)
 
     @action(detail=False, methods=['post'])
     @transaction.atomic  # Ensures that the following changes are atomic
@@ -742,14 +744,14 @@ class ChaosLobbyViewSet(viewsets.ViewSet):
             # Check if the user is the host; if so, ignore the request
             if lobby.host == user:
                 return Response(
-                    {"detail": "You are already the host of this room."},
+                    {"detail": "You are already the host of this room.", "worker": assign_worker(room_id)},
                     status=status.HTTP_200_OK
                 )
 
             # Check if the user is already the guest; if so, allow them to rejoin without modification
             if lobby.guest == user:
                 return Response(
-                    {"detail": "You are already the guest in this room."},
+                    {"detail": "You are already the guest in this room.", "worker": assign_worker(room_id)},
                     status=status.HTTP_200_OK
                 )
 
@@ -766,7 +768,7 @@ class ChaosLobbyViewSet(viewsets.ViewSet):
             lobby.save()
 
             return Response(
-                {"detail": "Joined room successfully. You were removed from any other active rooms."},
+                {"detail": "Joined room successfully. You were removed from any other active rooms.", "worker": assign_worker(room_id)},
                 status=status.HTTP_200_OK
             )
 
@@ -907,7 +909,7 @@ class ArenaLobbyViewSet(viewsets.ViewSet):
             round_score_limit=round_score_limit
         )
 
-        return Response({"room_id": room_id}, status=status.HTTP_201_CREATED)
+        return Response({"room_id": room_id, "worker": assign_worker(room_id)}, status=status.HTTP_201_CREATED)
 
     @action(detail=False, methods=['post'])
     @transaction.atomic
@@ -920,14 +922,14 @@ class ArenaLobbyViewSet(viewsets.ViewSet):
 
             # Check if user is already the host (player_one)
             if lobby.player_one == user:
-                return Response({"detail": "You are already the host of this room."},
+                return Response({"detail": "You are already the host of this room.", "worker": assign_worker(room_id)},
                                 status=status.HTTP_200_OK)
 
             # Check if user is already in the lobby in any slot
             if (lobby.player_two == user or
                 lobby.player_three == user or
                 lobby.player_four == user):
-                return Response({"detail": "You are already in this room."}, 
+                return Response({"detail": "You are already in this room.", "worker": assign_worker(room_id)}, 
                                 status=status.HTTP_200_OK)
 
             # Check if the lobby is full
@@ -947,7 +949,7 @@ class ArenaLobbyViewSet(viewsets.ViewSet):
 
             lobby.save()
 
-            return Response({"detail": "Joined room successfully. You were removed from any other active rooms."},
+            return Response({"detail": "Joined room successfully. You were removed from any other active rooms.", "worker": assign_worker(room_id)},
                             status=status.HTTP_200_OK)
 
         except ArenaLobby.DoesNotExist:
@@ -1498,4 +1500,17 @@ class StatsViewSet(viewsets.ViewSet):
             "leaderboard_most_tournament_wins": leaderboard_most_tournament_wins,
         }
         serializer = GlobalStatsSerializer(instance=data)  # Use instance instead of data
-        return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class MetricsViewSet(viewsets.ViewSet):
+    """
+    Runtime metrics of the process serving the request, for staff.
+    """
+    permission_classes = [IsAdminUser]
+    authentication_classes = [JWTAuthentication]
+
+    @action(detail=False, methods=['get'])
+    def outbound(self, request):
+        """Depths of the WebSocket outbound queues (see outbound.py)."""
+        return Response(outbound_metrics())
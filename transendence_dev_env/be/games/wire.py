@@ -0,0 +1,150 @@
+# wire.py
+"""
+Binary framing for game_state, the one message sent on every tick.
+
+Clients opt in by connecting with ?wire=binary or by offering the
+BINARY_SUBPROTOCOL websocket subprotocol; all other messages, and every
+message for clients that don't opt in, stay JSON.
+
+A frame is a little-endian HEADER (frame type, game mode, sequence number,
+simulation tick), a count and that many input acks as (index into SIDES,
+input sequence number), then the fixed field layout of the mode. Chaos
+frames end with a count and that many power-ups as (x, y, index into
+POWER_UPS).
+
+Each game_state is serialized only once per wire format, by whoever owns the
+match: encode_payloads() builds the ready-to-send text or bytes for the
+formats the room asked for and the consumers just forward them.
+"""
+import json
+import struct
+
+from .engine.rules import POWER_UPS
+
+BINARY_SUBPROTOCOL = "pong.binary"
+
+FRAME_GAME_STATE = 1
+
+HEADER = struct.Struct("<BBII")
+ACK_COUNT = struct.Struct("<B")
+ACK = struct.Struct("<BI")
+MAX_SEQ = 0xFFFFFFFF  # largest input sequence number an ACK holds, consumers drop inputs above it
+SIDES = ("left", "right", "top", "bottom")
+
+CLASSIC_FIELDS = (
+    ("leftScore", "H"),
+    ("rightScore", "H"),
+    ("ball_x", "f"),
+    ("ball_y", "f"),
+    ("left_paddle_y", "f"),
+    ("right_paddle_y", "f"),
+    ("left_speed", "b"),
+    ("right_speed", "b"),
+)
+
+LAYOUTS = {
+    "classic": CLASSIC_FIELDS,
+    "chaos": CLASSIC_FIELDS + (
+        ("paddle_size_modifier", "f"),
+        ("ball_size_modifier", "f"),
+    ),
+    "arena": CLASSIC_FIELDS[:2] + (
+        ("topScore", "H"),
+        ("bottomScore", "H"),
+    ) + CLASSIC_FIELDS[2:6] + (
+        ("top_paddle_x", "f"),
+        ("bottom_paddle_x", "f"),
+    ) + CLASSIC_FIELDS[6:] + (
+        ("top_speed", "b"),
+        ("bottom_speed", "b"),
+    ),
+}
+MODES = tuple(LAYOUTS)
+
+STRUCTS = {
+    mode: struct.Struct("<" + "".join(code for _, code in fields))
+    for mode, fields in LAYOUTS.items()
+}
+POWER_UP_COUNT = struct.Struct("<B")
+POWER_UP = struct.Struct("<HHB")
+
+INTEGER_CODES = ("H", "b", "B")
+
+
+def _field_value(value, code):
+    if code in INTEGER_CODES:
+        return int(round(value))
+    return value
+
+
+def encode_state(mode, state, seq=0, tick=None, acks=None):
+    """Pack a full game_state dict (without "type") into a binary frame."""
+    fields = LAYOUTS[mode]
+    acks = acks or {}
+    body = STRUCTS[mode].pack(*(_field_value(state[name], code) for name, code in fields))
+    frame = HEADER.pack(FRAME_GAME_STATE, MODES.index(mode), seq & 0xFFFFFFFF, (tick or 0) & 0xFFFFFFFF)
+    frame += ACK_COUNT.pack(len(acks))
+    frame += b"".join(ACK.pack(SIDES.index(side), ack) for side, ack in acks.items())
+    frame += body
+    if mode == "chaos":
+        power_ups = state.get("active_power_ups") or []
+        frame += POWER_UP_COUNT.pack(len(power_ups))
+        frame += b"".join(
+            POWER_UP.pack(int(p["x"]), int(p["y"]), POWER_UPS.index(p["type"]))
+            for p in power_ups
+        )
+    return frame
+
+
+def decode_state(frame):
+    """Inverse of encode_state. Returns (mode, seq, state), with the tick and acks in state like the JSON frame."""
+    frame_type, mode_index, seq, tick = HEADER.unpack_from(frame)
+    if frame_type != FRAME_GAME_STATE:
+        raise ValueError(f"Unknown frame type: {frame_type}")
+    mode = MODES[mode_index]
+    offset = HEADER.size
+    (count,) = ACK_COUNT.unpack_from(frame, offset)
+    offset += ACK_COUNT.size
+    acks = {}
+    for _ in range(count):
+        side_index, ack = ACK.unpack_from(frame, offset)
+        offset += ACK.size
+        acks[SIDES[side_index]] = ack
+    layout = STRUCTS[mode]
+    values = layout.unpack_from(frame, offset)
+    state = {name: value for (name, _), value in zip(LAYOUTS[mode], values)}
+    state["tick"] = tick
+    state["acks"] = acks
+    offset += layout.size
+    if mode == "chaos":
+        (count,) = POWER_UP_COUNT.unpack_from(frame, offset)
+        offset += POWER_UP_COUNT.size
+        state["active_power_ups"] = []
+        for _ in range(count):
+            x, y, type_index = POWER_UP.unpack_from(frame, offset)
+            offset += POWER_UP.size
+            state["active_power_ups"].append({"x": x, "y": y, "type": POWER_UPS[type_index]})
+    return mode, seq, state
+
+
+# Wire formats a consumer can serve its client
+FORMAT_JSON = "json"  # full state as JSON text, what the frontend always got
+FORMAT_DELTA = "delta"  # the engine.sync frame as JSON text
+FORMAT_BINARY = "binary"  # encode_state() bytes
+FORMATS = (FORMAT_JSON, FORMAT_DELTA, FORMAT_BINARY)
+
+
+def encode_payload(wire_format, mode, frame, state):
+    """
+    Serialize one game_state for a wire format. frame is the engine.sync
+    frame, state the full state it belongs to.
+    """
+    if wire_format == FORMAT_BINARY:
+        return encode_state(mode, state, frame["seq"], frame.get("tick"), frame.get("acks"))
+    if wire_format == FORMAT_DELTA:
+        return json.dumps({"type": "game_state", **frame})
+    return json.dumps({"type": "game_state", "tick": frame.get("tick"), "acks": frame.get("acks", {}), **state})
+
+
+def encode_payloads(mode, frame, state, formats):
+    return {wire_format: encode_payload(wire_format, mode, frame, state) for wire_format in formats}
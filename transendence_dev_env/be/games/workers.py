@@ -0,0 +1,272 @@
+# workers.py
+"""
+Game simulation worker, run with `manage.py run_game_workers`.
+
+Matches are handed off by the game consumers (see GameSimulationMixin) on the
+shared GAME_SIMULATION_CHANNEL; whichever worker process picks the message up
+hosts the match and answers with its own channel name, which the players then
+send their inputs to. The consumer keeps the database work for rounds and
+results, and runs the match itself if no worker answers in time. The physics loop runs in the worker's event loop, away
+from Daphne's socket handling and database_sync_to_async hops.
+
+Classic matches share one BatchSimulator per worker and simulation rate and
+are all advanced by a single loop, which then sends the matches' messages
+concurrently; a match that fails is released on its own. Chaos and arena
+matches keep a World and a loop of their own.
+
+The worker also sends the match's spectator frames (see engine.spectate) to
+the spectator group it was given, and ends that stream when it releases the
+match.
+"""
+import asyncio
+import time
+
+from channels.consumer import AsyncConsumer
+
+from .engine import create_world, FixedTimestepLoop, BroadcastPacer, BatchSimulator, StateEncoder, InputRing, SpectatorFeed
+from .engine.batch import SIDES, NO_SCORER
+from .engine.history import MAX_REWIND
+from .engine.spectate import SPECTATOR_RATE, SPECTATOR_DELAY
+from .replay import ReplayRecorder, replay_header
+from .wire import FORMATS, encode_payloads
+
+import logging
+logger = logging.getLogger('game_debug')
+
+GAME_SIMULATION_CHANNEL = "game-simulation"
+
+
+class MatchSimulation:
+    """One match hosted by a worker."""
+
+    def __init__(self, event, batch=None):
+        self.key = event["match"]
+        self.group = event["group"]
+        self.reply_channel = event["reply_channel"]
+        self.mode = event["mode"]
+        self.batched = batch is not None and event["mode"] == "classic"
+        if self.batched:
+            self.world = batch.add_match(seed=event.get("seed"))
+        else:
+            self.world = create_world(event["mode"], seed=event.get("seed"), **event.get("settings", {}))
+        self.world.max_rewind = event.get("max_rewind", MAX_REWIND)
+        self.round_score_limit = event.get("round_score_limit")
+        self.max_rounds = event.get("max_rounds")
+        self.sides = event.get("sides", {})
+        self.default_side = event.get("default_side")
+        self.simulation_rate = event.get("simulation_rate", 60)
+        self.pacer = BroadcastPacer(event.get("broadcast_rate", self.simulation_rate))
+        self.rounds_played = 0
+        self.encoder = StateEncoder()
+        self.formats = set()
+        self.inputs = InputRing()
+        self.last_inputs = {}  # sending connection -> sequence number of the newest update applied
+        self.spectator_group = event.get("spectator_group")
+        self.spectator_feed = None
+        if self.spectator_group:
+            self.spectator_feed = SpectatorFeed(
+                self.simulation_rate,
+                event.get("spectator_rate", SPECTATOR_RATE),
+                event.get("spectator_delay", SPECTATOR_DELAY),
+            )
+        self.running = True
+        self.released = False
+        self.task = None
+        if event.get("replay"):
+            self.world.recorder = ReplayRecorder(event["replay"], replay_header(self.mode, self.world, self.simulation_rate))
+
+    def side_for(self, user_id):
+        return self.sides.get(str(user_id), self.default_side)
+
+    def accept_input(self, connection, sequence):
+        """False for an update older than one already applied from the same connection."""
+        if sequence is None:
+            return True
+        if sequence <= self.last_inputs.get(connection, 0):
+            return False
+        self.last_inputs[connection] = sequence
+        return True
+
+
+class GameSimulationConsumer(AsyncConsumer):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.matches = {}
+        self.batches = {}  # simulation rate -> BatchSimulator
+        self.batch_tasks = {}
+        self.spectator_tasks = set()
+
+    async def simulation_start(self, event):
+        previous = self.matches.get(event["match"])
+        if previous:
+            previous.running = False
+            self.release(previous)
+        rate = event.get("simulation_rate", 60)
+        batch = self.batches.setdefault(rate, BatchSimulator()) if event["mode"] == "classic" else None
+        match = MatchSimulation(event, batch=batch)
+        self.matches[match.key] = match
+        if not match.batched:
+            match.task = asyncio.create_task(self.run_match(match))
+        elif rate not in self.batch_tasks or self.batch_tasks[rate].done():
+            self.batch_tasks[rate] = asyncio.create_task(self.run_batch(rate))
+        logger.info(f"Simulation worker {self.channel_name} hosting {match.key}")
+        await self.channel_layer.send(
+            match.reply_channel,
+            {
+                "type": "simulation_started",
+                "match": match.key,
+                "channel_name": self.channel_name,
+            }
+        )
+
+    async def simulation_stop(self, event):
+        match = self.matches.get(event["match"])
+        if match:
+            match.running = False
+
+    async def update_paddle_speed(self, event):
+        match = self.matches.get(event.get("match"))
+        if not match:
+            return
+        side = match.side_for(event["user_id"])
+        if side is None:
+            logger.warning(f"User ID {event['user_id']} not found in match {match.key}.")
+            return
+        if not match.accept_input(event.get("connection"), event.get("sequence")):
+            return
+        match.inputs.push(side, event["speed"], event.get("seq"), event.get("view_tick"))
+
+    async def state_keyframe_request(self, event):
+        match = self.matches.get(event.get("match"))
+        if match:
+            match.encoder.request_keyframe()
+
+    async def state_format_request(self, event):
+        match = self.matches.get(event.get("match"))
+        if match and event["format"] in FORMATS:
+            match.formats.add(event["format"])
+
+    async def advance(self, match, scorer, dt):
+        """Report a point, or broadcast the new state, for a match that has just been stepped by dt."""
+        world = match.world
+        if scorer is not None:
+            round_over = match.round_score_limit is not None and world.round_over(match.round_score_limit)
+            await self.channel_layer.send(
+                match.reply_channel,
+                {
+                    "type": "simulation_scored",
+                    "match": match.key,
+                    "scores": dict(world.scores),
+                    "round_over": round_over,
+                }
+            )
+            if round_over:
+                match.rounds_played += 1
+                if match.max_rounds and match.rounds_played >= match.max_rounds:
+                    match.running = False
+                else:
+                    world.next_round()
+                return
+        if match.spectator_feed is not None:
+            spectator_frame = match.spectator_feed.sample(world)
+            if spectator_frame is not None:
+                await self.send_spectator_state(match, spectator_frame)
+        if not match.pacer.due(dt):
+            return
+        frame = match.encoder.encode(world.snapshot(), world.tick, match.inputs.acks)
+        started = time.monotonic()
+        await self.channel_layer.group_send(
+            match.group,
+            {
+                "type": "game_state",
+                **frame,
+                "payloads": encode_payloads(match.mode, frame, match.encoder.last, match.formats),
+            }
+        )
+        match.pacer.record(time.monotonic() - started)
+
+    async def send_spectator_state(self, match, frame):
+        payloads = encode_payloads(match.mode, frame, match.spectator_feed.encoder.last, FORMATS)
+        await self.channel_layer.group_send(match.spectator_group, {"type": "spectator_state", **frame, "payloads": payloads})
+
+    async def stop_spectators(self, match):
+        frame = match.spectator_feed.flush()
+        if frame is not None:
+            await self.send_spectator_state(match, frame)
+        await self.channel_layer.group_send(match.spectator_group, {"type": "spectate_ended"})
+
+    def release(self, match):
+        # Both a restart of the match and the end of its run_match() release it
+        if match.released:
+            return
+        match.released = True
+        if match.spectator_feed is not None:
+            task = asyncio.create_task(self.stop_spectators(match))
+            self.spectator_tasks.add(task)
+            task.add_done_callback(self.spectator_tasks.discard)
+        if match.world.recorder is not None:
+            match.world.recorder.close(match.world.tick)
+            match.world.recorder = None
+        if self.matches.get(match.key) is match:
+            del self.matches[match.key]
+        if match.batched:
+            match.world.batch.remove_match(match.world.slot)
+        logger.info(f"Simulation worker {self.channel_name} released {match.key}")
+
+    async def run_match(self, match):
+        async def tick(dt):
+            match.inputs.drain(match.world)
+            await self.advance(match, match.world.step(dt), dt)
+
+        try:
+            await FixedTimestepLoop(tick_rate=match.simulation_rate).run(tick, lambda: match.running)
+        except Exception:
+            logger.exception(f"Simulation of {match.key} crashed")
+        finally:
+            self.release(match)
+
+    async def run_batch(self, rate):
+        """Advance every match of the batch for this rate with one vectorized step per tick."""
+        batch = self.batches[rate]
+
+        def batched_matches():
+            return [m for m in self.matches.values() if m.batched and m.world.batch is batch]
+
+        def crashed(match):
+            # One bad match releases only itself, the rest of the batch carries on
+            logger.exception(f"Simulation of {match.key} crashed")
+            match.running = False
+            self.release(match)
+
+        async def advance(match, scorer, dt):
+            try:
+                await self.advance(match, scorer, dt)
+            except Exception:
+                crashed(match)
+
+        async def tick(dt):
+            matches = batched_matches()
+            for match in matches:
+                try:
+                    match.inputs.drain(match.world)
+                except Exception:
+                    crashed(match)
+            scorers = batch.step(dt)
+            sends = []
+            for match in matches:
+                if match.released:
+                    continue
+                if not match.running:
+                    self.release(match)
+                    continue
+                scorer = scorers[match.world.slot]
+                sends.append(advance(match, None if scorer == NO_SCORER else SIDES[scorer], dt))
+            # The matches' channel layer sends overlap instead of adding up
+            await asyncio.gather(*sends)
+
+        try:
+            await FixedTimestepLoop(tick_rate=rate).run(tick, lambda: len(batch) > 0)
+        except Exception:
+            logger.exception(f"Batch simulation at {rate} Hz crashed")
+            for match in batched_matches():
+                self.release(match)
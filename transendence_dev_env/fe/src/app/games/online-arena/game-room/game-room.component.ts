@@ -51,6 +51,7 @@ export class GameRoomArenaComponent implements OnInit, OnDestroy {
   playerFourID: number = 0;
   isHost: boolean = false;
   private messageSubscription!: Subscription;
+  private inputSeq: number = 0; // numbers key events, game_state frames acknowledge the last one applied
   userProfile: UserProfile | null = null;
   public msgFromServer: any;
   roomData: any;
@@ -73,7 +74,7 @@ export class GameRoomArenaComponent implements OnInit, OnDestroy {
     this.roomId = this.route.snapshot.paramMap.get('roomId') || '';
     this.lobbyService.joinRoom(this.roomId).subscribe({
       next: (data) => {
-        this.lobbyService.connect(this.roomId);
+        this.lobbyService.connect(this.roomId, data.worker ?? null);
         this.loadFriends();
         this.messageSubscription = this.lobbyService.messages$.subscribe(msg => {
           this.msgFromServer = msg;
@@ -306,6 +307,8 @@ export class GameRoomArenaComponent implements OnInit, OnDestroy {
     if (event.code === 'KeyW' || event.code === 'KeyS' || event.code === 'ArrowUp' || event.code === 'ArrowDown') {
       this.lobbyService.sendMessage({
         action: 'keydown',
+        seq: ++this.inputSeq,
+        view_tick: this.gameState?.tick, // tick on screen when the key was pressed, for lag compensation
         key: event.code,
         room_id: this.roomId,
         user_id: this.userProfile?.id
@@ -318,6 +321,8 @@ export class GameRoomArenaComponent implements OnInit, OnDestroy {
     if (event.code === 'KeyW' || event.code === 'KeyS' || event.code === 'ArrowUp' || event.code === 'ArrowDown') {
       this.lobbyService.sendMessage({
         action: 'keyup',
+        seq: ++this.inputSeq,
+        view_tick: this.gameState?.tick, // tick on screen when the key was pressed, for lag compensation
         key: event.code,
         room_id: this.roomId,
         user_id: this.userProfile?.id
@@ -41,6 +41,7 @@ export class GameRoomComponent implements OnInit, OnDestroy {
   guestId: number = 0;
   isHost: boolean = false;
   private messageSubscription!: Subscription;
+  private inputSeq: number = 0; // numbers key events, game_state frames acknowledge the last one applied
   userProfile: UserProfile | null = null;
   public msgFromServer: any;
   roomData: any;
@@ -63,7 +64,7 @@ export class GameRoomComponent implements OnInit, OnDestroy {
     this.roomId = this.route.snapshot.paramMap.get('roomId') || '';
     this.lobbyService.joinRoom(this.roomId).subscribe({
       next: (data) => {
-        this.lobbyService.connect(this.roomId);
+        this.lobbyService.connect(this.roomId, data.worker ?? null);
         this.loadFriends();
         this.messageSubscription = this.lobbyService.messages$.subscribe(msg => {
           this.msgFromServer = msg;
@@ -239,6 +240,8 @@ export class GameRoomComponent implements OnInit, OnDestroy {
   onKeyDown(event: KeyboardEvent) {
     this.lobbyService.sendMessage({
       action: 'keydown',
+      seq: ++this.inputSeq,
+      view_tick: this.gameState?.tick, // tick on screen when the key was pressed, for lag compensation
       key: event.code,
       room_id: this.roomId,
       user_id: this.userProfile?.id
@@ -249,6 +252,8 @@ export class GameRoomComponent implements OnInit, OnDestroy {
   onKeyUp(event: KeyboardEvent) {
     this.lobbyService.sendMessage({
       action: 'keyup',
+      seq: ++this.inputSeq,
+      view_tick: this.gameState?.tick, // tick on screen when the key was pressed, for lag compensation
       key: event.code,
       room_id: this.roomId,
       user_id: this.userProfile?.id
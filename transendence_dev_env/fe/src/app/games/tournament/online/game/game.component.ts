@@ -25,9 +25,11 @@ interface GameSettings {
 export class GameComponent implements OnInit, OnDestroy {
   @Output() gameEnd = new EventEmitter<void>();
   @Input() matchId: string = '';
+  @Input() worker: string | null = null;
   @Input() userProfile: UserProfile | null = null;
   private roomId: string = '';
   private messageSubscription!: Subscription;
+  private inputSeq: number = 0; // numbers key events, game_state frames acknowledge the last one applied
 
   //for everything around the canvas
   gameInProgress: boolean = false;
@@ -54,7 +56,7 @@ export class GameComponent implements OnInit, OnDestroy {
     }
 
     this.roomId = this.route.snapshot.paramMap.get('roomId') || '';
-    this.gameDisplayService.connect(this.matchId, this.roomId);
+    this.gameDisplayService.connect(this.matchId, this.roomId, this.worker);
 
     // this.updateReadyStatus(); // on init set to ready, so backend knows when both players joined
 
@@ -117,6 +119,8 @@ export class GameComponent implements OnInit, OnDestroy {
   onKeyDown(event: KeyboardEvent) {
     this.gameDisplayService.sendMessage({
       action: 'keydown',
+      seq: ++this.inputSeq,
+      view_tick: this.gameState?.tick, // tick on screen when the key was pressed, for lag compensation
       key: event.code,
       user_id: this.userProfile?.id.toString(),
     });
@@ -126,6 +130,8 @@ export class GameComponent implements OnInit, OnDestroy {
   onKeyUp(event: KeyboardEvent) {
     this.gameDisplayService.sendMessage({
       action: 'keyup',
+      seq: ++this.inputSeq,
+      view_tick: this.gameState?.tick, // tick on screen when the key was pressed, for lag compensation
       key: event.code,
       user_id: this.userProfile?.id.toString(),
     });
@@ -73,6 +73,7 @@ export class TournamentTreeComponent implements OnInit, OnDestroy {
   userProfile: UserProfile | null = null;
   gameInProgress: boolean = false;
   matchId: string = '';
+  worker: string | null = null;
   activePlayer: boolean = true;
   isLoading: boolean = false;
 
@@ -140,6 +141,7 @@ export class TournamentTreeComponent implements OnInit, OnDestroy {
     this.tournamentService.sendMessage({ action: 'game_end' });
     this.gameInProgress = false;
     this.matchId = '';
+    this.worker = null;
   }
 
   private handleWebSocketMessage(msg: any): void {
@@ -169,6 +171,7 @@ export class TournamentTreeComponent implements OnInit, OnDestroy {
 
   private joinMatch(msg: any): void {
     this.matchId = msg.match_id;
+    this.worker = msg.worker ?? null;
     this.gameInProgress = true;
     this.toastr.info(`You have joined match ${msg.match_id}.`, 'Info');
     console.log('joined match:', msg.match_id);
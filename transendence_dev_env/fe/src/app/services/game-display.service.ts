@@ -16,14 +16,15 @@ export class GameDisplayService {
 
   constructor(private http: HttpClient, private authService: AuthService, private router: Router) {}
 
-  connect(matchId: string, roomId: string): void {
+  // worker: the ASGI worker the match was assigned to (the `worker` of join_match), for the proxy to route on
+  connect(matchId: string, roomId: string, worker: string | null = null): void {
     if (this.socket$) {
       this.disconnect();
     }
     if (this.socket$ && this.isConnected.value) return;
     const token = this.authService.getAccessToken();
     // Replace your existing connection logic with the new URL
-    this.socket$ = webSocket(environment.wsUrl + `/tournament/${roomId}/${matchId}/?token=${token}`);
+    this.socket$ = webSocket(environment.wsUrl + `/tournament/${roomId}/${matchId}/?token=${token}` + (worker ? `&worker=${worker}` : ''));
 
     this.socket$.subscribe(
       (msg) => {
@@ -14,17 +14,20 @@ export class GameLobbyService {
   private socket$!: WebSocketSubject<any>;
   public messages$ = new Subject<any>();
   private isConnected = new BehaviorSubject<boolean>(false);
+  private worker: string | null = null;
 
   constructor(private http: HttpClient, private authService: AuthService, private router: Router) {}
 
-  connect(roomId: string) {
+  // worker: the ASGI worker the room was assigned to (the `worker` of the join response), for the proxy to route on
+  connect(roomId: string, worker: string | null = this.worker) {
     if (this.socket$) {
       this.disconnect();
     }
     if (this.socket$ && this.isConnected.value) return;
+    this.worker = worker;
     const token = this.authService.getAccessToken(); // Assuming a method to get the access token
     // this.socket$ = webSocket(`ws://localhost:8000/ws/lobby/${roomId}/?token=${token}`);
-    this.socket$ = webSocket(environment.wsUrl + `/lobby/${roomId}/?token=${token}`);
+    this.socket$ = webSocket(environment.wsUrl + `/lobby/${roomId}/?token=${token}` + (worker ? `&worker=${worker}` : ''));
 
     this.socket$.subscribe(
       (msg) => {this.messages$.next(msg)},